@@ -0,0 +1,47 @@
+"""bot persistence
+
+Revision ID: bot_persistence
+Revises: broadcasts
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'bot_persistence'
+down_revision = 'broadcasts'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Persistencia de PTB en Postgres (src/telegram_app/db_persistence.py),
+    reemplaza bot_persistence.pickle: una fila por usuario/chat (data jsonb,
+    clave -> valor serializado) y una por conversación activa.
+    """
+    op.create_table(
+        'bot_state',
+        sa.Column('kind', sa.Text(), nullable=False),  # user | chat | bot
+        sa.Column('owner_id', sa.BigInteger(), nullable=False),
+        sa.Column('data', postgresql.JSONB(), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('kind', 'owner_id'),
+    )
+
+    op.create_table(
+        'bot_conversations',
+        sa.Column('name', sa.Text(), nullable=False),
+        sa.Column('conv_key', sa.Text(), nullable=False),  # JSON de la tupla (chat_id, user_id, ...)
+        sa.Column('state', sa.LargeBinary(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('name', 'conv_key'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('bot_conversations')
+    op.drop_table('bot_state')
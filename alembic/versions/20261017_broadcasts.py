@@ -0,0 +1,68 @@
+"""broadcasts
+
+Revision ID: broadcasts
+Revises: drive_outbox_dedupe
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'broadcasts'
+down_revision = 'drive_outbox_dedupe'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Difusiones persistentes (src/telegram_app/broadcast_engine.py):
+    progreso por destinatario para retomar tras un reinicio, y
+    user_contacts.blocked_at para saltar a quienes bloquearon el bot.
+    """
+    op.add_column('user_contacts', sa.Column('blocked_at', sa.DateTime(timezone=True), nullable=True))
+
+    op.create_table(
+        'broadcasts',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('admin_telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('from_chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('message_id', sa.BigInteger(), nullable=False),
+        sa.Column('status', sa.Text(), nullable=False, server_default='RUNNING'),  # RUNNING | DONE
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('sent', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('blocked', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('progress_chat_id', sa.BigInteger(), nullable=True),
+        sa.Column('progress_message_id', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('idx_broadcasts_running', 'broadcasts', ['status'], postgresql_where=sa.text("status = 'RUNNING'"))
+
+    op.create_table(
+        'broadcast_recipients',
+        sa.Column('broadcast_id', sa.BigInteger(), sa.ForeignKey('broadcasts.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('telegram_user_id', sa.BigInteger(), nullable=False),
+        sa.Column('status', sa.Text(), nullable=False, server_default='PENDING'),  # PENDING | SENT | BLOCKED | FAILED
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('broadcast_id', 'telegram_user_id'),
+    )
+    op.create_index(
+        'idx_broadcast_recipients_pending',
+        'broadcast_recipients',
+        ['broadcast_id'],
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_broadcast_recipients_pending', table_name='broadcast_recipients')
+    op.drop_table('broadcast_recipients')
+    op.drop_index('idx_broadcasts_running', table_name='broadcasts')
+    op.drop_table('broadcasts')
+    op.drop_column('user_contacts', 'blocked_at')
@@ -0,0 +1,30 @@
+"""broadcasts lease
+
+Revision ID: broadcasts_lease
+Revises: notification_outbox
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'broadcasts_lease'
+down_revision = 'notification_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Arriendo de difusiones: con varias réplicas, solo la instancia dueña del
+    lease envía una difusión RUNNING; si muere, el lease vence y otra la retoma.
+    """
+    op.add_column('broadcasts', sa.Column('lease_owner', sa.Text(), nullable=True))
+    op.add_column('broadcasts', sa.Column('lease_until', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('broadcasts', 'lease_until')
+    op.drop_column('broadcasts', 'lease_owner')
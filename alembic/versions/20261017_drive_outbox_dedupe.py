@@ -0,0 +1,50 @@
+"""drive outbox dedupe
+
+Revision ID: drive_outbox_dedupe
+Revises: drive_upload_outbox
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'drive_outbox_dedupe'
+down_revision = 'drive_upload_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Dedupe de comprobantes del Vault: un comprobante idéntico (mismo
+    file_unique_id de Telegram o mismo SHA-256 de contenido) se enlaza al
+    archivo de Drive ya subido en vez de subirse otra vez.
+    """
+    op.add_column('drive_upload_outbox', sa.Column('telegram_unique_id', sa.Text(), nullable=True))
+    op.add_column('drive_upload_outbox', sa.Column('content_sha256', sa.Text(), nullable=True))
+    op.add_column(
+        'drive_upload_outbox',
+        sa.Column('duplicate_of', sa.BigInteger(), sa.ForeignKey('drive_upload_outbox.id'), nullable=True),
+    )
+    op.create_index(
+        'idx_drive_upload_outbox_unique_id',
+        'drive_upload_outbox',
+        ['telegram_unique_id'],
+        postgresql_where=sa.text("status = 'DONE' AND telegram_unique_id IS NOT NULL"),
+    )
+    op.create_index(
+        'idx_drive_upload_outbox_sha256',
+        'drive_upload_outbox',
+        ['content_sha256'],
+        postgresql_where=sa.text("status = 'DONE' AND content_sha256 IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_drive_upload_outbox_sha256', table_name='drive_upload_outbox')
+    op.drop_index('idx_drive_upload_outbox_unique_id', table_name='drive_upload_outbox')
+    op.drop_column('drive_upload_outbox', 'duplicate_of')
+    op.drop_column('drive_upload_outbox', 'content_sha256')
+    op.drop_column('drive_upload_outbox', 'telegram_unique_id')
@@ -0,0 +1,51 @@
+"""drive upload outbox
+
+Revision ID: drive_upload_outbox
+Revises: settings_notify_trigger
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'drive_upload_outbox'
+down_revision = 'settings_notify_trigger'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Outbox durable de subidas al Vault (Google Drive).
+    Una fila por (orden, tipo de comprobante); el worker del bot la drena
+    con reintentos y backoff (src/utils/drive_uploads.py).
+    """
+    op.create_table(
+        'drive_upload_outbox',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('order_public_id', sa.BigInteger(), nullable=False),
+        sa.Column('proof_type', sa.Text(), nullable=False),  # ORIGEN | PAGO
+        sa.Column('telegram_file_id', sa.Text(), nullable=False),
+        sa.Column('status', sa.Text(), nullable=False, server_default='PENDING'),  # PENDING | DONE | FAILED
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('drive_file_id', sa.Text(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('order_public_id', 'proof_type', name='uq_drive_upload_outbox_order_proof'),
+    )
+    op.create_index(
+        'idx_drive_upload_outbox_due',
+        'drive_upload_outbox',
+        ['next_attempt_at'],
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_drive_upload_outbox_due', table_name='drive_upload_outbox')
+    op.drop_table('drive_upload_outbox')
@@ -0,0 +1,58 @@
+"""notification outbox
+
+Revision ID: notification_outbox
+Revises: bot_persistence
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'notification_outbox'
+down_revision = 'bot_persistence'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Outbox de notificaciones de Telegram (operadores y grupos).
+    Los handlers encolan en la transacción del cambio de estado de la orden;
+    el dispatcher del bot resuelve destinatarios y envía con rate limit y
+    reintentos (src/telegram_app/notification_dispatcher.py).
+    """
+    op.create_table(
+        'notification_outbox',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=True),            # destino explícito (grupo)
+        sa.Column('recipient_user_id', sa.BigInteger(), nullable=True),  # users.id -> telegram_user_id al enviar
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('photo_file_id', sa.Text(), nullable=True),            # con foto, `text` es el caption
+        sa.Column('parse_mode', sa.Text(), nullable=True),
+        sa.Column('reply_markup', postgresql.JSONB(), nullable=True),
+        sa.Column('disable_web_page_preview', sa.Boolean(), nullable=False, server_default=sa.text('false')),
+        sa.Column('dedupe_key', sa.Text(), nullable=True),
+        sa.Column('status', sa.Text(), nullable=False, server_default='PENDING'),  # PENDING | SENT | FAILED
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('dedupe_key', name='uq_notification_outbox_dedupe_key'),
+        sa.CheckConstraint('chat_id IS NOT NULL OR recipient_user_id IS NOT NULL', name='ck_notification_outbox_recipient'),
+    )
+    op.create_index(
+        'idx_notification_outbox_due',
+        'notification_outbox',
+        ['next_attempt_at'],
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_notification_outbox_due', table_name='notification_outbox')
+    op.drop_table('notification_outbox')
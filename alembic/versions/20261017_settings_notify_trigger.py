@@ -0,0 +1,46 @@
+"""settings notify trigger
+
+Revision ID: settings_notify_trigger
+Revises: sync_vaults_main
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'settings_notify_trigger'
+down_revision = 'sync_vaults_main'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    NOTIFY settings_changed (payload = key) en cada escritura a `settings`.
+    Cubre a todos los writers (backoffice, migraciones, SQL manual): el bot
+    recarga su mapa en memoria al instante (src/db/settings_store.py).
+    """
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_settings_changed() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM pg_notify('settings_changed', OLD.key);
+            ELSE
+                PERFORM pg_notify('settings_changed', NEW.key);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trg_settings_notify ON settings;")
+    op.execute("""
+        CREATE TRIGGER trg_settings_notify
+        AFTER INSERT OR UPDATE OR DELETE ON settings
+        FOR EACH ROW EXECUTE FUNCTION notify_settings_changed();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_settings_notify ON settings;")
+    op.execute("DROP FUNCTION IF EXISTS notify_settings_changed();")
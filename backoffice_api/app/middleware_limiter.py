@@ -1,6 +1,6 @@
 import time
 import logging
-from collections import defaultdict
+from collections import OrderedDict
 from fastapi import Request, HTTPException, status
 from .config import (
     RATE_LIMIT_ENABLED,
@@ -12,7 +12,27 @@ logger = logging.getLogger(__name__)
 
 # Almacén simple en memoria (MVP)
 # En un sistema multi-instancia real usaríamos Redis.
-_hits = defaultdict(list)
+# Acotado: las claves (IP:path) sin hits en la ventana se barren y hay un
+# tope de claves (se desaloja la de actividad más vieja); antes crecía
+# con cada IP/path visto durante la vida del proceso.
+_WINDOW_SECONDS = 60
+_MAX_KEYS = 50_000
+_SWEEP_EVERY_SECONDS = 60
+_hits: "OrderedDict[str, list[float]]" = OrderedDict()
+_last_sweep = 0.0
+
+
+def _sweep(now: float) -> None:
+    """Borra claves sin hits en la ventana (orden = última actividad: corta en la primera viva)."""
+    global _last_sweep
+    _last_sweep = now
+    while _hits:
+        key, hits = next(iter(_hits.items()))
+        if hits and hits[-1] > now - _WINDOW_SECONDS:
+            break
+        del _hits[key]
+
+
 
 async def rate_limit_middleware(request: Request, call_next):
     if not RATE_LIMIT_ENABLED:
@@ -36,16 +56,22 @@ async def rate_limit_middleware(request: Request, call_next):
     # Clave de rate limit (IP + Path simplificado)
     key = f"{ip}:{path}"
 
+    if now - _last_sweep >= _SWEEP_EVERY_SECONDS:
+        _sweep(now)
+
     # Limpiar viejos
-    _hits[key] = [h for h in _hits[key] if h > now - 60]
+    hits = [h for h in _hits.pop(key, ()) if h > now - _WINDOW_SECONDS]
+    _hits[key] = hits  # al final: orden por última actividad
+    while len(_hits) > _MAX_KEYS:
+        _hits.popitem(last=False)
 
-    if len(_hits[key]) >= limit:
+    if len(hits) >= limit:
         logger.warning(f"Rate limit exceeded for {key}")
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Demasiadas peticiones. Intente en un minuto."
         )
 
-    _hits[key].append(now)
+    hits.append(now)
 
     return await call_next(request)
@@ -0,0 +1,97 @@
+"""
+Backfill del Vault: encola (y opcionalmente sube) comprobantes de órdenes
+históricas que nunca llegaron a Google Drive.
+
+Encola en drive_upload_outbox los comprobantes de origen y de pago de las
+órdenes sin fila en el outbox. El worker del bot los sube solo; con --drain
+este script los sube él mismo (mismo pool acotado y backoff).
+
+Uso:
+    python scripts/backfill_drive_uploads.py --dry-run
+    python scripts/backfill_drive_uploads.py --since 2026-01-01 --limit 500
+    python scripts/backfill_drive_uploads.py --retry-failed --drain
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db.connection import close_pool, get_async_conn, open_pool  # noqa: E402
+from src.db.repositories.drive_outbox_repo import (  # noqa: E402
+    backfill_missing_uploads,
+    count_uploads_by_status,
+    retry_failed_uploads,
+)
+
+
+async def _count_missing(since: datetime | None) -> dict[str, int]:
+    sql = """
+        SELECT
+          count(*) FILTER (WHERE o.origin_payment_proof_file_id IS NOT NULL AND o.origin_payment_proof_file_id <> ''
+                             AND NOT EXISTS (SELECT 1 FROM drive_upload_outbox d
+                                              WHERE d.order_public_id = o.public_id AND d.proof_type = 'ORIGEN')),
+          count(*) FILTER (WHERE o.dest_payment_proof_file_id IS NOT NULL AND o.dest_payment_proof_file_id <> ''
+                             AND NOT EXISTS (SELECT 1 FROM drive_upload_outbox d
+                                              WHERE d.order_public_id = o.public_id AND d.proof_type = 'PAGO'))
+        FROM orders o
+        WHERE (%s::timestamptz IS NULL OR o.created_at >= %s::timestamptz);
+    """
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, (since, since))
+            origen, pago = await cur.fetchone()
+    return {"ORIGEN": int(origen), "PAGO": int(pago)}
+
+
+async def _drain() -> None:
+    from telegram import Bot
+
+    from src.config.settings import settings
+    from src.utils.drive_uploads import DriveUploadService
+    from src.utils.google_drive import init_folders
+
+    init_folders()
+    service = DriveUploadService(workers=settings.DRIVE_UPLOAD_WORKERS, poll_seconds=0)
+    async with Bot(settings.TELEGRAM_BOT_TOKEN) as bot:
+        while await service.drain_once(bot):
+            stats = service.stats()
+            print(f"  subidos={stats['uploaded']} fallidos={stats['failed']}")
+    await service.stop()
+    # Las que fallaron quedan PENDING con backoff: el worker del bot las retoma.
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", help="solo órdenes creadas desde esta fecha (YYYY-MM-DD)")
+    parser.add_argument("--limit", type=int, default=None, help="máximo de comprobantes por tipo")
+    parser.add_argument("--retry-failed", action="store_true", help="reactiva subidas en estado FAILED")
+    parser.add_argument("--drain", action="store_true", help="sube lo encolado desde este proceso")
+    parser.add_argument("--dry-run", action="store_true", help="solo cuenta, no encola")
+    args = parser.parse_args()
+
+    since = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc) if args.since else None
+
+    await open_pool()
+    try:
+        if args.dry_run:
+            print("Comprobantes sin subir:", await _count_missing(since))
+            print("Outbox:", await count_uploads_by_status())
+            return
+
+        if args.retry_failed:
+            print(f"Reactivadas {await retry_failed_uploads()} subidas FAILED")
+
+        print("Encolados:", await backfill_missing_uploads(since=since, limit=args.limit))
+
+        if args.drain:
+            await _drain()
+        print("Outbox:", await count_uploads_by_status())
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Benchmark / what-if del motor de matriz de rutas (src/rates_matrix.py).
+
+Compara compute_route_matrix contra el camino anterior de
+generate_rates_full (await de comisión por pareja + loop Decimal), para
+7 → 100 países. Sin DB en ninguno de los dos: la diferencia que queda es
+la del await por pareja; el ahorro grande del motor nuevo (un INSERT por
+ruta -> COPY) no se mide acá.
+
+Uso:
+    python scripts/bench_route_matrix.py
+    python scripts/bench_route_matrix.py --sizes 7 25 50 100 --repeat 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from decimal import Decimal
+from itertools import product
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "bench")
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+
+from src.rates_matrix import CashDeliveryParams, compute_route_matrix  # noqa: E402
+
+CASH = CashDeliveryParams(Decimal("1.03"), Decimal("0.12"), Decimal("0.10"))
+
+
+def _synthetic(n: int):
+    codes = [f"C{i:03d}" for i in range(n)]
+    buy = {c: Decimal(str(1 + i * 13.37)) for i, c in enumerate(codes)}
+    sell = {c: buy[c] * Decimal("0.99") for c in codes}
+    comm = {(o, d): Decimal("0.06") if d == codes[0] else Decimal("0.10") for o, d in product(codes, codes) if o != d}
+    return codes, buy, sell, comm
+
+
+async def _legacy(codes, buy, sell, comm):
+    """
+    Camino anterior de generate_rates_full sin la DB: un await de
+    dynamic_config.get_commission_pct por pareja (cache caliente: retorna sin
+    suspender) y el loop Decimal por pareja que armaba las filas a insertar.
+    """
+    async def get_commission_pct(o, d):
+        return comm[(o, d)]
+
+    cache = {}
+    for o, d in product(codes, codes):
+        if o != d:
+            cache[(o, d)] = await get_commission_pct(o, d)
+    out = []
+    for o, d in product(codes, codes):
+        if o == d:
+            continue
+        base = sell[d] / buy[o]
+        out.append((o, d, cache[(o, d)], buy[o], sell[d], base, base * (Decimal("1.0") - cache[(o, d)])))
+    return out
+
+
+async def _legacy_repeat(repeat, codes, buy, sell, comm):
+    for _ in range(repeat):
+        await _legacy(codes, buy, sell, comm)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[7, 15, 25, 50, 75, 100])
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+
+    print(f"{'países':>7} {'rutas':>7} {'legacy ms':>10} {'matrix ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        codes, buy, sell, comm = _synthetic(n)
+
+        # un solo event loop para todas las repeticiones: se mide el loop, no asyncio.run
+        t0 = time.perf_counter()
+        asyncio.run(_legacy_repeat(args.repeat, codes, buy, sell, comm))
+        legacy_ms = (time.perf_counter() - t0) * 1000 / args.repeat
+
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            routes = compute_route_matrix(buy, sell, comm, cash=CASH, codes=codes)
+        matrix_ms = (time.perf_counter() - t0) * 1000 / args.repeat
+
+        print(f"{n:>7} {len(routes):>7} {legacy_ms:>10.2f} {matrix_ms:>10.2f} {legacy_ms / matrix_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Migra bot_persistence.pickle (PicklePersistence) a Postgres
+(bot_state + bot_conversations, ver src/telegram_app/db_persistence.py).
+
+Idempotente: las claves se hacen upsert sobre la data existente, se puede
+correr de nuevo si el bot siguió usando el pickle mientras tanto.
+Acepta el formato single_file (default) y el de archivos separados
+(<ruta>_user_data, <ruta>_chat_data, ...).
+
+Uso:
+    python scripts/migrate_pickle_persistence.py --dry-run
+    python scripts/migrate_pickle_persistence.py --path bot_persistence.pickle
+"""
+import argparse
+import asyncio
+import os
+import pickle
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.ext import ExtBot, PicklePersistence  # noqa: E402
+
+from src.config.settings import settings  # noqa: E402
+from src.db.connection import close_pool, open_pool  # noqa: E402
+from src.db.repositories.bot_state_repo import (  # noqa: E402
+    KIND_BOT,
+    KIND_CHAT,
+    KIND_USER,
+    StatePatch,
+    count_state_rows,
+    write_state_batch,
+)
+from src.telegram_app.db_persistence import (  # noqa: E402
+    encode_conversation_key,
+    encode_key,
+    encode_value,
+)
+
+_BATCH = 500
+
+
+async def load_pickle(path: str) -> dict:
+    single_file = os.path.exists(path)
+    pp = PicklePersistence(filepath=path, single_file=single_file)
+    pp.set_bot(ExtBot(settings.TELEGRAM_BOT_TOKEN))  # solo para resolver referencias al bot
+    data = {
+        "user_data": await pp.get_user_data(),
+        "chat_data": await pp.get_chat_data(),
+        "bot_data": await pp.get_bot_data(),
+    }
+    await pp.get_conversations("")  # carga el dict completo de conversaciones
+    data["conversations"] = dict(pp.conversations or {})
+    return data
+
+
+def build_patches(data: dict) -> list[StatePatch]:
+    patches = []
+    for kind, rows in ((KIND_USER, data["user_data"]), (KIND_CHAT, data["chat_data"])):
+        for owner_id, values in rows.items():
+            if values:
+                patches.append(StatePatch(kind, int(owner_id), {encode_key(k): encode_value(v) for k, v in values.items()}))
+    if data["bot_data"]:
+        patches.append(StatePatch(KIND_BOT, 0, {encode_key(k): encode_value(v) for k, v in data["bot_data"].items()}))
+    return patches
+
+
+def build_conversations(data: dict) -> list[tuple[str, str, bytes]]:
+    return [
+        (name, encode_conversation_key(key), pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+        for name, convs in data["conversations"].items()
+        for key, state in convs.items()
+        if state is not None
+    ]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=settings.PERSISTENCE_PICKLE_PATH, help="archivo pickle de PTB")
+    parser.add_argument("--dry-run", action="store_true", help="solo lee el pickle y cuenta")
+    args = parser.parse_args()
+
+    data = await load_pickle(args.path)
+    patches = build_patches(data)
+    conversations = build_conversations(data)
+    print(
+        f"Pickle: users={len(data['user_data'])} chats={len(data['chat_data'])} "
+        f"bot_data={len(data['bot_data'])} claves conversaciones={len(conversations)}"
+    )
+    if args.dry_run:
+        return
+
+    await open_pool()
+    try:
+        for i in range(0, len(patches), _BATCH):
+            await write_state_batch(patches[i:i + _BATCH], [])
+            print(f"  filas {min(i + _BATCH, len(patches))}/{len(patches)}")
+        await write_state_batch([], conversations)
+        print("Postgres:", await count_state_rows())
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -9,27 +9,29 @@ from src.db.connection import get_async_conn
 from datetime import timedelta
 import logging
 import time
-from collections import defaultdict
+from src.utils.bounded_state import TTLMap
 
 router = APIRouter(prefix="/auth/operator", tags=["Operator Auth"])
 _logger = logging.getLogger("auth_operators")
 
 # ── Rate limiter simple (sin dependencias externas) ──────────
-_login_attempts: dict[str, list[float]] = defaultdict(list)
 _MAX_ATTEMPTS = 5
 _WINDOW_SECONDS = 60
+# IPs sin intentos en la última ventana expiran solas (antes quedaban para siempre)
+_login_attempts = TTLMap(_WINDOW_SECONDS, max_size=50_000, name="operator_login_attempts")
 
 def _check_rate_limit(ip: str) -> None:
     """Limita a 5 intentos por minuto por IP."""
     now = time.time()
     # Limpiar entradas expiradas
-    _login_attempts[ip] = [t for t in _login_attempts[ip] if now - t < _WINDOW_SECONDS]
-    if len(_login_attempts[ip]) >= _MAX_ATTEMPTS:
+    attempts = [t for t in _login_attempts.get(ip, []) if now - t < _WINDOW_SECONDS]
+    if len(attempts) >= _MAX_ATTEMPTS:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Demasiados intentos. Espera 1 minuto.",
         )
-    _login_attempts[ip].append(now)
+    attempts.append(now)
+    _login_attempts[ip] = attempts
 
 class OperatorLoginRequest(BaseModel):
     email: EmailStr
@@ -141,8 +143,9 @@ import secrets
 import os
 from src.utils.crypto import get_password_hash
 
-# Almacenamiento temporal de códigos (en-memory, OK para single instance Railway)
-_reset_codes: dict[int, dict] = {}  # {telegram_user_id: {code, expires_at, attempts, user_id}}
+# Almacenamiento temporal de códigos (en-memory, OK para single instance Railway).
+# Los códigos no usados se liberan solos al vencer (10 min).
+_reset_codes = TTLMap(600, max_size=10_000, name="operator_reset_codes")  # {telegram_user_id: {code, expires_at, attempts, user_id}}
 
 class PasswordResetRequest(BaseModel):
     email: EmailStr
@@ -222,7 +225,7 @@ async def request_password_reset(payload: PasswordResetRequest, request: Request
     except Exception as e:
         _logger.error("Error sending reset code via Telegram: %s", e)
         # No fallar — el usuario no debe saber si el envío falló
-        del _reset_codes[int(telegram_id)]
+        _reset_codes.pop(int(telegram_id), None)
         return {"message": msg}
 
     return {"message": msg}
@@ -273,12 +276,12 @@ async def reset_password(payload: PasswordResetConfirm, request: Request):
 
     # Verificar expiración
     if stored["expires_at"] < datetime.utcnow():
-        del _reset_codes[int(telegram_id)]
+        _reset_codes.pop(int(telegram_id), None)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Código expirado. Solicita uno nuevo.")
 
     # Verificar intentos
     if stored["attempts"] >= 3:
-        del _reset_codes[int(telegram_id)]
+        _reset_codes.pop(int(telegram_id), None)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Demasiados intentos. Solicita un nuevo código.")
 
     # Verificar código
@@ -302,7 +305,7 @@ async def reset_password(payload: PasswordResetConfirm, request: Request):
         await conn.commit()
 
     # Limpiar código usado
-    del _reset_codes[int(telegram_id)]
+    _reset_codes.pop(int(telegram_id), None)
 
     # Notificar cambio exitoso vía Telegram
     try:
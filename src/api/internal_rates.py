@@ -10,6 +10,7 @@ logger = logging.getLogger(__name__)
 class InternalRegenerateRequest(BaseModel):
     kind: str = "manual"
     reason: str = "Regeneración interna"
+    skip_if_unchanged: bool = True  # False = escribe versión nueva aunque nada haya cambiado
 
 @router.post("/regenerate")
 async def internal_regenerate_rates(
@@ -36,14 +37,20 @@ async def internal_regenerate_rates(
 
     try:
         logger.info(f"[INTERNAL] Regenerando tasas solicitado. Kind: {body.kind}, Reason: {body.reason}")
-        result = await generate_rates_full(kind=body.kind, reason=body.reason)
+        result = await generate_rates_full(
+            kind=body.kind,
+            reason=body.reason,
+            skip_if_unchanged=body.skip_if_unchanged,
+        )
 
         return {
             "ok": True,
             "version_id": result.version_id,
             "countries_ok": result.countries_ok,
             "countries_failed": result.countries_failed,
-            "any_unverified": result.any_unverified
+            "countries_circuit_open": result.countries_circuit_open,
+            "any_unverified": result.any_unverified,
+            "skipped_unchanged": result.skipped_unchanged,
         }
     except Exception as e:
         logger.exception("Error en regeneración interna")
@@ -1,36 +1,27 @@
 from fastapi import APIRouter
 import logging
 
-from src.db.repositories.rates_repo import get_latest_active_rate_version
+from src.rates_snapshot import get_rates_snapshot
 
 router = APIRouter(prefix="/api/rates", tags=["rates"])
 logger = logging.getLogger(__name__)
 
 @router.get("/current")
 async def get_current_rates():
-    rv = await get_latest_active_rate_version()
-    if not rv:
+    snap = await get_rates_snapshot()
+    if not snap:
         return {"rates": []}
-    
-    from src.db.connection import get_async_conn
-    async with get_async_conn() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("""
-                SELECT origin_country, dest_country, rate_client, commission_pct
-                FROM route_rates WHERE rate_version_id = %s
-            """, (rv.id,))
-            rows = await cur.fetchall()
-            
+
     return {
-        "timestamp": rv.created_at.isoformat(),
-        "version_id": rv.id,
+        "timestamp": snap.version.created_at.isoformat(),
+        "version_id": snap.version_id,
         "rates": [
             {
-                "origin": r[0],
-                "dest": r[1],
-                "rate": float(r[2]),
-                "commission_pct": float(r[3] * 100)
+                "origin": rr.origin_country,
+                "dest": rr.dest_country,
+                "rate": float(rr.rate_client),
+                "commission_pct": float(rr.commission_pct * 100)
             }
-            for r in rows
+            for rr in snap.routes.values()
         ]
     }
@@ -4,108 +4,224 @@ Sistema de configuración dinámico con jerarquía:
 2. Variables de entorno (.env)
 3. Fallback hardcoded (settings.py)
 
-Cache: 60s por configuración
+Cache: mapa de settings en memoria (src/db/settings_store.py); las comisiones
+se compilan en una tabla origin×dest que solo se rehace si cambian sus settings.
 Audit log: todos los cambios quedan registrados
 """
 
 from __future__ import annotations
 from decimal import Decimal
-from typing import Literal
+from types import MappingProxyType
+from typing import Any, Iterable, Literal, Mapping
+import json
 import logging
-from src.db.settings_store import get_setting_json
+from src.db.settings_store import get_setting_json, get_settings_map
 from src.config.settings import settings as static_settings
 
 logger = logging.getLogger(__name__)
 
 CommissionType = Literal["default", "venezuela", "usa_to_venezuela"]
 
+# Settings que alimentan la tabla de comisiones (más margin_origin_*)
+_COMMISSION_KEYS = (
+    "commission_routes",
+    "cash_delivery",
+    "margin_route_usa_venez",
+    "margin_dest_venez",
+    "margin_default",
+)
+_ORIGIN_PREFIX = "margin_origin_"
+_CASH_DEST = "VENEZUELA_CASH"
+
+_MIN_COMMISSION = Decimal("0.0")
+_MAX_COMMISSION = Decimal("0.50")  # 50% máximo
+
+_DEFAULT_ZELLE_COST = Decimal("1.03")
+_DEFAULT_MARGIN_ZELLE = Decimal("0.12")
+_DEFAULT_MARGIN_GENERAL = Decimal("0.10")
+
+
+def _clamp(val: Decimal, label: str) -> Decimal:
+    """Valida que comisión esté en rango [0, 0.50]."""
+    if val < _MIN_COMMISSION:
+        logger.error(f"Commission '{label}' below minimum: {val} -> clamped to {_MIN_COMMISSION}")
+        return _MIN_COMMISSION
+    if val > _MAX_COMMISSION:
+        logger.error(f"Commission '{label}' above maximum: {val} -> clamped to {_MAX_COMMISSION}")
+        return _MAX_COMMISSION
+    return val
+
+
+def _setting_percent(cfg: Mapping[str, Any], key: str, fallback: float | None) -> Decimal | None:
+    """
+    value_json[key]["percent"] con fallback (misma semántica que get_setting_float).
+    Con fallback None, devuelve None si la key/campo no existen.
+    """
+    data = cfg.get(key)
+    if not data or "percent" not in data:
+        return Decimal(str(fallback)) if fallback is not None else None
+    default = fallback if fallback is not None else 0.0
+    if data["percent"] is None:
+        return Decimal(str(default))
+    try:
+        return Decimal(str(float(data["percent"])))
+    except Exception:
+        return Decimal(str(default))
+
+
+def _cash_delivery_from(config: Mapping[str, Any] | None) -> dict[str, Decimal]:
+    if config:
+        try:
+            zelle_cost = Decimal(str(config.get("zelle_usdt_cost", "1.03")))
+            margin_zelle = Decimal(str(config.get("margin_cash_zelle", "12.0"))) / Decimal("100")
+            margin_general = Decimal(str(config.get("margin_cash_general", "10.0"))) / Decimal("100")
+
+            # Validaciones de seguridad
+            if zelle_cost <= Decimal("0"):
+                zelle_cost = _DEFAULT_ZELLE_COST
+            return {
+                "zelle_usdt_cost": zelle_cost,
+                "margin_cash_zelle": _clamp(margin_zelle, "margin_cash_zelle"),
+                "margin_cash_general": _clamp(margin_general, "margin_cash_general"),
+            }
+        except Exception as e:
+            logger.warning(f"Error reading cash_delivery config: {e}")
+
+    return {
+        "zelle_usdt_cost": _DEFAULT_ZELLE_COST,
+        "margin_cash_zelle": _DEFAULT_MARGIN_ZELLE,
+        "margin_cash_general": _DEFAULT_MARGIN_GENERAL,
+    }
+
+
+def resolve_commission_pct(cfg: Mapping[str, Any], origin: str, dest: str) -> Decimal:
+    """
+    % comisión para una ruta a partir del mapa de settings (sin I/O).
+    Jerarquía:
+    1. Ruta específica (DB: commission_routes → {CHILE_VENEZUELA: 0.02})
+    2. Efectivo USD (VENEZUELA_CASH): cash_delivery
+    3. Por destino (DB: margin_route_usa_venez / margin_dest_venez → {"percent": 0.03})
+    4. Por origen (DB: margin_origin_chile → {"percent": 0.04})
+    5. Default (DB: margin_default → {"percent": 0.05})
+    6. Fallback hardcoded (settings.COMMISSION_*)
+
+    Retorna SIEMPRE decimal (0.06 = 6%), ya acotado a [0, 0.50].
+    """
+    origin_u = origin.upper()
+    dest_u = dest.upper()
+
+    # 1. Ruta específica
+    route_key = f"{origin_u}_{dest_u}"
+    routes_config = cfg.get("commission_routes")
+    if routes_config and route_key in routes_config:
+        try:
+            val = Decimal(str(routes_config[route_key]))
+            return _clamp(val, f"route:{route_key}")
+        except Exception as e:
+            logger.warning(f"Invalid route commission {route_key}: {e}")
+
+    # 2. Efectivo USD (VENEZUELA_CASH) - margen especial
+    if dest_u == _CASH_DEST:
+        cash_cfg = _cash_delivery_from(cfg.get("cash_delivery"))
+        if origin_u == "USA":
+            return _clamp(cash_cfg["margin_cash_zelle"], "cash_zelle")
+        return _clamp(cash_cfg["margin_cash_general"], "cash_general")
+
+    # 3. Por destino (legacy compatible)
+    if dest_u == "VENEZUELA":
+        if origin_u == "USA":
+            val = _setting_percent(cfg, "margin_route_usa_venez", static_settings.COMMISSION_USA_TO_VENEZUELA)
+            return _clamp(val, "usa->venez")
+        val = _setting_percent(cfg, "margin_dest_venez", static_settings.COMMISSION_VENEZUELA)
+        return _clamp(val, "dest:venezuela")
+
+    # 4. Por origen
+    origin_key = f"{_ORIGIN_PREFIX}{origin_u.lower()}"
+    origin_val = _setting_percent(cfg, origin_key, None)
+    if origin_val is not None:
+        return _clamp(origin_val, f"origin:{origin_u}")
+
+    # 5. Default
+    val = _setting_percent(cfg, "margin_default", static_settings.COMMISSION_DEFAULT)
+    return _clamp(val, "default")
+
+
+def _commission_inputs(cfg: Mapping[str, Any]) -> tuple:
+    """Huella de los settings que afectan comisiones (para no recompilar por cambios ajenos)."""
+    keys = sorted(k for k in cfg if k in _COMMISSION_KEYS or k.startswith(_ORIGIN_PREFIX))
+    return tuple((k, json.dumps(cfg[k], sort_keys=True, default=str)) for k in keys)
+
+
+class CommissionTable:
+    """
+    Tabla origin×dest de comisiones ya resueltas y acotadas (Decimal).
+    Se compila una vez por cambio de settings relevantes; lookup O(1).
+    """
+
+    def __init__(self, cfg: Mapping[str, Any], codes: Iterable[str]):
+        self._cfg = cfg
+        codes = [c.upper() for c in codes]
+        table: dict[tuple[str, str], Decimal] = {}
+        for origin in codes:
+            for dest in [*codes, _CASH_DEST]:
+                if origin != dest:
+                    table[(origin, dest)] = resolve_commission_pct(cfg, origin, dest)
+        self._table = MappingProxyType(table)
+
+    def get(self, origin: str, dest: str) -> Decimal:
+        key = (origin.upper(), dest.upper())
+        val = self._table.get(key)
+        if val is None:
+            # Ruta fuera de la tabla (país no configurado): se resuelve igual
+            val = resolve_commission_pct(self._cfg, *key)
+        return val
+
+    def matrix(self) -> Mapping[tuple[str, str], Decimal]:
+        """Todas las parejas (origin, dest) compiladas, incluido VENEZUELA_CASH."""
+        return self._table
+
+
 class DynamicConfig:
     """Gestor de configuración dinámica con jerarquía."""
 
+    def __init__(self) -> None:
+        self._commission_table: CommissionTable | None = None
+        self._commission_source: Mapping[str, Any] | None = None
+        self._commission_inputs: tuple | None = None
+        self.commission_compiles = 0
+
+    async def commission_table(self) -> CommissionTable:
+        """
+        Tabla de comisiones compilada. Solo se recompila cuando cambia alguno
+        de los settings de comisión (commission_routes, cash_delivery,
+        margin_route_usa_venez, margin_dest_venez, margin_origin_*, margin_default).
+        """
+        cfg = await get_settings_map()
+        if cfg is self._commission_source and self._commission_table is not None:
+            return self._commission_table
+
+        inputs = _commission_inputs(cfg)
+        if inputs != self._commission_inputs or self._commission_table is None:
+            from src.integrations.p2p_config import COUNTRIES
+            self._commission_table = CommissionTable(cfg, COUNTRIES.keys())
+            self._commission_inputs = inputs
+            self.commission_compiles += 1
+            logger.info("Commission table compiled (%d routes)", len(self._commission_table.matrix()))
+        self._commission_source = cfg
+        return self._commission_table
+
     async def get_commission_pct(
         self,
         origin: str,
         dest: str,
     ) -> Decimal:
         """
-        Obtiene % comisión con jerarquía:
-        1. Ruta específica (DB: commission_routes → {CHILE_VENEZUELA: 0.02})
-        2. Por destino (DB: margin_dest_venez → {"percent": 0.03})
-        3. Por origen (DB: margin_origin_chile → {"percent": 0.04})
-        4. Default (DB: margin_default → {"percent": 0.05})
-        5. Fallback hardcoded (settings.COMMISSION_DEFAULT)
+        Obtiene % comisión (ver resolve_commission_pct para la jerarquía).
+        Lookup O(1) en la tabla compilada.
 
         Retorna SIEMPRE decimal (0.06 = 6%)
         """
-        origin_u = origin.upper()
-        dest_u = dest.upper()
-
-        # 1. Ruta específica (nueva funcionalidad)
-        route_key = f"{origin_u}_{dest_u}"
-        routes_config = await get_setting_json("commission_routes")
-        if routes_config and route_key in routes_config:
-            try:
-                val = Decimal(str(routes_config[route_key]))
-                logger.info(f"Commission route {route_key}: {val} (from DB)")
-                return self._clamp(val, f"route:{route_key}")
-            except Exception as e:
-                logger.warning(f"Invalid route commission {route_key}: {e}")
-
-        # 2. Efectivo USD (VENEZUELA_CASH) - margen especial
-        if dest_u == "VENEZUELA_CASH":
-            cash_cfg = await self.get_cash_delivery_config()
-            if origin_u == "USA":
-                return self._clamp(cash_cfg["margin_cash_zelle"], "cash_zelle")
-            return self._clamp(cash_cfg["margin_cash_general"], "cash_general")
-
-        # 3. Por destino (legacy compatible)
-        if dest_u == "VENEZUELA":
-            if origin_u == "USA":
-                val = await self._get_from_db("margin_route_usa_venez", "percent",
-                                               static_settings.COMMISSION_USA_TO_VENEZUELA)
-                return self._clamp(val, "usa->venez")
-            val = await self._get_from_db("margin_dest_venez", "percent",
-                                          static_settings.COMMISSION_VENEZUELA)
-            return self._clamp(val, "dest:venezuela")
-
-        # 3. Por origen (nueva funcionalidad)
-        origin_key = f"margin_origin_{origin_u.lower()}"
-        origin_val = await self._get_from_db(origin_key, "percent", None)
-        if origin_val is not None:
-            return self._clamp(origin_val, f"origin:{origin_u}")
-
-        # 4. Default
-        val = await self._get_from_db("margin_default", "percent",
-                                      static_settings.COMMISSION_DEFAULT)
-        return self._clamp(val, "default")
-
-    async def _get_from_db(self, key: str, field: str, fallback: float | None) -> Decimal | None:
-        """Lee valor de settings.value_json con fallback."""
-        try:
-            from src.db.settings_store import get_setting_float
-            val = await get_setting_float(key, field, fallback if fallback is not None else 0.0)
-            if fallback is None and val == 0.0:
-                # Verificar si realmente es 0 o si no existe
-                data = await get_setting_json(key)
-                if not data or field not in data:
-                    return None
-            return Decimal(str(val))
-        except Exception as e:
-            logger.warning(f"Error reading {key}.{field} from DB: {e}")
-            return Decimal(str(fallback)) if fallback is not None else None
-
-    def _clamp(self, val: Decimal, label: str) -> Decimal:
-        """Valida que comisión esté en rango [0, 0.50]."""
-        MIN_COMMISSION = Decimal("0.0")
-        MAX_COMMISSION = Decimal("0.50")  # 50% máximo
-
-        if val < MIN_COMMISSION:
-            logger.error(f"Commission '{label}' below minimum: {val} -> clamped to {MIN_COMMISSION}")
-            return MIN_COMMISSION
-        if val > MAX_COMMISSION:
-            logger.error(f"Commission '{label}' above maximum: {val} -> clamped to {MAX_COMMISSION}")
-            return MAX_COMMISSION
-        return val
+        return (await self.commission_table()).get(origin, dest)
 
     async def get_cash_delivery_config(self) -> dict[str, Decimal]:
         """
@@ -115,36 +231,33 @@ class DynamicConfig:
         Los márgenes están en porcentaje (12.0 = 12%) internamente se convierten a decimal (0.12).
         Defaults: zelle_usdt_cost=1.03, margin_cash_zelle=12%, margin_cash_general=10%
         """
-        DEFAULT_ZELLE_COST = Decimal("1.03")
-        DEFAULT_MARGIN_ZELLE = Decimal("0.12")
-        DEFAULT_MARGIN_GENERAL = Decimal("0.10")
-
         try:
             config = await get_setting_json("cash_delivery")
-            if config:
-                zelle_cost = Decimal(str(config.get("zelle_usdt_cost", "1.03")))
-                margin_zelle = Decimal(str(config.get("margin_cash_zelle", "12.0"))) / Decimal("100")
-                margin_general = Decimal(str(config.get("margin_cash_general", "10.0"))) / Decimal("100")
-
-                # Validaciones de seguridad
-                if zelle_cost <= Decimal("0"):
-                    zelle_cost = DEFAULT_ZELLE_COST
-                margin_zelle = self._clamp(margin_zelle, "margin_cash_zelle")
-                margin_general = self._clamp(margin_general, "margin_cash_general")
-
-                return {
-                    "zelle_usdt_cost": zelle_cost,
-                    "margin_cash_zelle": margin_zelle,
-                    "margin_cash_general": margin_general,
-                }
         except Exception as e:
             logger.warning(f"Error reading cash_delivery config: {e}")
+            config = None
+        return _cash_delivery_from(config)
 
-        return {
-            "zelle_usdt_cost": DEFAULT_ZELLE_COST,
-            "margin_cash_zelle": DEFAULT_MARGIN_ZELLE,
-            "margin_cash_general": DEFAULT_MARGIN_GENERAL,
-        }
+    async def get_rates_diff_epsilon(self) -> dict[str, Decimal]:
+        """
+        Umbral de cambio material por ruta al regenerar tasas (variación relativa de rate_client).
+        Key DB: rates_diff_epsilon → {"default": 0.0005, "USA_VENEZUELA": 0.0001}
+        Fallback: settings.RATES_DIFF_EPSILON
+        """
+        out = {"default": Decimal(str(static_settings.RATES_DIFF_EPSILON))}
+        config = await get_setting_json("rates_diff_epsilon")
+        if config:
+            for key, raw in config.items():
+                try:
+                    val = Decimal(str(raw))
+                except Exception as e:
+                    logger.warning(f"Invalid rates_diff_epsilon {key}: {e}")
+                    continue
+                if val < 0:
+                    logger.warning(f"Negative rates_diff_epsilon {key}: {val} (ignored)")
+                    continue
+                out[str(key).upper() if key != "default" else key] = val
+        return out
 
     async def get_profit_split(self) -> dict[str, Decimal]:
         """
@@ -54,6 +54,68 @@ class Settings(BaseSettings):
     COMMISSION_DEFAULT: float = 0.10          # 10%
     COMMISSION_USA_TO_VENEZUELA: float = 0.10 # 10%
 
+    # Generación de tasas (Binance P2P)
+    RATES_FETCH_CONCURRENCY: int = 8          # consultas BUY/SELL simultáneas a Binance
+    RATES_COUNTRY_DEADLINE_SECONDS: float = 25.0  # tiempo máximo por país (BUY+SELL)
+    RATES_METHOD_HEDGE_DELAY_SECONDS: float = 2.5  # lanza el método siguiente en paralelo (0 = secuencial)
+    RATES_INCREMENTAL_REGEN: bool = True      # check 30m: solo refresca países que variaron
+    RATES_SKIP_UNCHANGED: bool = True         # no escribe versión nueva si ninguna ruta cambió de forma material
+    RATES_DIFF_EPSILON: float = 0.0005        # variación relativa mínima de rate_client (0.05%); DB: rates_diff_epsilon
+    RATES_SNAPSHOT_LISTEN: bool = True        # LISTEN rate_version_switched para refrescar el snapshot en memoria
+    RATES_SNAPSHOT_POLL_SECONDS: float = 30.0 # polling de respaldo de la versión activa
+
+    # Cliente HTTP compartido hacia Binance P2P
+    BINANCE_TIMEOUT_SECONDS: float = 10.0
+    BINANCE_HTTP2: bool = False               # requiere el paquete 'h2'
+    BINANCE_MAX_CONNECTIONS: int = 20
+    BINANCE_MAX_KEEPALIVE: int = 10
+    BINANCE_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    BINANCE_CB_FAILURE_THRESHOLD: int = 3     # fallos consecutivos para abrir el circuito (por fiat/lado)
+    BINANCE_CB_COOLDOWN_SECONDS: float = 60.0 # tiempo en fail-fast antes de probar de nuevo
+
+    # Cache de cotizaciones P2P (0 = sin cache, solo stale-on-error)
+    P2P_QUOTE_TTL_SECONDS: float = 60.0
+    P2P_QUOTE_MAX_STALE_SECONDS: float = 900.0  # ventana extra para servir valor vencido si Binance falla
+
+    # Subidas al Vault (Google Drive) en background
+    DRIVE_UPLOAD_WORKERS: int = 4             # hilos para llamadas síncronas a la API de Drive
+    DRIVE_UPLOAD_POLL_SECONDS: float = 15.0   # revisión del outbox si nadie despierta al worker
+    DRIVE_UPLOAD_BACKOFF_BASE_SECONDS: float = 30.0
+    DRIVE_UPLOAD_BACKOFF_MAX_SECONDS: float = 3600.0
+    DRIVE_UPLOAD_MAX_ATTEMPTS: int = 15       # luego queda FAILED (backfill --retry-failed)
+    DRIVE_STREAM_CHUNK_BYTES: int = 1048576   # memoria por transferencia Telegram->Drive (múltiplo de 256 KiB)
+    DRIVE_STREAM_MAX_CONCURRENT: int = 4      # transferencias simultáneas
+    DRIVE_STREAM_TIMEOUT_SECONDS: float = 60.0
+    DRIVE_IMAGE_PIPELINE: bool = True         # dedupe por contenido + downscale antes de subir
+    DRIVE_IMAGE_MAX_INPUT_BYTES: int = 10_000_000  # archivos más grandes van por streaming (solo hash)
+    DRIVE_IMAGE_DOWNSCALE_MIN_BYTES: int = 1_048_576  # más chicos se suben tal cual por streaming (sin buffer)
+    DRIVE_IMAGE_MAX_SIDE: int = 2048          # lado mayor máximo en px (0 = sin downscale; requiere Pillow)
+    DRIVE_IMAGE_JPEG_QUALITY: int = 85
+    DRIVE_IMAGE_PROCESSES: int = 2            # pool de procesos para hash / re-encode
+
+    # Difusiones (panel admin)
+    BROADCAST_RATE_PER_SECOND: float = 25.0   # token bucket global (Telegram: ~30 msg/s por bot)
+    BROADCAST_CONCURRENCY: int = 8            # envíos simultáneos
+
+    # Notificaciones a operadores / grupos (outbox, src/telegram_app/notification_dispatcher.py)
+    NOTIFY_RATE_PER_SECOND: float = 10.0      # token bucket propio (aparte de las difusiones)
+    NOTIFY_BATCH_SIZE: int = 50               # filas reclamadas por vuelta
+    NOTIFY_POLL_SECONDS: float = 10.0         # revisión del outbox si nadie despierta al dispatcher
+    NOTIFY_MAX_ATTEMPTS: int = 8              # luego queda FAILED
+
+    # Updates de Telegram en paralelo entre chats (en orden dentro de cada chat)
+    BOT_CONCURRENT_UPDATES: int = 32          # 1 = secuencial (comportamiento anterior)
+    WEBHOOK_MAX_PENDING: int = 1000           # updates sin empezar antes de responder 503
+    WEBHOOK_DEDUPE_SECONDS: float = 600.0     # ventana de update_id ya vistos
+
+    # Persistencia de PTB (user_data / chat_data / conversaciones)
+    PERSISTENCE_BACKEND: str = "postgres"     # postgres | pickle
+    PERSISTENCE_PICKLE_PATH: str = "bot_persistence.pickle"
+    PERSISTENCE_UPDATE_INTERVAL_SECONDS: float = 10.0
+
+    # Estado en memoria acotado (src/utils/bounded_state.py)
+    BOUNDED_STATE_SWEEP_SECONDS: float = 60.0
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
     @property
@@ -9,6 +9,7 @@ from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
 import psycopg
+from psycopg import sql
 from psycopg_pool import AsyncConnectionPool
 
 logger = logging.getLogger("db")
@@ -107,6 +108,21 @@ async def get_async_conn() -> AsyncGenerator[psycopg.AsyncConnection, None]:
                 logger.info(f"Query info: {elapsed:.3f}s")
 
 
+async def connect_listener(*channels: str) -> psycopg.AsyncConnection:
+    """
+    Conexión dedicada (fuera del pool) en autocommit con LISTEN a `channels`.
+    El caller la consume con `conn.notifies()` y la cierra al terminar.
+    """
+    conn = await psycopg.AsyncConnection.connect(_get_database_url(), autocommit=True)
+    try:
+        for channel in channels:
+            await conn.execute(sql.SQL("LISTEN {};").format(sql.Identifier(channel)))
+    except Exception:
+        await conn.close()
+        raise
+    return conn
+
+
 async def open_pool() -> None:
     """Abre el pool de conexiones de forma explícita e idempotente."""
     pool = get_pool()
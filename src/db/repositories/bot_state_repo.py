@@ -0,0 +1,120 @@
+"""
+Repositorio de la persistencia del bot (bot_state + bot_conversations).
+
+- bot_state: una fila por (kind, owner_id); `data` es un jsonb
+  clave -> valor serializado. Los cambios se aplican por clave
+  (data - removidas || cambiadas): escribir a un usuario no reescribe el
+  resto de su data ni la de nadie más.
+- bot_conversations: una fila por conversación activa de cada
+  ConversationHandler persistente; terminar la conversación borra la fila.
+- write_state_batch aplica un lote completo en UNA transacción.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from psycopg.types.json import Jsonb
+
+from src.db.connection import get_async_conn
+
+KIND_USER = "user"
+KIND_CHAT = "chat"
+KIND_BOT = "bot"
+
+
+@dataclass
+class StatePatch:
+    """Cambios pendientes de una fila de bot_state."""
+    kind: str
+    owner_id: int
+    changed: dict[str, str] = field(default_factory=dict)
+    removed: set[str] = field(default_factory=set)
+    drop: bool = False
+
+
+async def load_state(kind: str, owner_id: int) -> dict[str, str] | None:
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT data FROM bot_state WHERE kind = %s AND owner_id = %s;",
+                (kind, int(owner_id)),
+            )
+            row = await cur.fetchone()
+    return dict(row[0]) if row else None
+
+
+async def load_conversations(name: str) -> list[tuple[str, bytes]]:
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT conv_key, state FROM bot_conversations WHERE name = %s;", (name,))
+            rows = await cur.fetchall()
+    return [(str(r[0]), bytes(r[1])) for r in rows]
+
+
+async def write_state_batch(
+    patches: list[StatePatch],
+    conversations: list[tuple[str, str, bytes | None]],
+) -> None:
+    """
+    Aplica parches de bot_state y estados de conversación
+    (name, conv_key, state; None = conversación terminada).
+    """
+    upserts = [p for p in patches if p.changed or p.removed]
+    drops = [p for p in patches if p.drop]
+    conv_set = [(n, k, s) for n, k, s in conversations if s is not None]
+    conv_del = [(n, k) for n, k, s in conversations if s is None]
+    if not (upserts or drops or conv_set or conv_del):
+        return
+
+    async with get_async_conn() as conn:
+        async with conn.transaction():
+            async with conn.cursor() as cur:
+                if drops:  # primero: un drop seguido de data nueva deja solo la nueva
+                    await cur.executemany(
+                        "DELETE FROM bot_state WHERE kind = %s AND owner_id = %s;",
+                        [(p.kind, int(p.owner_id)) for p in drops],
+                    )
+                if upserts:
+                    await cur.executemany(
+                        """
+                        INSERT INTO bot_state (kind, owner_id, data, updated_at)
+                        VALUES (%s, %s, %s, now())
+                        ON CONFLICT (kind, owner_id) DO UPDATE
+                           SET data = (bot_state.data - %s::text[]) || EXCLUDED.data,
+                               updated_at = now();
+                        """,
+                        [
+                            (p.kind, int(p.owner_id), Jsonb(p.changed), sorted(p.removed))
+                            for p in upserts
+                        ],
+                    )
+                if conv_del:
+                    await cur.executemany(
+                        "DELETE FROM bot_conversations WHERE name = %s AND conv_key = %s;",
+                        conv_del,
+                    )
+                if conv_set:
+                    await cur.executemany(
+                        """
+                        INSERT INTO bot_conversations (name, conv_key, state, updated_at)
+                        VALUES (%s, %s, %s, now())
+                        ON CONFLICT (name, conv_key) DO UPDATE
+                           SET state = EXCLUDED.state, updated_at = now();
+                        """,
+                        conv_set,
+                    )
+
+
+async def count_state_rows() -> dict[str, int]:
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT kind, count(*) FROM bot_state GROUP BY kind
+                UNION ALL
+                SELECT 'conversations', count(*) FROM bot_conversations;
+                """
+            )
+            rows = await cur.fetchall()
+    return {str(r[0]): int(r[1]) for r in rows}
@@ -0,0 +1,258 @@
+"""
+Repositorio de difusiones (broadcasts + broadcast_recipients).
+
+- Al confirmar se materializa la lista de destinatarios (una fila por
+  operador activo, sin los que bloquearon el bot): el progreso queda en DB
+  y un reinicio retoma solo los PENDING.
+- Los resultados se guardan por lotes (record_broadcast_results) junto con
+  los contadores de la difusión y user_contacts.blocked_at.
+- Una difusión RUNNING la envía solo la instancia que tiene su lease
+  (claim_broadcasts, FOR UPDATE SKIP LOCKED, como los outbox): el dueño lo
+  renueva mientras envía y, si muere, vence y otra réplica la retoma.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from src.db.connection import get_async_conn
+
+SENT = "SENT"
+BLOCKED = "BLOCKED"
+FAILED = "FAILED"
+
+_RECIPIENTS_SQL = """
+    SELECT DISTINCT u.telegram_user_id
+      FROM users u
+     WHERE u.is_active = true
+       AND u.telegram_user_id IS NOT NULL
+       AND NOT EXISTS (
+           SELECT 1 FROM user_contacts c
+            WHERE c.telegram_user_id = u.telegram_user_id AND c.blocked_at IS NOT NULL
+       )
+"""
+
+
+@dataclass(frozen=True)
+class Broadcast:
+    id: int
+    admin_telegram_id: int
+    from_chat_id: int
+    message_id: int
+    status: str
+    total: int
+    sent: int
+    blocked: int
+    failed: int
+    progress_chat_id: int | None
+    progress_message_id: int | None
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.blocked + self.failed
+
+
+_COLS = """id, admin_telegram_id, from_chat_id, message_id, status, total, sent, blocked, failed,
+           progress_chat_id, progress_message_id"""
+
+
+def _row(r) -> Broadcast:
+    return Broadcast(
+        int(r[0]), int(r[1]), int(r[2]), int(r[3]), str(r[4]), int(r[5]), int(r[6]), int(r[7]), int(r[8]),
+        int(r[9]) if r[9] is not None else None,
+        int(r[10]) if r[10] is not None else None,
+    )
+
+
+async def count_broadcast_recipients() -> int:
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(f"SELECT count(*) FROM ({_RECIPIENTS_SQL}) r;")
+            row = await cur.fetchone()
+    return int(row[0]) if row else 0
+
+
+async def create_broadcast(
+    *,
+    admin_telegram_id: int,
+    from_chat_id: int,
+    message_id: int,
+    progress_chat_id: int | None = None,
+    progress_message_id: int | None = None,
+) -> Broadcast:
+    """Crea la difusión y su lista de destinatarios (una transacción)."""
+    async with get_async_conn() as conn:
+        async with conn.transaction():
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO broadcasts (admin_telegram_id, from_chat_id, message_id, progress_chat_id, progress_message_id)
+                    VALUES (%s, %s, %s, %s, %s)
+                    RETURNING id;
+                    """,
+                    (int(admin_telegram_id), int(from_chat_id), int(message_id), progress_chat_id, progress_message_id),
+                )
+                broadcast_id = int((await cur.fetchone())[0])
+                await cur.execute(
+                    f"""
+                    INSERT INTO broadcast_recipients (broadcast_id, telegram_user_id)
+                    SELECT %s, r.telegram_user_id FROM ({_RECIPIENTS_SQL}) r;
+                    """,
+                    (broadcast_id,),
+                )
+                await cur.execute(
+                    f"""
+                    UPDATE broadcasts
+                       SET total = (SELECT count(*) FROM broadcast_recipients WHERE broadcast_id = %s)
+                     WHERE id = %s
+                    RETURNING {_COLS};
+                    """,
+                    (broadcast_id, broadcast_id),
+                )
+                return _row(await cur.fetchone())
+
+
+async def get_broadcast(broadcast_id: int) -> Broadcast | None:
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(f"SELECT {_COLS} FROM broadcasts WHERE id = %s;", (int(broadcast_id),))
+            row = await cur.fetchone()
+    return _row(row) if row else None
+
+
+async def claim_broadcasts(
+    *,
+    owner: str,
+    lease_seconds: float,
+    broadcast_id: int | None = None,
+) -> list[Broadcast]:
+    """
+    Arrienda a `owner` las difusiones RUNNING sin lease vigente (o solo
+    `broadcast_id`). Un lease propio se renueva; uno ajeno vigente se salta.
+    """
+    sql = f"""
+        UPDATE broadcasts b
+           SET lease_owner = %s,
+               lease_until = now() + make_interval(secs => %s)
+         WHERE b.id IN (
+                SELECT id FROM broadcasts
+                 WHERE status = 'RUNNING'
+                   AND (%s::bigint IS NULL OR id = %s::bigint)
+                   AND (lease_until IS NULL OR lease_until <= now() OR lease_owner = %s)
+                 ORDER BY id
+                 FOR UPDATE SKIP LOCKED
+         )
+        RETURNING {_COLS};
+    """
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, (owner, float(lease_seconds), broadcast_id, broadcast_id, owner))
+            rows = await cur.fetchall()
+    return sorted((_row(r) for r in rows), key=lambda b: b.id)
+
+
+async def renew_broadcast_leases(ids: list[int], *, owner: str, lease_seconds: float) -> set[int]:
+    """Extiende los leases de `owner`. Devuelve las difusiones que sigue teniendo."""
+    if not ids:
+        return set()
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE broadcasts
+                   SET lease_until = now() + make_interval(secs => %s)
+                 WHERE id = ANY(%s) AND lease_owner = %s AND status = 'RUNNING'
+                RETURNING id;
+                """,
+                (float(lease_seconds), [int(i) for i in ids], owner),
+            )
+            return {int(r[0]) for r in await cur.fetchall()}
+
+
+async def has_running_broadcast(admin_telegram_id: int) -> bool:
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT 1 FROM broadcasts WHERE status = 'RUNNING' AND admin_telegram_id = %s LIMIT 1;",
+                (int(admin_telegram_id),),
+            )
+            return (await cur.fetchone()) is not None
+
+
+async def fetch_pending_recipients(broadcast_id: int, *, limit: int) -> list[int]:
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT telegram_user_id FROM broadcast_recipients
+                 WHERE broadcast_id = %s AND status = 'PENDING'
+                 ORDER BY telegram_user_id
+                 LIMIT %s;
+                """,
+                (int(broadcast_id), int(limit)),
+            )
+            return [int(r[0]) for r in await cur.fetchall()]
+
+
+async def record_broadcast_results(broadcast_id: int, results: list[tuple[int, str, str | None]]) -> None:
+    """
+    Guarda (telegram_user_id, status, error) de un lote y suma los contadores.
+    Los BLOCKED quedan marcados en user_contacts para futuras difusiones.
+    Idempotente: solo cuentan los destinatarios que seguían PENDING, así un
+    lote reintentado tras un fallo no duplica los contadores.
+    """
+    if not results:
+        return
+    blocked_ids = [tg for tg, status, _ in results if status == BLOCKED]
+
+    async with get_async_conn() as conn:
+        async with conn.transaction():
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    WITH upd AS (
+                        UPDATE broadcast_recipients r
+                           SET status = v.status, error = v.error, updated_at = now()
+                          FROM unnest(%s::bigint[], %s::text[], %s::text[]) AS v(tg, status, error)
+                         WHERE r.broadcast_id = %s AND r.telegram_user_id = v.tg AND r.status = 'PENDING'
+                        RETURNING r.status
+                    )
+                    UPDATE broadcasts
+                       SET sent = sent + (SELECT count(*) FROM upd WHERE status = 'SENT'),
+                           blocked = blocked + (SELECT count(*) FROM upd WHERE status = 'BLOCKED'),
+                           failed = failed + (SELECT count(*) FROM upd WHERE status = 'FAILED')
+                     WHERE id = %s;
+                    """,
+                    (
+                        [int(tg) for tg, _, _ in results],
+                        [status for _, status, _ in results],
+                        [(error or "")[:300] or None for _, _, error in results],
+                        int(broadcast_id),
+                        int(broadcast_id),
+                    ),
+                )
+                if blocked_ids:
+                    await cur.execute(
+                        """
+                        INSERT INTO user_contacts (telegram_user_id, first_seen_at, last_seen_at, blocked_at)
+                        SELECT t, now(), now(), now() FROM unnest(%s::bigint[]) AS t
+                        ON CONFLICT (telegram_user_id) DO UPDATE SET blocked_at = now();
+                        """,
+                        (blocked_ids,),
+                    )
+
+
+async def finish_broadcast(broadcast_id: int) -> Broadcast | None:
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"""
+                UPDATE broadcasts
+                   SET status = 'DONE', finished_at = now(), lease_owner = NULL, lease_until = NULL
+                 WHERE id = %s
+                RETURNING {_COLS};
+                """,
+                (int(broadcast_id),),
+            )
+            row = await cur.fetchone()
+    return _row(row) if row else None
@@ -0,0 +1,286 @@
+"""
+Outbox de subidas al Vault (tabla drive_upload_outbox).
+
+- Los handlers encolan el comprobante (file_id de Telegram) en la MISMA
+  transacción que crea / paga la orden: si la orden existe, su subida también.
+  El INSERT va en un savepoint: si falla, se registra y la orden se confirma
+  igual (backfill la recupera después).
+- El worker (src/utils/drive_uploads.py) reclama filas vencidas con
+  FOR UPDATE SKIP LOCKED (seguro con varias réplicas) y las marca DONE o
+  reprograma con backoff.
+- Un comprobante idéntico a uno ya subido (file_unique_id o SHA-256) de la
+  misma orden y tipo queda DONE apuntando al mismo archivo de Drive
+  (duplicate_of). Si el idéntico es de OTRA orden se sube igual y
+  duplicate_of solo deja constancia (posible comprobante reciclado).
+- backfill encola comprobantes de órdenes históricas sin fila en el outbox.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+import psycopg
+
+from src.db.connection import get_async_conn
+
+logger = logging.getLogger(__name__)
+
+PROOF_ORIGEN = "ORIGEN"
+PROOF_PAGO = "PAGO"
+
+# tipo de comprobante -> (carpeta del Vault, prefijo del archivo)
+PROOF_TYPES: dict[str, tuple[str, str]] = {
+    PROOF_ORIGEN: ("Origen", "ORIGEN_ORDEN"),
+    PROOF_PAGO: ("Pagos", "PAGO_ORDEN"),
+}
+
+
+@dataclass(frozen=True)
+class DriveUpload:
+    id: int
+    order_public_id: int
+    proof_type: str
+    telegram_file_id: str
+    attempts: int
+    telegram_unique_id: str | None = None
+
+    @property
+    def folder_name(self) -> str:
+        return PROOF_TYPES[self.proof_type][0]
+
+    @property
+    def file_name(self) -> str:
+        return f"{PROOF_TYPES[self.proof_type][1]}_{self.order_public_id}.jpg"
+
+
+@dataclass(frozen=True)
+class UploadedProof:
+    """Comprobante ya subido al Vault (candidato a duplicado)."""
+    id: int
+    drive_file_id: str
+    order_public_id: int
+    proof_type: str
+
+    def same_slot(self, job: DriveUpload) -> bool:
+        """Misma orden y mismo tipo de comprobante que `job`."""
+        return self.order_public_id == job.order_public_id and self.proof_type == job.proof_type
+
+
+async def enqueue_drive_upload_tx(
+    conn: psycopg.AsyncConnection,
+    *,
+    order_public_id: int,
+    proof_type: str,
+    telegram_file_id: str,
+    telegram_unique_id: str | None = None,
+) -> bool:
+    """
+    Encola (idempotente por orden + tipo). Un comprobante distinto para la
+    misma orden reemplaza al anterior y se vuelve a subir.
+    `telegram_unique_id` (file_unique_id) permite detectar reenvíos del mismo
+    archivo sin descargarlo.
+
+    Best-effort: corre en un savepoint de la transacción del llamador, así un
+    fallo del outbox no aborta la orden. Devuelve False si no se pudo encolar.
+    """
+    if proof_type not in PROOF_TYPES:
+        raise ValueError(f"proof_type inválido: {proof_type}")
+    try:
+        async with conn.transaction():
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO drive_upload_outbox (order_public_id, proof_type, telegram_file_id, telegram_unique_id)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (order_public_id, proof_type) DO UPDATE
+                       SET telegram_file_id = EXCLUDED.telegram_file_id,
+                           telegram_unique_id = EXCLUDED.telegram_unique_id,
+                           content_sha256 = NULL,
+                           duplicate_of = NULL,
+                           status = 'PENDING',
+                           attempts = 0,
+                           next_attempt_at = now(),
+                           last_error = NULL,
+                           updated_at = now()
+                     WHERE drive_upload_outbox.telegram_file_id <> EXCLUDED.telegram_file_id
+                        OR drive_upload_outbox.status <> 'DONE';
+                    """,
+                    (int(order_public_id), proof_type, telegram_file_id, telegram_unique_id),
+                )
+    except Exception as e:
+        logger.warning(
+            "No se pudo encolar la subida al Vault (orden %s, %s): %s",
+            order_public_id, proof_type, e,
+        )
+        return False
+    return True
+
+
+async def claim_due_uploads(*, limit: int, lease_seconds: float) -> list[DriveUpload]:
+    """
+    Reclama hasta `limit` subidas vencidas. Quedan arrendadas `lease_seconds`
+    (next_attempt_at en el futuro): si el proceso muere, vuelven solas.
+    """
+    sql = """
+        UPDATE drive_upload_outbox o
+           SET attempts = o.attempts + 1,
+               next_attempt_at = now() + make_interval(secs => %s),
+               updated_at = now()
+         WHERE o.id IN (
+                SELECT id FROM drive_upload_outbox
+                 WHERE status = 'PENDING' AND next_attempt_at <= now()
+                 ORDER BY next_attempt_at
+                 LIMIT %s
+                 FOR UPDATE SKIP LOCKED
+         )
+        RETURNING o.id, o.order_public_id, o.proof_type, o.telegram_file_id, o.attempts, o.telegram_unique_id;
+    """
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, (float(lease_seconds), int(limit)))
+            rows = await cur.fetchall()
+    return [DriveUpload(int(r[0]), int(r[1]), str(r[2]), str(r[3]), int(r[4]), r[5]) for r in rows]
+
+
+async def find_uploaded_duplicate(
+    *,
+    telegram_unique_id: str | None = None,
+    content_sha256: str | None = None,
+    exclude_id: int | None = None,
+) -> UploadedProof | None:
+    """
+    Comprobante idéntico ya subido, si existe (el más antiguo). Puede ser de
+    otra orden: decidir si se enlaza queda a cargo del llamador.
+    """
+    if telegram_unique_id:
+        where, param = "telegram_unique_id = %s", telegram_unique_id
+    elif content_sha256:
+        where, param = "content_sha256 = %s", content_sha256
+    else:
+        return None
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"""
+                SELECT id, drive_file_id, order_public_id, proof_type FROM drive_upload_outbox
+                 WHERE {where} AND status = 'DONE' AND drive_file_id IS NOT NULL
+                   AND (%s::bigint IS NULL OR id <> %s::bigint)
+                 ORDER BY id
+                 LIMIT 1;
+                """,
+                (param, exclude_id, exclude_id),
+            )
+            row = await cur.fetchone()
+    return UploadedProof(int(row[0]), str(row[1]), int(row[2]), str(row[3])) if row else None
+
+
+async def mark_upload_done(
+    upload_id: int,
+    drive_file_id: str,
+    *,
+    telegram_file_id: str,
+    content_sha256: str | None = None,
+    duplicate_of: int | None = None,
+) -> None:
+    """
+    Marca DONE solo si la fila sigue apuntando a `telegram_file_id`: si el
+    comprobante se reemplazó mientras se subía, la fila queda PENDING.
+    """
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE drive_upload_outbox
+                   SET status = 'DONE', drive_file_id = %s,
+                       content_sha256 = COALESCE(%s, content_sha256),
+                       duplicate_of = %s,
+                       last_error = NULL, updated_at = now()
+                 WHERE id = %s AND telegram_file_id = %s;
+                """,
+                (drive_file_id, content_sha256, duplicate_of, int(upload_id), telegram_file_id),
+            )
+
+
+async def mark_upload_retry(
+    upload_id: int,
+    *,
+    telegram_file_id: str,
+    error: str,
+    delay_seconds: float,
+    give_up: bool,
+) -> None:
+    """
+    Reprograma tras `delay_seconds` (o deja FAILED si se agotaron los intentos).
+    Un comprobante reemplazado entretanto no hereda el error ni el backoff.
+    """
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE drive_upload_outbox
+                   SET status = CASE WHEN %s THEN 'FAILED' ELSE 'PENDING' END,
+                       next_attempt_at = now() + make_interval(secs => %s),
+                       last_error = %s,
+                       updated_at = now()
+                 WHERE id = %s AND telegram_file_id = %s;
+                """,
+                (bool(give_up), float(delay_seconds), error[:500], int(upload_id), telegram_file_id),
+            )
+
+
+async def backfill_missing_uploads(*, since: datetime | None = None, limit: int | None = None) -> dict[str, int]:
+    """
+    Encola comprobantes (origen y pago destino) de órdenes que no tienen
+    fila en el outbox. Devuelve cuántas filas nuevas por tipo.
+    """
+    out: dict[str, int] = {}
+    async with get_async_conn() as conn:
+        async with conn.transaction():
+            async with conn.cursor() as cur:
+                for proof_type, column in (
+                    (PROOF_ORIGEN, "origin_payment_proof_file_id"),
+                    (PROOF_PAGO, "dest_payment_proof_file_id"),
+                ):
+                    await cur.execute(
+                        f"""
+                        INSERT INTO drive_upload_outbox (order_public_id, proof_type, telegram_file_id)
+                        SELECT o.public_id, %s, o.{column}
+                          FROM orders o
+                         WHERE o.{column} IS NOT NULL AND o.{column} <> ''
+                           AND (%s::timestamptz IS NULL OR o.created_at >= %s::timestamptz)
+                           AND NOT EXISTS (
+                               SELECT 1 FROM drive_upload_outbox d
+                                WHERE d.order_public_id = o.public_id AND d.proof_type = %s
+                           )
+                         ORDER BY o.public_id
+                         LIMIT %s
+                        ON CONFLICT (order_public_id, proof_type) DO NOTHING;
+                        """,
+                        (proof_type, since, since, proof_type, limit),
+                    )
+                    out[proof_type] = cur.rowcount or 0
+    return out
+
+
+async def retry_failed_uploads() -> int:
+    """Vuelve a PENDING las subidas que agotaron sus intentos."""
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE drive_upload_outbox
+                   SET status = 'PENDING', attempts = 0, next_attempt_at = now(), updated_at = now()
+                 WHERE status = 'FAILED';
+                """
+            )
+            return cur.rowcount or 0
+
+
+async def count_uploads_by_status() -> dict[str, int]:
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT status, count(*) FROM drive_upload_outbox GROUP BY status;")
+            rows = await cur.fetchall()
+    return {str(s): int(n) for s, n in rows}
@@ -0,0 +1,194 @@
+"""
+Outbox de notificaciones de Telegram (tabla notification_outbox).
+
+- Los handlers encolan en la MISMA transacción del cambio de estado de la
+  orden (enqueue_notification_tx): si el cambio se confirma, el aviso sale;
+  si hace rollback, no. `dedupe_key` evita avisos dobles cuando el admin
+  repite el tap.
+- El destinatario puede ser un chat explícito (grupo) o un usuario interno
+  (users.id). Para avisar al operador de una orden basta con
+  `operator_of_order`: se resuelve en el INSERT, sin query previa. Si la
+  orden no tiene operador, no se encola nada (el cambio de estado sigue).
+- claim_due_notifications reclama un lote con FOR UPDATE SKIP LOCKED y
+  resuelve telegram_user_id de todos los destinatarios en la misma query.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+
+import psycopg
+from psycopg.types.json import Jsonb
+
+from src.db.connection import get_async_conn
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Notification:
+    id: int
+    chat_id: int | None          # resuelto: chat explícito o telegram_user_id del destinatario
+    text: str | None
+    photo_file_id: str | None
+    parse_mode: str | None
+    reply_markup: dict | None
+    disable_web_page_preview: bool
+    attempts: int
+
+
+async def enqueue_notification_tx(
+    conn: psycopg.AsyncConnection,
+    *,
+    chat_id: int | None = None,
+    user_id: int | None = None,
+    operator_of_order: int | None = None,
+    text: str | None = None,
+    photo_file_id: str | None = None,
+    parse_mode: str | None = None,
+    reply_markup: dict | None = None,
+    disable_web_page_preview: bool = False,
+    dedupe_key: str | None = None,
+) -> bool:
+    """
+    Encola un mensaje (o una foto con `text` como caption). Destinatario:
+    `chat_id`, `user_id` (users.id) o el operador de la orden `operator_of_order`.
+    Devuelve False si no se encoló: repetido (`dedupe_key`) o sin destinatario
+    (orden sin operador). Una fila sin destinatario violaría
+    ck_notification_outbox_recipient y haría rollback del cambio de estado.
+
+    Best-effort: corre en un savepoint de la transacción del llamador, así un
+    fallo del outbox no aborta el cambio de estado (se loguea y devuelve False).
+    """
+    if chat_id is None and user_id is None and operator_of_order is None:
+        raise ValueError("notificación sin destinatario")
+    if not text and not photo_file_id:
+        raise ValueError("notificación vacía")
+    try:
+        async with conn.transaction():
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO notification_outbox
+                        (chat_id, recipient_user_id, text, photo_file_id, parse_mode, reply_markup,
+                         disable_web_page_preview, dedupe_key)
+                    SELECT r.chat_id, r.user_id, %s, %s, %s, %s, %s, %s
+                      FROM (
+                            SELECT %s::bigint AS chat_id,
+                                   COALESCE(%s::bigint, (SELECT operator_user_id FROM orders WHERE public_id = %s)) AS user_id
+                      ) r
+                     WHERE r.chat_id IS NOT NULL OR r.user_id IS NOT NULL
+                    ON CONFLICT (dedupe_key) DO NOTHING;
+                    """,
+                    (
+                        text, photo_file_id, parse_mode,
+                        Jsonb(reply_markup) if reply_markup is not None else None,
+                        bool(disable_web_page_preview), dedupe_key,
+                        chat_id, user_id, operator_of_order,
+                    ),
+                )
+                inserted = bool(cur.rowcount)
+    except Exception as e:
+        logger.warning(
+            "[notifications] no se pudo encolar el aviso (orden %s, dedupe %s): %s",
+            operator_of_order, dedupe_key, e,
+        )
+        return False
+    if inserted:
+        return True
+    logger.debug("[notifications] aviso no encolado (orden %s sin operador o dedupe %s repetido)",
+                 operator_of_order, dedupe_key)
+    return False
+
+
+async def claim_due_notifications(*, limit: int, lease_seconds: float) -> list[Notification]:
+    """
+    Reclama hasta `limit` notificaciones vencidas (arrendadas `lease_seconds`),
+    en orden de creación y con el chat de destino ya resuelto.
+    """
+    sql = """
+        WITH claimed AS (
+            UPDATE notification_outbox n
+               SET attempts = n.attempts + 1,
+                   next_attempt_at = now() + make_interval(secs => %s)
+             WHERE n.id IN (
+                    SELECT id FROM notification_outbox
+                     WHERE status = 'PENDING' AND next_attempt_at <= now()
+                     ORDER BY id
+                     LIMIT %s
+                     FOR UPDATE SKIP LOCKED
+             )
+            RETURNING n.*
+        )
+        SELECT c.id, COALESCE(c.chat_id, u.telegram_user_id), c.text, c.photo_file_id, c.parse_mode,
+               c.reply_markup, c.disable_web_page_preview, c.attempts
+          FROM claimed c
+          LEFT JOIN users u ON u.id = c.recipient_user_id
+         ORDER BY c.id;
+    """
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, (float(lease_seconds), int(limit)))
+            rows = await cur.fetchall()
+    return [
+        Notification(
+            int(r[0]), int(r[1]) if r[1] is not None else None, r[2], r[3], r[4], r[5], bool(r[6]), int(r[7]),
+        )
+        for r in rows
+    ]
+
+
+async def mark_notifications_sent(ids: list[int]) -> None:
+    if not ids:
+        return
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE notification_outbox
+                   SET status = 'SENT', sent_at = now(), last_error = NULL
+                 WHERE id = ANY(%s);
+                """,
+                ([int(i) for i in ids],),
+            )
+
+
+async def mark_notification_retry(notification_id: int, *, error: str, delay_seconds: float, give_up: bool) -> None:
+    """Reprograma tras `delay_seconds` (o deja FAILED si no tiene sentido reintentar)."""
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE notification_outbox
+                   SET status = CASE WHEN %s THEN 'FAILED' ELSE 'PENDING' END,
+                       next_attempt_at = now() + make_interval(secs => %s),
+                       last_error = %s
+                 WHERE id = %s;
+                """,
+                (bool(give_up), float(delay_seconds), error[:500], int(notification_id)),
+            )
+
+
+async def defer_notifications(ids: list[int], *, delay_seconds: float) -> None:
+    """Devuelve a la cola sin contar el intento (RetryAfter, o detrás de un fallo del mismo chat)."""
+    if not ids:
+        return
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE notification_outbox
+                   SET attempts = GREATEST(attempts - 1, 0),
+                       next_attempt_at = now() + make_interval(secs => %s)
+                 WHERE id = ANY(%s);
+                """,
+                (float(delay_seconds), [int(i) for i in ids]),
+            )
+
+
+async def count_notifications_by_status() -> dict[str, int]:
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT status, count(*) FROM notification_outbox GROUP BY status;")
+            rows = await cur.fetchall()
+    return {str(r[0]): int(r[1]) for r in rows}
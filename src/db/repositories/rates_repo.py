@@ -9,6 +9,8 @@ Responsabilidad:
 
 Changelog:
 - Migracion a ASYNC para Fase 2.
+- Escritura bulk (COPY) de una versión completa en una sola transacción.
+- touch_rate_version_tx: si la matriz nueva no cambia, solo se refresca effective_from.
 """
 
 from __future__ import annotations
@@ -16,9 +18,16 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime
 from decimal import Decimal
+from typing import Collection, Iterable
+
+import psycopg
 
 from src.db.connection import get_async_conn
 
+# NOTIFY emitido al cambiar/refrescar la versión activa (se entrega al COMMIT).
+# Lo escucha el snapshot en memoria de tasas (src/rates_snapshot.py).
+RATE_VERSION_CHANNEL = "rate_version_switched"
+
 # --- Modelos simples (DTOs) ---
 
 @dataclass(frozen=True)
@@ -51,6 +60,19 @@ class CountryPrice:
     sell_price: Decimal
 
 
+@dataclass(frozen=True)
+class CountryPriceRecord:
+    """Fila completa de p2p_country_prices (sin rate_version_id) para escritura."""
+    country: str
+    fiat: str
+    buy_price: Decimal
+    sell_price: Decimal
+    methods_used: str | None
+    amount_ref: Decimal | None
+    source: str
+    is_verified: bool
+
+
 # get_async_conn importado desde connection.py (pool centralizado)
 
 
@@ -164,6 +186,140 @@ async def insert_route_rate(
             await conn.commit()
 
 
+# --- Escritura bulk (versión completa) ---
+
+_COUNTRY_PRICES_COPY = """
+    COPY p2p_country_prices (
+        rate_version_id, country, fiat,
+        buy_price, sell_price,
+        methods_used, amount_ref,
+        source, is_verified
+    ) FROM STDIN
+"""
+
+_ROUTE_RATES_COPY = """
+    COPY route_rates (
+        rate_version_id,
+        origin_country, dest_country,
+        commission_pct,
+        buy_origin, sell_dest,
+        rate_base, rate_client
+    ) FROM STDIN
+"""
+
+
+async def copy_country_prices_tx(
+    conn: psycopg.AsyncConnection,
+    *,
+    rate_version_id: int,
+    prices: Iterable[CountryPriceRecord],
+) -> int:
+    """COPY de precios por país en la transacción del caller. Retorna filas escritas."""
+    n = 0
+    async with conn.cursor() as cur:
+        async with cur.copy(_COUNTRY_PRICES_COPY) as copy:
+            for p in prices:
+                await copy.write_row((
+                    rate_version_id,
+                    p.country, p.fiat,
+                    p.buy_price, p.sell_price,
+                    p.methods_used, p.amount_ref,
+                    p.source, bool(p.is_verified),
+                ))
+                n += 1
+    return n
+
+
+async def copy_route_rates_tx(
+    conn: psycopg.AsyncConnection,
+    *,
+    rate_version_id: int,
+    routes: Iterable[RouteRate],
+) -> int:
+    """COPY de tasas por ruta en la transacción del caller. Retorna filas escritas."""
+    n = 0
+    async with conn.cursor() as cur:
+        async with cur.copy(_ROUTE_RATES_COPY) as copy:
+            for r in routes:
+                await copy.write_row((
+                    rate_version_id,
+                    r.origin_country, r.dest_country,
+                    r.commission_pct,
+                    r.buy_origin, r.sell_dest,
+                    r.rate_base, r.rate_client,
+                ))
+                n += 1
+    return n
+
+
+async def write_rate_version_tx(
+    conn: psycopg.AsyncConnection,
+    *,
+    kind: str,
+    reason: str | None,
+    effective_from: datetime,
+    prices: Iterable[CountryPriceRecord],
+    routes: Iterable[RouteRate],
+) -> int:
+    """
+    Escribe una versión completa de tasas y la activa (el caller abre la transacción).
+
+    Orden pensado para que el lock sobre rate_versions dure lo mínimo:
+    1. INSERT de la versión nueva inactiva
+    2. COPY de precios y rutas (round trips independientes del nº de rutas)
+    3. Switch de versión activa en un solo UPDATE al final
+    """
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            INSERT INTO rate_versions (kind, reason, effective_from, is_active)
+            VALUES (%s, %s, %s, false)
+            RETURNING id;
+            """,
+            (kind, reason, effective_from),
+        )
+        res = await cur.fetchone()
+        version_id = int(res[0]) if res else 0
+
+    await copy_country_prices_tx(conn, rate_version_id=version_id, prices=prices)
+    await copy_route_rates_tx(conn, rate_version_id=version_id, routes=routes)
+
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE rate_versions
+            SET is_active = (id = %s)
+            WHERE is_active = true OR id = %s;
+            """,
+            (version_id, version_id),
+        )
+        await cur.execute("SELECT pg_notify(%s, %s);", (RATE_VERSION_CHANNEL, str(version_id)))
+
+    return version_id
+
+
+async def touch_rate_version_tx(
+    conn: psycopg.AsyncConnection,
+    *,
+    rate_version_id: int,
+    effective_from: datetime,
+) -> None:
+    """
+    Refresca effective_from de una versión existente (regeneración sin
+    cambios materiales: no se escribe versión nueva ni se copian rutas).
+    """
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE rate_versions
+            SET effective_from = %s
+            WHERE id = %s;
+            """,
+            (effective_from, rate_version_id),
+        )
+        await cur.execute("SELECT pg_notify(%s, %s);", (RATE_VERSION_CHANNEL, str(rate_version_id)))
+
+
 # --- Lectura ---
 
 async def get_latest_active_rate_version() -> RateVersion | None:
@@ -239,6 +395,33 @@ async def list_route_rates_for_version(
             return [RouteRate(*r) for r in rows]
 
 
+async def list_route_rates_all_for_version(
+    *,
+    rate_version_id: int,
+    countries: Collection[str] | None = None,
+) -> list[RouteRate]:
+    """
+    Devuelve todas las rutas de una versión.
+    Con `countries`, solo las que tienen origen o destino en esos países.
+    """
+    sql = """
+        SELECT origin_country, dest_country, commission_pct,
+               buy_origin, sell_dest, rate_base, rate_client
+        FROM route_rates
+        WHERE rate_version_id = %s
+    """
+    params: list[object] = [rate_version_id]
+    if countries is not None:
+        sql += " AND (origin_country = ANY(%s) OR dest_country = ANY(%s))"
+        params.extend([list(countries), list(countries)])
+
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, params)
+            rows = await cur.fetchall()
+            return [RouteRate(*r) for r in rows]
+
+
 async def list_all_route_pairs_for_version(
     *,
     rate_version_id: int,
@@ -275,10 +458,34 @@ async def get_country_price_for_version(*, rate_version_id: int, country: str) -
             return CountryPrice(*rows[0])
 
 
+async def list_country_prices_full_for_version(*, rate_version_id: int) -> list[CountryPriceRecord]:
+    """Todas las columnas de p2p_country_prices de una versión (para copiar hacia adelante)."""
+    sql = """
+        SELECT country, fiat, buy_price, sell_price,
+               methods_used, amount_ref, source, is_verified
+        FROM p2p_country_prices
+        WHERE rate_version_id = %s
+        ORDER BY country ASC;
+    """
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, (rate_version_id,))
+            rows = await cur.fetchall()
+            return [CountryPriceRecord(*r) for r in rows]
+
+
 async def get_latest_active_country_sell(*, country: str) -> tuple[str, Decimal] | None:
     """
     Returns (fiat, sell_price) for country using latest active rate_version.
+    Se sirve desde el snapshot en memoria (src/rates_snapshot.py) sin ir a DB.
     """
+    from src.rates_snapshot import get_rates_snapshot
+
+    snap = await get_rates_snapshot()
+    if snap is not None:
+        price = snap.country_price(country)
+        return (price.fiat, price.sell_price) if price else None
+
     rv = await get_latest_active_rate_version()
     if not rv:
         return None
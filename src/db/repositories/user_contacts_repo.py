@@ -6,13 +6,14 @@ from src.db.connection import get_async_conn
 async def touch_contact(telegram_user_id: int) -> None:
     """
     Guarda telegram_user_id para broadcast/post-reset.
-    Idempotente: si ya existe, actualiza last_seen_at.
+    Idempotente: si ya existe, actualiza last_seen_at. Si vuelve a escribir
+    al bot, deja de estar bloqueado para difusiones (blocked_at = NULL).
     """
     sql = """
     INSERT INTO user_contacts (telegram_user_id, first_seen_at, last_seen_at)
     VALUES (%s, now(), now())
     ON CONFLICT (telegram_user_id)
-    DO UPDATE SET last_seen_at = now();
+    DO UPDATE SET last_seen_at = now(), blocked_at = NULL;
     """
     async with get_async_conn() as conn:
         async with conn.cursor() as cur:
@@ -1,57 +1,223 @@
+"""
+Settings de negocio (tabla `settings`) en memoria.
+
+- Toda la tabla se carga con UNA query en un mapa inmutable (key -> value_json)
+- Stale-while-revalidate: las lecturas nunca esperan a la DB salvo el primer
+  arranque en frío; pasado el 80% del TTL (60s) se sigue sirviendo el mapa
+  y se dispara un refresh en background
+- Single-flight: refreshes concurrentes comparten la misma query; un
+  refresh forzado (NOTIFY, invalidate) que llega con una query en vuelo la
+  repite al terminar (esa query pudo empezar antes del COMMIT del cambio)
+- Invalidación inmediata: trigger NOTIFY settings_changed (ver migración
+  settings_notify_trigger) escuchado por start_settings_watcher()
+- Si la DB falla se sigue sirviendo el último mapa conocido
+"""
+
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
 import time
-from typing import Any
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from src.db.connection import connect_listener, get_async_conn
 
-from src.db.connection import get_async_conn
+logger = logging.getLogger(__name__)
 
+SETTINGS_CHANNEL = "settings_changed"
 
-# Cache por llave con su propio timestamp de expiración
-_cache: dict[str, tuple[Any, float]] = {}
 _TTL_SECONDS = 60
+_REFRESH_AHEAD = 0.8
+_FAILURE_BACKOFF_SECONDS = 5.0
+_LISTEN_RETRY_SECONDS = 30.0
+
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
+
+def _parse_value(raw_val: Any) -> dict[str, Any] | None:
+    if isinstance(raw_val, dict):
+        return raw_val
+    if isinstance(raw_val, str):
+        try:
+            val = json.loads(raw_val)
+        except Exception:
+            # Si es un string pero no JSON, se espera dict: None
+            return None
+        return val if isinstance(val, dict) else None
+    return None
+
+
+class SettingsStore:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._data: Mapping[str, Any] | None = None
+        self._loaded_at = 0.0          # monotonic del último load OK
+        self._failed_at = 0.0          # monotonic del último load fallido
+        self._inflight: asyncio.Future | None = None
+        self._dirty = False            # hubo un refresh forzado durante la query en vuelo
+        self._watch_task: asyncio.Task | None = None
+        self._listening = False
+        self._refreshes = 0
+        self._failures = 0
+        self._notifies = 0
+        self._last_refresh_ms: float | None = None
+
+    async def _load(self) -> None:
+        t0 = time.perf_counter()
+        try:
+            async with get_async_conn() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT key, value_json FROM settings;")
+                    rows = await cur.fetchall()
+        except Exception as e:
+            self._failures += 1
+            self._failed_at = time.monotonic()
+            logger.warning("[settings] refresh falló (se mantiene el mapa anterior): %s", e)
+            return
+
+        self._data = MappingProxyType({str(k): _parse_value(v) for k, v in rows})
+        self._loaded_at = time.monotonic()
+        self._refreshes += 1
+        self._last_refresh_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    async def _load_until_clean(self) -> None:
+        while True:
+            self._dirty = False
+            await self._load()
+            if not self._dirty:
+                return
+
+    def refresh(self, *, force: bool = False) -> asyncio.Future:
+        """
+        Dispara un refresh (o se une al que está en curso). Con force=True y
+        una query en vuelo, se vuelve a cargar cuando termine: el future
+        retornado resuelve después de esa segunda carga.
+        """
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._load_until_clean())
+        elif force:
+            self._dirty = True
+        return self._inflight
+
+    async def snapshot(self) -> Mapping[str, Any]:
+        """Mapa completo vigente (mismo objeto mientras no haya un refresh exitoso)."""
+        data = self._data
+        now = time.monotonic()
+        if data is None:
+            # Arranque en frío: única espera a DB (con backoff si la DB está caída)
+            if self._failed_at and now - self._failed_at < _FAILURE_BACKOFF_SECONDS:
+                return _EMPTY
+            await asyncio.shield(self.refresh())
+            data = self._data
+            if data is None:
+                return _EMPTY
+        elif now - self._loaded_at >= self.ttl_seconds * _REFRESH_AHEAD and now - self._failed_at >= _FAILURE_BACKOFF_SECONDS:
+            self.refresh()
+        return data
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        return (await self.snapshot()).get(key)
+
+    def invalidate(self) -> None:
+        """Fuerza un refresh en background (las lecturas siguen con el mapa actual)."""
+        self.refresh(force=True)
+
+    async def _watch(self) -> None:
+        while True:
+            conn = None
+            try:
+                conn = await connect_listener(SETTINGS_CHANNEL)
+                self._listening = True
+                logger.info("[settings] LISTEN %s activo", SETTINGS_CHANNEL)
+                # Tras (re)conectar: puede haberse perdido un NOTIFY
+                self.refresh()
+                while True:
+                    async for _ in conn.notifies(timeout=self.ttl_seconds * _REFRESH_AHEAD):
+                        self._notifies += 1
+                        await self.refresh(force=True)
+                    # Sin NOTIFY antes de vencer el TTL: refresh periódico de respaldo
+                    self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("[settings] LISTEN caído, reintento en %.0fs: %s", _LISTEN_RETRY_SECONDS, e)
+                self._listening = False
+                if conn is not None:
+                    await _close_quietly(conn)
+                    conn = None
+                await asyncio.sleep(_LISTEN_RETRY_SECONDS)
+            finally:
+                self._listening = False
+                if conn is not None:
+                    await _close_quietly(conn)
+
+    async def start(self) -> None:
+        await self.refresh()
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch(), name="settings_watch")
+
+    async def stop(self) -> None:
+        task, self._watch_task = self._watch_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "keys": len(self._data) if self._data is not None else 0,
+            "staleness_seconds": round(now - self._loaded_at, 1) if self._data is not None else None,
+            "last_refresh_ms": self._last_refresh_ms,
+            "refreshes": self._refreshes,
+            "failures": self._failures,
+            "notifies": self._notifies,
+            "listening": self._listening,
+        }
+
+
+async def _close_quietly(conn) -> None:
+    try:
+        await conn.close()
+    except Exception:
+        pass
+
+
+_store = SettingsStore(ttl_seconds=_TTL_SECONDS)
 
 
 async def get_setting_json(key: str) -> dict[str, Any] | None:
     """
-    Lee settings(key, value_json) desde Postgres (ASYNC).
-    Cache 60s por llave.
+    Lee settings(key, value_json) desde el mapa en memoria (ASYNC).
+    Solo espera a la DB en el primer arranque en frío.
     """
-    now = time.time()
-    if key in _cache:
-        val, ts = _cache[key]
-        if (now - ts) < _TTL_SECONDS:
-            return val
+    return await _store.get(key)
 
-    try:
-        async with get_async_conn() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("SELECT value_json FROM settings WHERE key=%s", (key,))
-                rows = await cur.fetchall()
-                row = rows[0] if rows else None
-    except Exception:
-        # Si falla la DB, intentamos usar cache expirada como fallback
-        if key in _cache:
-            return _cache[key][0]
-        return None
 
-    val = None
-    if row and row[0] is not None:
-        raw_val = row[0]
-        if isinstance(raw_val, dict):
-            val = raw_val
-        elif isinstance(raw_val, str):
-            try:
-                val = json.loads(raw_val)
-            except Exception:
-                # Si es un string pero no JSON, lo envolvemos si parece útil
-                # o lo dejamos como None si se espera dict.
-                val = None
-        else:
-            val = None
-
-    _cache[key] = (val, now)
-    return val
+async def get_settings_map() -> Mapping[str, Any]:
+    """
+    Toda la tabla settings (key -> value_json) como mapa inmutable.
+    El objeto solo cambia tras un refresh: sirve para compilar derivados
+    (ver DynamicConfig.commission_table).
+    """
+    return await _store.snapshot()
+
+
+async def start_settings_watcher() -> None:
+    """Carga inicial + LISTEN settings_changed (lifespan de FastAPI)."""
+    await _store.start()
+
+
+async def stop_settings_watcher() -> None:
+    await _store.stop()
+
+
+def settings_store_stats() -> dict:
+    return _store.stats()
 
 
 async def get_setting_float(key: str, field: str, default: float) -> float:
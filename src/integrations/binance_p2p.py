@@ -1,9 +1,16 @@
 from __future__ import annotations
 
+import logging
+import time
+
 import httpx
 from dataclasses import dataclass
 from typing import Iterable
+from src.config.settings import settings
 from src.db.settings_store import get_setting_float
+from src.integrations.p2p_quote_cache import QuoteCache
+
+logger = logging.getLogger(__name__)
 
 BINANCE_P2P_URL = "https://p2p.binance.com/bapi/c2c/v2/friendly/c2c/adv/search"
 
@@ -16,9 +23,139 @@ class P2PQuote:
     advertiser_nick: str | None
     is_verified: bool
 
+class BinanceUnavailableError(RuntimeError):
+    """Timeout / error de red / HTTP de Binance (cuenta para el circuit breaker)."""
+
+
+class CircuitOpenError(BinanceUnavailableError):
+    """El circuito para ese fiat/trade_type está abierto: falla rápido sin consultar."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por (fiat, trade_type).
+
+    - closed:    las consultas pasan; N fallos consecutivos -> open
+    - open:      falla rápido durante `cooldown_seconds`
+    - half_open: deja pasar UNA consulta de prueba; éxito -> closed, fallo -> open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, *, failure_threshold: int, cooldown_seconds: float) -> None:
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_seconds = float(cooldown_seconds)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.last_error: str | None = None
+        self._probe_inflight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if self.opened_at is not None and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = self.HALF_OPEN
+                self._probe_inflight = False
+            else:
+                return False
+        # HALF_OPEN: una sola consulta de prueba a la vez
+        if self._probe_inflight:
+            return False
+        self._probe_inflight = True
+        return True
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("[binance_cb] %s cerrado (Binance respondió)", self.name)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_inflight = False
+
+    def release_probe(self) -> None:
+        self._probe_inflight = False
+
+    def record_failure(self, err: Exception) -> None:
+        self.failures += 1
+        self.last_error = str(err)
+        self._probe_inflight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    "[binance_cb] %s ABIERTO tras %d fallo(s) — fail-fast por %.0fs. Último: %s",
+                    self.name, self.failures, self.cooldown_seconds, err,
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        retry_in = None
+        if self.state == self.OPEN and self.opened_at is not None:
+            retry_in = max(0.0, round(self.cooldown_seconds - (time.monotonic() - self.opened_at), 1))
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in_seconds": retry_in,
+            "last_error": self.last_error,
+        }
+
+
+_breakers: dict[tuple[str, str], CircuitBreaker] = {}
+
+
+def get_circuit_breaker(fiat: str, trade_type: str) -> CircuitBreaker:
+    key = (fiat.upper(), trade_type.upper())
+    cb = _breakers.get(key)
+    if cb is None:
+        cb = CircuitBreaker(
+            f"{key[0]}/{key[1]}",
+            failure_threshold=int(settings.BINANCE_CB_FAILURE_THRESHOLD),
+            cooldown_seconds=float(settings.BINANCE_CB_COOLDOWN_SECONDS),
+        )
+        _breakers[key] = cb
+    return cb
+
+
+def is_circuit_open(fiat: str) -> bool:
+    """True si BUY o SELL de ese fiat está en fail-fast."""
+    return any(
+        cb.state != CircuitBreaker.CLOSED
+        for (f, _side), cb in _breakers.items()
+        if f == fiat.upper()
+    )
+
+
+def circuit_states() -> list[dict]:
+    return [cb.snapshot() for cb in _breakers.values()]
+
+
 class BinanceP2PClient:
-    def __init__(self, timeout_seconds: float = 10.0) -> None:
-        self._client = httpx.AsyncClient(timeout=timeout_seconds)
+    def __init__(
+        self,
+        timeout_seconds: float = 10.0,
+        *,
+        http2: bool = False,
+        limits: httpx.Limits | None = None,
+    ) -> None:
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("BINANCE_HTTP2=1 pero el paquete 'h2' no está instalado; usando HTTP/1.1")
+                http2 = False
+        # Sin límites explícitos se usan los defaults de httpx
+        limits = limits or httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        self._client = httpx.AsyncClient(timeout=timeout_seconds, http2=http2, limits=limits)
+
+    @property
+    def is_closed(self) -> bool:
+        return self._client.is_closed
 
     async def close(self) -> None:
         await self._client.aclose()
@@ -31,9 +168,50 @@ class BinanceP2PClient:
         pay_methods: Iterable[str],
         trans_amount: float,
         asset: str = "USDT",
+        use_cache: bool = True,
+        allow_stale: bool = True,
     ) -> P2PQuote:
+        """
+        Primer anuncio (preferiendo verificados) para fiat/trade_type/métodos.
+        Pasa por el cache TTL compartido (ver p2p_quote_cache) salvo use_cache=False.
+        Con el circuito abierto falla rápido (CircuitOpenError) o, vía cache,
+        devuelve la última cotización conocida (salvo allow_stale=False).
+        """
         pay_types = list(pay_methods)
 
+        async def _fetch() -> P2PQuote:
+            breaker = get_circuit_breaker(fiat, trade_type)
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuito Binance P2P abierto ({fiat}/{trade_type}).")
+            try:
+                quote = await self._fetch_first_price_uncached(
+                    fiat=fiat, trade_type=trade_type, pay_types=pay_types, trans_amount=trans_amount, asset=asset
+                )
+            except BinanceUnavailableError as e:
+                breaker.record_failure(e)
+                raise
+            except BaseException:
+                # Sin anuncios / cancelación: no dice nada sobre la salud de Binance
+                breaker.release_probe()
+                raise
+            breaker.record_success()
+            return quote
+
+        if not use_cache:
+            return await _fetch()
+
+        key = (fiat, trade_type, tuple(pay_types), str(trans_amount), asset)
+        return await quote_cache.get_or_fetch(key, _fetch, allow_stale=allow_stale)
+
+    async def _fetch_first_price_uncached(
+        self,
+        *,
+        fiat: str,
+        trade_type: str,
+        pay_types: list[str],
+        trans_amount: float,
+        asset: str,
+    ) -> P2PQuote:
         # AWAIT is mandatory here
         rows_val = await get_setting_float("p2p_rows", "rows", 10.0)
 
@@ -58,9 +236,9 @@ class BinanceP2PClient:
             resp = await self._client.post(BINANCE_P2P_URL, json=payload, headers=headers)
             resp.raise_for_status()
         except httpx.TimeoutException:
-            raise RuntimeError(f"Timeout consulting Binance P2P ({fiat}/{trade_type}).")
+            raise BinanceUnavailableError(f"Timeout consulting Binance P2P ({fiat}/{trade_type}).")
         except Exception as e:
-            raise RuntimeError(f"Network error consulting Binance P2P: {e}")
+            raise BinanceUnavailableError(f"Network error consulting Binance P2P: {e}")
 
         data = resp.json()
         items = data.get("data") or []
@@ -91,3 +269,55 @@ class BinanceP2PClient:
                 return to_quote(item, verified=True)
 
         return to_quote(items[0], verified=False)
+
+
+# --- Cache de cotizaciones (process-wide) ---
+# Compartido por generate_rates_full, el check de 30m, el cierre de órdenes
+# y price_override: la misma cotización pedida en segundos se sirve una vez.
+quote_cache: QuoteCache[P2PQuote] = QuoteCache(
+    ttl_seconds=float(settings.P2P_QUOTE_TTL_SECONDS),
+    max_stale_seconds=float(settings.P2P_QUOTE_MAX_STALE_SECONDS),
+)
+
+
+# --- Cliente compartido (process-wide) ---
+# Un solo httpx.AsyncClient para todo el proceso: mantiene conexiones
+# keep-alive a p2p.binance.com y evita un handshake TCP+TLS por consulta.
+# Se abre/cierra con el lifespan de FastAPI (src/main.py); si alguien lo
+# pide antes (modo polling, scripts) se crea de forma perezosa.
+
+_shared_client: BinanceP2PClient | None = None
+
+
+def get_binance_client() -> BinanceP2PClient:
+    """Devuelve el cliente Binance compartido (lo crea si no existe)."""
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        logger.info("Creando cliente HTTP compartido para Binance P2P...")
+        _shared_client = BinanceP2PClient(
+            timeout_seconds=float(settings.BINANCE_TIMEOUT_SECONDS),
+            http2=bool(settings.BINANCE_HTTP2),
+            limits=httpx.Limits(
+                max_connections=int(settings.BINANCE_MAX_CONNECTIONS),
+                max_keepalive_connections=int(settings.BINANCE_MAX_KEEPALIVE),
+                keepalive_expiry=float(settings.BINANCE_KEEPALIVE_EXPIRY_SECONDS),
+            ),
+        )
+    return _shared_client
+
+
+async def open_binance_client() -> None:
+    """Crea el cliente compartido de forma explícita (idempotente)."""
+    get_binance_client()
+
+
+async def close_binance_client() -> None:
+    """Cerrar cliente compartido en shutdown."""
+    global _shared_client
+    if _shared_client is not None:
+        try:
+            await _shared_client.close()
+            logger.info("Cliente Binance P2P cerrado correctamente")
+        except Exception:
+            logger.exception("Error cerrando cliente Binance P2P")
+        _shared_client = None
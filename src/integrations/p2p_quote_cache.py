@@ -0,0 +1,128 @@
+"""
+Cache TTL de cotizaciones Binance P2P con single-flight.
+
+- Llave: (fiat, trade_type, métodos, transAmount, asset)
+- TTL configurable (settings.P2P_QUOTE_TTL_SECONDS)
+- Single-flight: llamadas concurrentes a la misma llave esperan UNA sola
+  consulta en vuelo en lugar de disparar N requests a Binance. Si se
+  cancelan TODOS los que la esperan (p. ej. el perdedor de un fallback
+  hedged), la consulta también se cancela: no sigue corriendo sin dueño.
+- Stale-on-error: si Binance falla y existe un valor vencido dentro de la
+  ventana settings.P2P_QUOTE_MAX_STALE_SECONDS, se sirve ese valor
+  (allow_stale=False lo desactiva: el generador de tasas no publica precios
+  viejos como versión nueva).
+- Contadores hits / misses / coalesced / stale / errors para diagnóstico.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class QuoteCache(Generic[T]):
+    def __init__(self, ttl_seconds: float, max_stale_seconds: float = 0.0) -> None:
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_stale_seconds = float(max_stale_seconds)
+        self._entries: dict[Hashable, tuple[T, float]] = {}
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._waiters: dict[asyncio.Future, int] = {}   # callers esperando cada consulta en vuelo
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+        self.errors = 0
+
+    def peek(self, key: Hashable, *, allow_stale: bool = False) -> T | None:
+        """Valor en cache sin consultar (None si no hay o venció)."""
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        age = time.monotonic() - entry[1]
+        limit = self.ttl_seconds + (self.max_stale_seconds if allow_stale else 0.0)
+        return entry[0] if age <= limit else None
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[T]], *, allow_stale: bool = True) -> T:
+        if self.ttl_seconds > 0:
+            fresh = self.peek(key)
+            if fresh is not None:
+                self.hits += 1
+                return fresh
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch_and_store(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._on_done(k, t))
+        else:
+            self.coalesced += 1
+
+        abandoned = False
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # shield: si un caller se cancela, la consulta sigue para los demás
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            abandoned = True
+            raise
+        except Exception:
+            if not allow_stale:
+                raise
+            stale = self.peek(key, allow_stale=True)
+            if stale is not None:
+                self.stale += 1
+                logger.warning("[p2p_cache] Binance falló para %s — sirviendo valor stale", key)
+                return stale
+            raise
+        finally:
+            self._leave(key, task, abandoned=abandoned)
+
+    def _leave(self, key: Hashable, task: asyncio.Future, *, abandoned: bool) -> None:
+        """Un caller deja de esperar; si era el último y se canceló, se cancela la consulta."""
+        left = self._waiters.get(task, 1) - 1
+        if left > 0:
+            self._waiters[task] = left
+            return
+        self._waiters.pop(task, None)
+        if abandoned and not task.done():
+            if self._inflight.get(key) is task:
+                # los próximos callers arrancan una consulta nueva, no heredan la cancelada
+                self._inflight.pop(key, None)
+            task.cancel()
+
+    async def _fetch_and_store(self, key: Hashable, fetch: Callable[[], Awaitable[T]]) -> T:
+        value = await fetch()
+        self._entries[key] = (value, time.monotonic())
+        return value
+
+    def _on_done(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stale": self.stale,
+            "errors": self.errors,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
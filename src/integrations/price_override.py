@@ -8,7 +8,7 @@ from decimal import Decimal
 from typing import Optional, Tuple
 
 from src.config.dynamic_settings import dynamic_config
-from src.integrations.binance_p2p import BinanceP2PClient
+from src.integrations.binance_p2p import BinanceP2PClient, get_binance_client
 
 logger = logging.getLogger(__name__)
 
@@ -28,10 +28,14 @@ MANUAL_PRICE_OVERRIDES = {
 async def get_buy_price(
     country: str,
     payment_method: str,
-    fallback_to_binance: bool = True
+    fallback_to_binance: bool = True,
+    client: BinanceP2PClient | None = None,
+    allow_stale: bool = True,
 ) -> Decimal:
     """
     Obtiene precio de compra con soporte para override manual.
+    Usa el cliente Binance compartido salvo que se pase uno explícito.
+    allow_stale=False: si Binance falla no se sirve la cotización vencida del cache.
     """
     manual_price = await _get_manual_price(country, payment_method)
     
@@ -46,7 +50,7 @@ async def get_buy_price(
             f"🌐 No manual price for {country}/{payment_method}, using Binance"
         )
         
-        client = BinanceP2PClient()
+        client = client or get_binance_client()
         try:
             # Replicar la estructura de busqueda de binance de la app
             from src.integrations.p2p_config import COUNTRIES
@@ -59,13 +63,12 @@ async def get_buy_price(
                 trade_type="BUY",
                 pay_methods=[payment_method],
                 trans_amount=cfg.trans_amount,
+                allow_stale=allow_stale,
             )
             return Decimal(str(quote.price))
         except Exception as e:
             logger.error(f"❌ Error fetching from Binance: {e}")
             raise ValueError(f"No manual price and Binance failed for {country}/{payment_method}")
-        finally:
-            await client.close()
     else:
         raise ValueError(f"No manual price configured for {country}/{payment_method}")
 
@@ -92,12 +95,16 @@ async def _get_manual_price(country: str, payment_method: str) -> Optional[Decim
 async def get_sell_price(
     country: str,
     payment_method: str,
-    apply_margin: bool = True
+    apply_margin: bool = True,
+    client: BinanceP2PClient | None = None,
+    allow_stale: bool = True,
 ) -> Decimal:
     """
     Obtiene precio de venta. Sigue usando Binance por defecto para SELL.
+    Usa el cliente Binance compartido salvo que se pase uno explícito.
+    allow_stale=False: si Binance falla no se sirve la cotización vencida del cache.
     """
-    client = BinanceP2PClient()
+    client = client or get_binance_client()
     try:
         from src.integrations.p2p_config import COUNTRIES
         cfg = COUNTRIES.get(country)
@@ -109,11 +116,10 @@ async def get_sell_price(
             trade_type="SELL",
             pay_methods=[payment_method],
             trans_amount=cfg.trans_amount,
+            allow_stale=allow_stale,
         )
         return Decimal(str(quote.price))
         
     except Exception as e:
         logger.error(f"❌ Error fetching sell price from Binance: {e}")
         raise
-    finally:
-        await client.close()
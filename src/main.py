@@ -12,14 +12,26 @@ from zoneinfo import ZoneInfo
 import uvicorn
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from telegram import Update
 from telegram.warnings import PTBUserWarning
 
 from src.config.logging import setup_logging
 from src.config.settings import settings
 from src.db.connection import close_pool, wait_db_ready, is_pool_open
+from src.db.settings_store import start_settings_watcher, stop_settings_watcher
+from src.integrations.binance_p2p import open_binance_client, close_binance_client
+from src.rates_snapshot import start_rates_snapshot, stop_rates_snapshot
 from src.rates_scheduler import RatesScheduler
 from src.telegram_app.bot import build_bot
+from src.telegram_app.broadcast_engine import start_broadcast_engine, stop_broadcast_engine
+from src.telegram_app.notification_dispatcher import start_notification_dispatcher, stop_notification_dispatcher
+from src.telegram_app.webhook_intake import (
+    OVERLOAD_RETRY_AFTER_SECONDS,
+    start_webhook_intake,
+    stop_webhook_intake,
+    webhook_intake,
+)
+from src.utils.drive_uploads import start_drive_uploads, stop_drive_uploads
+from src.utils.bounded_state import start_state_sweeper, stop_state_sweeper
 from src.api import internal_rates
 from src.api import operators_router, ranking_router, rates_live_router, auth_router
 
@@ -51,6 +63,18 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"Database initialization failed: {e} - bot will start anyway")
 
+    # Settings de negocio en memoria (una query + LISTEN settings_changed)
+    await start_settings_watcher()
+
+    # Barrido de estructuras en memoria con TTL (src/utils/bounded_state.py)
+    start_state_sweeper(settings.BOUNDED_STATE_SWEEP_SECONDS)
+
+    # Cliente HTTP compartido hacia Binance P2P (conexiones keep-alive)
+    await open_binance_client()
+
+    # Snapshot en memoria de la versión de tasas activa (LISTEN/NOTIFY + polling)
+    await start_rates_snapshot()
+
     logger.info("Starting PTB Application...")
     await bot_app.initialize()
 
@@ -152,16 +176,34 @@ async def lifespan(app: FastAPI):
         logger.info("Webhook set: %s", url)
 
     await bot_app.start()
+    start_webhook_intake(bot_app)
     logger.info("Bot started successfully")
 
+    # Worker del outbox de subidas al Vault (Google Drive)
+    start_drive_uploads(bot_app.bot)
+
+    # Difusiones: retoma las que quedaron en curso antes del reinicio
+    await start_broadcast_engine(bot_app.bot)
+
+    # Notificaciones a operadores / grupos encoladas por los handlers
+    start_notification_dispatcher(bot_app.bot)
+
     yield
 
     logger.info("Shutting down Sendmax...")
+    await stop_webhook_intake()  # 503 a Telegram y lo ya aceptado pasa a PTB
+    await stop_notification_dispatcher()
+    await stop_broadcast_engine()
+    await stop_drive_uploads()  # antes de cerrar el bot: el worker descarga con bot.get_file
     try:
         await bot_app.stop()
         await bot_app.shutdown()
     except Exception as e:
         logger.error(f"Error stopping PTB: {e}")
+    await close_binance_client()
+    await stop_rates_snapshot()
+    await stop_settings_watcher()
+    await stop_state_sweeper()
     await close_pool()
 
 
@@ -250,6 +292,22 @@ async def root():
 async def health():
     return {"status": "ok", "service": "sendmax-bot"}
 
+# /admin/health/bot no tiene auth: los textos de error libres (pueden traer URLs
+# con tokens, datos de órdenes) se reducen a si hay o no error
+_ERROR_TEXT_KEYS = frozenset({"error", "last_error"})
+
+
+def _without_error_text(obj):
+    if isinstance(obj, dict):
+        return {
+            k: (v is not None) if k in _ERROR_TEXT_KEYS else _without_error_text(v)
+            for k, v in obj.items()
+        }
+    if isinstance(obj, list):
+        return [_without_error_text(v) for v in obj]
+    return obj
+
+
 @app.get("/admin/health/bot")
 async def admin_bot_health():
     import time
@@ -262,17 +320,50 @@ async def admin_bot_health():
         bot_usr = me.username
     except Exception as e:
         tg_status = "down"
-        bot_usr = str(e)
+        bot_usr = None
+        logger.warning("health: get_me falló: %s", e)
         
     diff = time.time() - _last_webhook_ts if _last_webhook_ts > 0 else -1
-    
-    return {
+
+    from src.integrations.binance_p2p import circuit_states, quote_cache
+    from src.db.settings_store import settings_store_stats
+    from src.rates_snapshot import rates_snapshot
+    from src.telegram_app.ui.rates_screens import rates_screens
+    from src.db.repositories.drive_outbox_repo import count_uploads_by_status
+    from src.utils.drive_uploads import drive_uploads
+    from src.telegram_app.broadcast_engine import broadcast_engine
+    from src.db.repositories.notification_outbox_repo import count_notifications_by_status
+    from src.telegram_app.notification_dispatcher import notification_dispatcher
+    from src.utils.bounded_state import bounded_state_stats
+
+    try:
+        drive_outbox = await asyncio.wait_for(count_uploads_by_status(), timeout=3.0)
+    except Exception as e:
+        drive_outbox = {"error": str(e)}
+    try:
+        notification_outbox = await asyncio.wait_for(count_notifications_by_status(), timeout=3.0)
+    except Exception as e:
+        notification_outbox = {"error": str(e)}
+
+    return _without_error_text({
         "status": "ok" if tg_status == "ok" else "error",
         "telegram_api": tg_status,
         "bot_username": bot_usr,
         "last_webhook_ts": _last_webhook_ts,
-        "seconds_since_last_webhook": int(diff)
-    }
+        "seconds_since_last_webhook": int(diff),
+        "p2p_quote_cache": quote_cache.stats(),
+        "binance_circuits": circuit_states(),
+        "rates_snapshot": rates_snapshot.stats(),
+        "settings_store": settings_store_stats(),
+        "rates_screens": rates_screens.stats(),
+        "drive_uploads": {**drive_uploads.stats(), "outbox": drive_outbox},
+        "broadcasts": broadcast_engine.stats(),
+        "notifications": {**notification_dispatcher.stats(), "outbox": notification_outbox},
+        "persistence": bot_app.persistence.stats() if hasattr(bot_app.persistence, "stats") else None,
+        "bounded_state": bounded_state_stats(),
+        "updates": {**bot_app.update_processor.stats(), "queue_depth": bot_app.update_queue.qsize()},
+        "webhook_intake": webhook_intake.stats(),
+    })
 
 
 @app.post("/webhook")
@@ -289,16 +380,14 @@ async def telegram_webhook(request: Request):
             logger.warning("Webhook request con secret_token inválido (posible spoofing)")
             return Response(status_code=403)
 
-    data = await request.json()
-    try:
-        upd_id = data.get("update_id")
-        logger.info("[WEBHOOK] update_id=%s", upd_id)
-    except Exception:
-        pass
-
-    update = Update.de_json(data, bot_app.bot)
-    await bot_app.update_queue.put(update)
-    return Response(status_code=200)
+    # Fast path: parse + dedupe por update_id + encolar (src/telegram_app/webhook_intake.py)
+    status_code = webhook_intake.accept(await request.body())
+    if status_code == 503:
+        return Response(
+            status_code=503,
+            headers={"Retry-After": str(OVERLOAD_RETRY_AFTER_SECONDS)},
+        )
+    return Response(status_code=status_code)
 
 
 def main() -> None:
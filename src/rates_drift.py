@@ -0,0 +1,164 @@
+"""
+Chequeo de variación de precios (drift) para el job de 30 minutos.
+
+Pipeline en lote:
+1. Una sola query: precios BUY/SELL guardados de la versión activa
+2. Cotizaciones actuales de todos los países en paralelo (BUY y SELL)
+3. Reporte por país con la variación de cada lado vs lo guardado
+
+RatesScheduler.run_30m_check decide la regeneración con este reporte.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+
+from src.config.settings import settings
+from src.db.repositories.rates_repo import CountryPriceRecord, list_country_prices_full_for_version
+from src.integrations.binance_p2p import BinanceP2PClient, get_binance_client
+from src.integrations.p2p_config import COUNTRIES, CountryP2PConfig
+from src.integrations.price_override import get_buy_price, get_sell_price
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CountryDrift:
+    country: str
+    saved_buy: Decimal | None
+    current_buy: Decimal | None
+    buy_var: Decimal | None       # variación relativa (0.03 = 3%)
+    saved_sell: Decimal | None
+    current_sell: Decimal | None
+    sell_var: Decimal | None
+    drifted: bool
+    error: str | None = None
+
+    def describe(self) -> str:
+        def _pct(v: Decimal | None) -> str:
+            return "n/a" if v is None else f"{float(v * 100):.2f}%"
+
+        line = (
+            f"{self.country}: BUY {self.saved_buy}->{self.current_buy} ({_pct(self.buy_var)}) "
+            f"SELL {self.saved_sell}->{self.current_sell} ({_pct(self.sell_var)})"
+        )
+        if self.error:
+            line += f" error={self.error}"
+        return line + (" DRIFT" if self.drifted else "")
+
+
+@dataclass(frozen=True)
+class DriftReport:
+    rate_version_id: int
+    threshold_pct: Decimal
+    countries: list[CountryDrift]
+
+    @property
+    def drifted(self) -> list[str]:
+        return [c.country for c in self.countries if c.drifted]
+
+    @property
+    def failed(self) -> list[str]:
+        return [c.country for c in self.countries if c.error]
+
+
+def _variation(saved: Decimal | None, current: Decimal | None) -> Decimal | None:
+    if saved is None or current is None or saved <= 0:
+        return None
+    return abs(current - saved) / saved
+
+
+def build_drift_report(
+    rate_version_id: int,
+    saved: dict[str, CountryPriceRecord],
+    current: dict[str, tuple[Decimal | None, Decimal | None, str | None]],
+    threshold_pct: Decimal,
+) -> DriftReport:
+    """
+    `current`: país -> (buy, sell, error). Un lado sin cotización no cuenta
+    como drift; el otro lado sí puede disparar la regeneración.
+    """
+    rows: list[CountryDrift] = []
+    for code in sorted(current):
+        cur_buy, cur_sell, error = current[code]
+        prev = saved.get(code)
+        saved_buy = Decimal(str(prev.buy_price)) if prev else None
+        saved_sell = Decimal(str(prev.sell_price)) if prev else None
+        buy_var = _variation(saved_buy, cur_buy)
+        sell_var = _variation(saved_sell, cur_sell)
+        drifted = any(v is not None and v >= threshold_pct for v in (buy_var, sell_var))
+        rows.append(CountryDrift(code, saved_buy, cur_buy, buy_var, saved_sell, cur_sell, sell_var, drifted, error))
+    return DriftReport(rate_version_id, threshold_pct, rows)
+
+
+async def _current_quotes(
+    code: str,
+    cfg: CountryP2PConfig,
+    client: BinanceP2PClient,
+    sem: asyncio.Semaphore,
+    deadline: float,
+) -> tuple[Decimal | None, Decimal | None, str | None]:
+    """
+    BUY (respeta overrides manuales) y SELL del método principal, en paralelo.
+    Como en la generación, el deadline de cada lado corre desde que obtiene
+    su cupo (esperar en la cola del semáforo no cuenta) y sin stale-on-error:
+    con Binance caído se reporta error, no un "sin drift" contra el cache viejo.
+    """
+
+    async def _guarded(fetch):
+        async with sem:
+            async with asyncio.timeout(deadline):
+                return await fetch()
+
+    buy, sell = await asyncio.gather(
+        _guarded(lambda: get_buy_price(code, cfg.buy_methods[0], client=client, allow_stale=False)),
+        _guarded(lambda: get_sell_price(code, cfg.sell_methods[0], client=client, allow_stale=False)),
+        return_exceptions=True,
+    )
+
+    def _err(res: BaseException) -> str:
+        return f"deadline {deadline:.1f}s" if isinstance(res, TimeoutError) else str(res)
+
+    errors = [f"{side}: {_err(res)}" for side, res in (("BUY", buy), ("SELL", sell)) if isinstance(res, BaseException)]
+    return (
+        None if isinstance(buy, BaseException) else buy,
+        None if isinstance(sell, BaseException) else sell,
+        "; ".join(errors) or None,
+    )
+
+
+async def check_price_drift(
+    rate_version_id: int,
+    threshold_pct: Decimal,
+    *,
+    client: BinanceP2PClient | None = None,
+) -> DriftReport:
+    """
+    Compara los precios guardados de la versión con Binance (una query +
+    una ronda de consultas en paralelo, mismo límite de concurrencia y
+    deadline que la generación de tasas: corre desde que cada consulta
+    obtiene su cupo).
+    Países sin precio guardado se omiten (la regeneración incremental los agrega).
+    """
+    client = client or get_binance_client()
+    saved = {p.country: p for p in await list_country_prices_full_for_version(rate_version_id=rate_version_id)}
+    codes = [c for c in COUNTRIES if c in saved]
+
+    sem = asyncio.Semaphore(max(1, int(settings.RATES_FETCH_CONCURRENCY)))
+    deadline = float(settings.RATES_COUNTRY_DEADLINE_SECONDS)
+    results = await asyncio.gather(
+        *(_current_quotes(c, COUNTRIES[c], client, sem, deadline) for c in codes),
+        return_exceptions=True,
+    )
+
+    current: dict[str, tuple[Decimal | None, Decimal | None, str | None]] = {}
+    for code, res in zip(codes, results):
+        if isinstance(res, BaseException):
+            current[code] = (None, None, str(res))
+        else:
+            current[code] = res
+
+    return build_drift_report(rate_version_id, saved, current, threshold_pct)
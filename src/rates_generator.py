@@ -1,15 +1,29 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from decimal import Decimal
 from itertools import product
 import asyncio
 import logging
+from typing import AsyncContextManager, Callable, Iterable
 
-from src.integrations.binance_p2p import BinanceP2PClient
-from src.integrations.p2p_config import COUNTRIES
+from src.integrations.binance_p2p import BinanceP2PClient, get_binance_client, is_circuit_open
+from src.integrations.p2p_config import COUNTRIES, CountryP2PConfig
+from src.config.settings import settings
 from src.db.connection import get_async_conn
+from src.db.repositories.rates_repo import (
+    CountryPriceRecord,
+    RouteRate,
+    get_latest_active_rate_version,
+    list_country_prices_full_for_version,
+    list_route_rates_all_for_version,
+    touch_rate_version_tx,
+    write_rate_version_tx,
+)
+from src.rates_matrix import CASH_DEST, CashDeliveryParams, compute_route_matrix, diff_route_matrix
+from src.rates_snapshot import refresh_rates_snapshot
 from src.config.dynamic_settings import dynamic_config
 
 logger = logging.getLogger(__name__)
@@ -21,213 +35,429 @@ class GenerateResult:
     countries_ok: list[str]
     countries_failed: list[str]
     any_unverified: bool
+    # Subconjunto de countries_failed cuyo circuito Binance estaba abierto (fail-fast)
+    countries_circuit_open: list[str] = field(default_factory=list)
+    # Rutas (origin, dest) con cambio material respecto de la versión anterior
+    routes_changed: list[tuple[str, str]] = field(default_factory=list)
+    # True si nada cambió: no se escribió versión nueva, version_id es la activa
+    skipped_unchanged: bool = False
 
 
-async def _pick_price_with_method_fallback(country: str, client: BinanceP2PClient, *, fiat: str, trade_type: str, methods: list[str], trans_amount: float):
+async def _price_for_method(country: str, client: BinanceP2PClient, *, trade_type: str, method: str) -> Decimal:
     from src.integrations.price_override import get_buy_price, get_sell_price
+    # Sin stale-on-error: una cotización vieja no se publica como versión nueva
+    # (el país cae a `failed` o se prueba el siguiente método)
+    if trade_type == "BUY":
+        price = await get_buy_price(country, method, fallback_to_binance=True, client=client, allow_stale=False)
+    else:
+        price = await get_sell_price(country, method, client=client, allow_stale=False)
+    return Decimal(str(price))
+
+
+# Cupo de concurrencia para UNA consulta a Binance (ver _fetch_one_country)
+Slot = Callable[[], AsyncContextManager[None]]
+
+
+async def _price_in_slot(slot: Slot | None, country: str, client: BinanceP2PClient, *, trade_type: str, method: str) -> Decimal:
+    async with (slot() if slot is not None else nullcontext()):
+        return await _price_for_method(country, client, trade_type=trade_type, method=method)
+
+
+async def _pick_price_with_method_fallback(country: str, client: BinanceP2PClient, *, fiat: str, trade_type: str, methods: list[str], trans_amount: float, slot: Slot | None = None):
+    hedge_delay = float(settings.RATES_METHOD_HEDGE_DELAY_SECONDS)
+    if hedge_delay > 0 and len(methods) > 1:
+        return await _pick_price_hedged(
+            country, client, fiat=fiat, trade_type=trade_type, methods=methods, hedge_delay=hedge_delay, slot=slot
+        )
+
     last_err = None
     for m in methods:
         try:
-            if trade_type == "BUY":
-                price = await get_buy_price(country, m, fallback_to_binance=True)
-                return (Decimal(str(price)), True, m)
-            else:
-                price = await get_sell_price(country, m)
-                return (Decimal(str(price)), True, m)
+            price = await _price_in_slot(slot, country, client, trade_type=trade_type, method=m)
+            return (price, True, m)
         except Exception as e:
             last_err = e
             continue
     raise RuntimeError(f"No se pudo obtener {trade_type} para fiat={fiat} methods={methods}. Last={last_err}")
 
 
-async def generate_rates_full(*, kind: str, reason: str) -> GenerateResult:
+async def _pick_price_hedged(country: str, client: BinanceP2PClient, *, fiat: str, trade_type: str, methods: list[str], hedge_delay: float, slot: Slot | None = None):
+    """
+    Fallback "hedged": arranca el método preferido y, si no respondió tras
+    `hedge_delay` segundos (o falló), lanza el siguiente en paralelo.
+    Gana la primera cotización válida; si varias llegan a la vez, gana la del
+    método más preferido. Las consultas perdedoras se cancelan, y con ellas
+    su request HTTP (QuoteCache cancela la consulta cuando se va su último
+    waiter), así que no siguen corriendo fuera de su cupo.
+    Cada consulta (también las de cobertura) toma su propio `slot`.
+    """
+    pending: dict[asyncio.Task, int] = {}
+    next_idx = 0
+    last_err: BaseException | None = None
+
+    def _launch_next() -> None:
+        nonlocal next_idx
+        if next_idx >= len(methods):
+            return
+        m = methods[next_idx]
+        task = asyncio.ensure_future(_price_in_slot(slot, country, client, trade_type=trade_type, method=m))
+        pending[task] = next_idx
+        next_idx += 1
+
+    _launch_next()
+    try:
+        while pending:
+            timeout = hedge_delay if next_idx < len(methods) else None
+            done, _ = await asyncio.wait(pending.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # El método en curso va lento: cubrirlo con el siguiente
+                _launch_next()
+                continue
+
+            for task in sorted(done, key=lambda t: pending[t]):
+                idx = pending.pop(task)
+                err = task.exception()
+                if err is None:
+                    if idx > 0:
+                        logger.info("[rates] %s %s resuelto con método de respaldo %s", country, trade_type, methods[idx])
+                    return (task.result(), True, methods[idx])
+                last_err = err
+                _launch_next()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise RuntimeError(f"No se pudo obtener {trade_type} para fiat={fiat} methods={methods}. Last={last_err}")
+
+
+async def _fetch_one_country(
+    code: str,
+    cfg: CountryP2PConfig,
+    client: BinanceP2PClient,
+    sem: asyncio.Semaphore,
+    deadline: float,
+) -> dict:
+    """
+    BUY y SELL de un país en paralelo. Cada consulta a Binance ocupa un cupo
+    del semáforo (también las de cobertura del fallback hedged), así la
+    concurrencia real nunca supera settings.RATES_FETCH_CONCURRENCY.
+    El deadline de cada lado corre desde que obtiene su primer cupo: esperar
+    en la cola del semáforo no cuenta.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def _side(trade_type: str, methods: list[str]):
+        async with asyncio.timeout(None) as window:
+
+            @asynccontextmanager
+            async def slot():
+                async with sem:
+                    if window.when() is None:
+                        window.reschedule(loop.time() + deadline)
+                    yield
+
+            return await _pick_price_with_method_fallback(
+                code, client, fiat=cfg.fiat, trade_type=trade_type, methods=methods,
+                trans_amount=cfg.trans_amount, slot=slot,
+            )
+
+    (buy_price, buy_verified, buy_method), (sell_price, sell_verified, sell_method) = await asyncio.gather(
+        _side("BUY", cfg.buy_methods),
+        _side("SELL", cfg.sell_methods),
+    )
+
+    return {
+        "fiat": cfg.fiat,
+        "buy": buy_price,
+        "sell": sell_price,
+        "is_verified": bool(buy_verified and sell_verified),
+        "methods_used": f"BUY:{buy_method}|SELL:{sell_method}",
+        "amount_ref": Decimal(str(cfg.trans_amount)),
+    }
+
+
+async def _fetch_country_prices(
+    countries: dict[str, CountryP2PConfig],
+    client: BinanceP2PClient,
+) -> tuple[dict[str, dict], list[str], bool]:
+    """
+    Consulta todos los países a la vez (BUY y SELL en paralelo).
+
+    - Límite de concurrencia global: settings.RATES_FETCH_CONCURRENCY
+    - Deadline por país: settings.RATES_COUNTRY_DEADLINE_SECONDS, contado
+      desde que cada consulta obtiene su cupo (con poca concurrencia un país
+      no vence solo por esperar en la cola)
+    Un país que falla o excede su deadline va a `failed` (no aborta el resto).
+    El tiempo total queda acotado por el país más lento, no por la suma.
+    """
+    sem = asyncio.Semaphore(max(1, int(settings.RATES_FETCH_CONCURRENCY)))
+    deadline = float(settings.RATES_COUNTRY_DEADLINE_SECONDS)
+
+    codes = list(countries.keys())
+    results = await asyncio.gather(
+        *(
+            _fetch_one_country(code, countries[code], client, sem, deadline)
+            for code in codes
+        ),
+        return_exceptions=True,
+    )
+
+    country_prices: dict[str, dict] = {}
+    failed: list[str] = []
+    any_unverified = False
+
+    for code, res in zip(codes, results):
+        if isinstance(res, BaseException):
+            if is_circuit_open(countries[code].fiat):
+                logger.warning("[rates] %s omitido: circuito Binance abierto para %s", code, countries[code].fiat)
+            elif isinstance(res, asyncio.TimeoutError):
+                logger.warning("[rates] %s excedió el deadline de %.1fs", code, deadline)
+            else:
+                logger.warning("[rates] %s sin precio: %s", code, res)
+            failed.append(code)
+            continue
+
+        if not res["is_verified"]:
+            any_unverified = True
+        country_prices[code] = res
+
+    return country_prices, failed, any_unverified
+
+
+def _to_price_record(code: str, info: dict) -> CountryPriceRecord:
+    return CountryPriceRecord(
+        country=code,
+        fiat=info["fiat"],
+        buy_price=info["buy"],
+        sell_price=info["sell"],
+        methods_used=info["methods_used"],
+        amount_ref=info["amount_ref"],
+        source="binance_p2p",
+        is_verified=bool(info["is_verified"]),
+    )
+
+
+async def _load_commissions(pairs: Iterable[tuple[str, str]]) -> dict[tuple[str, str], Decimal]:
+    """Comisiones de `pairs` desde la tabla compilada (una sola resolución de config)."""
+    table = await dynamic_config.commission_table()
+    matrix = table.matrix()
+    return {(o, d): matrix[(o, d)] if (o, d) in matrix else table.get(o, d) for o, d in pairs}
+
+
+def _log_cash_routes(routes: list[RouteRate]) -> None:
+    for rr in routes:
+        if rr.dest_country == CASH_DEST:
+            logger.info(
+                "VENEZUELA_CASH route %s→CASH: buy_origin=%s rate_client=%s (margin=%s%%)",
+                rr.origin_country, rr.buy_origin, rr.rate_client.quantize(Decimal("0.0001")),
+                (rr.commission_pct * 100).quantize(Decimal("0.01")),
+            )
+
+
+async def _diff_against_active(
+    rate_version_id: int,
+    routes: list[RouteRate],
+    *,
+    countries: Iterable[str] | None = None,
+) -> list[tuple[str, str]]:
+    """Rutas con cambio material vs la versión activa (ver rates_matrix.diff_route_matrix)."""
+    old = await list_route_rates_all_for_version(
+        rate_version_id=rate_version_id,
+        countries=list(countries) if countries is not None else None,
+    )
+    epsilon = await dynamic_config.get_rates_diff_epsilon()
+    return diff_route_matrix(routes, old, epsilon=epsilon)
+
+
+async def _touch_active_version(rate_version_id: int, now: datetime) -> None:
+    async with get_async_conn() as conn:
+        async with conn.transaction():
+            await touch_rate_version_tx(conn, rate_version_id=rate_version_id, effective_from=now)
+    await refresh_rates_snapshot()
+
+
+async def generate_rates_full(*, kind: str, reason: str, skip_if_unchanged: bool = True) -> GenerateResult:
     """
     Genera una versión completa de tasas (STRICTLY ASYNC).
     ATÓMICO: toda la escritura a DB ocurre en una sola transacción.
     Si falla a mitad, se hace rollback y las tasas anteriores siguen activas.
+
+    Con skip_if_unchanged (y settings.RATES_SKIP_UNCHANGED), si ninguna ruta
+    cambió de forma material respecto de la versión activa no se escribe
+    versión nueva: solo se refresca effective_from de la activa.
+    Los baselines (auto_9am) pasan skip_if_unchanged=False.
     """
-    client = BinanceP2PClient()
-    try:
-        now = datetime.now(timezone.utc)
+    client = get_binance_client()
+    now = datetime.now(timezone.utc)
 
-        country_prices: dict[str, dict] = {}
-        failed: list[str] = []
-        any_unverified = False
+    # Binance I/O (lectura externa, antes de la transacción)
+    country_prices, failed, any_unverified = await _fetch_country_prices(COUNTRIES, client)
 
-        # Binance I/O (lectura externa, antes de la transacción)
-        for code, cfg in COUNTRIES.items():
-            try:
-                buy_price, buy_verified, buy_method = await _pick_price_with_method_fallback(
-                    code, client, fiat=cfg.fiat, trade_type="BUY", methods=cfg.buy_methods, trans_amount=cfg.trans_amount
-                )
-                sell_price, sell_verified, sell_method = await _pick_price_with_method_fallback(
-                    code, client, fiat=cfg.fiat, trade_type="SELL", methods=cfg.sell_methods, trans_amount=cfg.trans_amount
+    if len(country_prices) < 2:
+        raise RuntimeError("No hay suficientes paises con precios para generar rutas (>=2).")
+
+    # Pre-fetch comisiones dinámicas desde DB (antes de la transacción)
+    codes = sorted(country_prices.keys())
+    commission_cache = await _load_commissions(
+        (origin, dest) for origin, dest in product(codes, codes) if origin != dest
+    )
+
+    # Configuración de efectivo (antes de la transacción)
+    cash = CashDeliveryParams.from_config(await dynamic_config.get_cash_delivery_config())
+
+    # 1. Precios por país
+    prices = [_to_price_record(code, info) for code, info in country_prices.items()]
+
+    # 2. Rutas (todas las combinaciones + VENEZUELA_CASH por origen)
+    routes = compute_route_matrix(
+        {code: info["buy"] for code, info in country_prices.items()},
+        {code: info["sell"] for code, info in country_prices.items()},
+        commission_cache,
+        cash=cash,
+        codes=codes,
+    )
+    _log_cash_routes(routes)
+
+    routes_changed = [(r.origin_country, r.dest_country) for r in routes]
+    if skip_if_unchanged and settings.RATES_SKIP_UNCHANGED:
+        rv = await get_latest_active_rate_version()
+        if rv:
+            routes_changed = await _diff_against_active(rv.id, routes)
+            if not routes_changed:
+                await _touch_active_version(rv.id, now)
+                logger.info("[rates] sin cambios materiales vs v%s (%d rutas): no se escribe versión nueva", rv.id, len(routes))
+                return GenerateResult(
+                    version_id=int(rv.id),
+                    countries_ok=sorted(country_prices.keys()),
+                    countries_failed=failed,
+                    any_unverified=any_unverified,
+                    countries_circuit_open=[c for c in failed if is_circuit_open(COUNTRIES[c].fiat)],
+                    skipped_unchanged=True,
                 )
 
-                is_verified = bool(buy_verified and sell_verified)
-                if not is_verified:
-                    any_unverified = True
-
-                country_prices[code] = {
-                    "fiat": cfg.fiat,
-                    "buy": buy_price,
-                    "sell": sell_price,
-                    "is_verified": is_verified,
-                    "methods_used": f"BUY:{buy_method}|SELL:{sell_method}",
-                    "amount_ref": Decimal(str(cfg.trans_amount)),
-                }
-            except Exception:
-                failed.append(code)
-
-        if len(country_prices) < 2:
-            raise RuntimeError("No hay suficientes paises con precios para generar rutas (>=2).")
-
-        # Pre-fetch comisiones dinámicas desde DB (antes de la transacción)
-        codes = sorted(country_prices.keys())
-        commission_cache: dict[tuple[str, str], Decimal] = {}
-        for origin, dest in product(codes, codes):
-            if origin == dest:
-                continue
-            pct = await dynamic_config.get_commission_pct(origin, dest)
-            commission_cache[(origin, dest)] = pct
-
-        # === TRANSACCIÓN ATÓMICA ===
-        # Todo lo que sigue ocurre en una sola transacción.
-        # Si falla en cualquier punto, se hace rollback automático
-        # y las tasas anteriores siguen activas.
-        async with get_async_conn() as conn:
-            async with conn.transaction():
-                async with conn.cursor() as cur:
-                    # 1. Desactivar versiones anteriores
-                    await cur.execute(
-                        "UPDATE rate_versions SET is_active = false WHERE is_active = true;"
-                    )
-
-                    # 2. Crear nueva versión
-                    await cur.execute(
-                        """
-                        INSERT INTO rate_versions (kind, reason, effective_from, is_active)
-                        VALUES (%s, %s, %s, true)
-                        RETURNING id;
-                        """,
-                        (kind, reason, now),
-                    )
-                    res = await cur.fetchone()
-                    version_id = int(res[0]) if res else 0
-
-                    # 3. Guardar precios por país
-                    for code, info in country_prices.items():
-                        await cur.execute(
-                            """
-                            INSERT INTO p2p_country_prices (
-                                rate_version_id, country, fiat,
-                                buy_price, sell_price,
-                                methods_used, amount_ref,
-                                source, is_verified
-                            )
-                            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s);
-                            """,
-                            (
-                                version_id,
-                                code, info["fiat"],
-                                info["buy"], info["sell"],
-                                info["methods_used"], info["amount_ref"],
-                                "binance_p2p", bool(info["is_verified"]),
-                            ),
-                        )
-
-                    # 4. Guardar rutas (todas las combinaciones)
-                    for origin, dest in product(codes, codes):
-                        if origin == dest:
-                            continue
-
-                        buy_origin = country_prices[origin]["buy"]
-                        sell_dest = country_prices[dest]["sell"]
-
-                        pct = commission_cache[(origin, dest)]
-
-                        rate_base = (sell_dest / buy_origin)
-                        rate_client = rate_base * (Decimal("1.0") - pct)
-
-                        await cur.execute(
-                            """
-                            INSERT INTO route_rates (
-                                rate_version_id,
-                                origin_country, dest_country,
-                                commission_pct,
-                                buy_origin, sell_dest,
-                                rate_base, rate_client
-                            )
-                            VALUES (%s,%s,%s,%s,%s,%s,%s,%s);
-                            """,
-                            (
-                                version_id,
-                                origin, dest,
-                                pct,
-                                buy_origin, sell_dest,
-                                rate_base, rate_client,
-                            ),
-                        )
-
-                     # 5. === RUTAS VENEZUELA_CASH (Entrega en Efectivo) ===
-                    # Fetch config outside inner loop (already in transaction, reads committed data)
-                    cash_cfg = await dynamic_config.get_cash_delivery_config()
-                    zelle_cost: Decimal = cash_cfg["zelle_usdt_cost"]       # e.g. 1.03
-                    margin_zelle: Decimal = cash_cfg["margin_cash_zelle"]    # e.g. 0.12
-                    margin_general: Decimal = cash_cfg["margin_cash_general"] # e.g. 0.10
-
-                    for origin in codes:
-                        try:
-                            if origin == "USA":
-                                # Costo fijo Zelle: 1.03 USD = 1 USDT
-                                # el buy_origin=zelle_cost, sell_dest=1 (USD efectivo)
-                                buy_origin_cash = zelle_cost
-                                sell_dest_cash = Decimal("1")
-                                rate_base_cash = sell_dest_cash / buy_origin_cash
-                                rate_client_cash = rate_base_cash * (Decimal("1") - margin_zelle)
-                                comm_pct_cash = margin_zelle
-                            else:
-                                # Costo de adquisición = precio de Binance BUY del país origen
-                                buy_origin_cash = country_prices[origin]["buy"]
-                                sell_dest_cash = Decimal("1")   # 1 USDT = 1 USD efectivo (delivery at par)
-                                rate_base_cash = sell_dest_cash / buy_origin_cash
-                                rate_client_cash = rate_base_cash * (Decimal("1") - margin_general)
-                                comm_pct_cash = margin_general
-
-                            await cur.execute(
-                                """
-                                INSERT INTO route_rates (
-                                    rate_version_id,
-                                    origin_country, dest_country,
-                                    commission_pct,
-                                    buy_origin, sell_dest,
-                                    rate_base, rate_client
-                                )
-                                VALUES (%s,%s,%s,%s,%s,%s,%s,%s);
-                                """,
-                                (
-                                    version_id,
-                                    origin, "VENEZUELA_CASH",
-                                    comm_pct_cash,
-                                    buy_origin_cash, sell_dest_cash,
-                                    rate_base_cash, rate_client_cash,
-                                ),
-                            )
-                            logger.info(
-                                "VENEZUELA_CASH route %s→CASH: buy_origin=%s rate_client=%s (margin=%s%%)",
-                                origin, buy_origin_cash, rate_client_cash.quantize(Decimal("0.0001")),
-                                (comm_pct_cash * 100).quantize(Decimal("0.01")),
-                            )
-                        except Exception as e:
-                            logger.warning("Failed to generate VENEZUELA_CASH route for origin=%s: %s", origin, e)
-
-        return GenerateResult(
-
-            version_id=int(version_id),
-            countries_ok=sorted(country_prices.keys()),
-            countries_failed=failed,
-            any_unverified=any_unverified,
-        )
+    # === TRANSACCIÓN ATÓMICA ===
+    # Versión + precios + rutas + switch de versión activa en una sola
+    # transacción (COPY bulk, ver rates_repo.write_rate_version_tx).
+    # Si falla en cualquier punto, se hace rollback automático
+    # y las tasas anteriores siguen activas.
+    async with get_async_conn() as conn:
+        async with conn.transaction():
+            version_id = await write_rate_version_tx(
+                conn,
+                kind=kind,
+                reason=reason,
+                effective_from=now,
+                prices=prices,
+                routes=routes,
+            )
+    await refresh_rates_snapshot()
 
-    finally:
-        await client.close()
+    return GenerateResult(
+        version_id=int(version_id),
+        countries_ok=sorted(country_prices.keys()),
+        countries_failed=failed,
+        any_unverified=any_unverified,
+        countries_circuit_open=[c for c in failed if is_circuit_open(COUNTRIES[c].fiat)],
+        routes_changed=routes_changed,
+    )
+
+
+async def generate_rates_incremental(
+    *,
+    countries: Iterable[str],
+    kind: str,
+    reason: str,
+    skip_if_unchanged: bool = True,
+) -> GenerateResult:
+    """
+    Regeneración incremental (STRICTLY ASYNC).
+
+    Solo consulta Binance para `countries` (más los países configurados que
+    falten en la versión activa); los precios del resto se copian de la
+    versión activa. Las rutas se recalculan TODAS con la tabla de comisiones
+    y la config de efectivo actuales (es barato, ver rates_matrix): un cambio
+    de comisión o de cash_delivery llega en la próxima corrida de 30m, no
+    recién en el baseline de las 9am. Países que ya no están en COUNTRIES
+    no se arrastran.
+    Mismo switch atómico y mismo skip-if-unchanged que generate_rates_full.
+    Sin versión activa previa cae a generate_rates_full.
+    """
+    rv = await get_latest_active_rate_version()
+    if not rv:
+        return await generate_rates_full(kind=kind, reason=reason, skip_if_unchanged=skip_if_unchanged)
+
+    previous = {p.country: p for p in await list_country_prices_full_for_version(rate_version_id=rv.id)}
+    wanted = {c for c in countries if c in COUNTRIES} | (set(COUNTRIES) - set(previous))
+    if not wanted:
+        raise RuntimeError("Regeneración incremental sin países a refrescar.")
+
+    client = get_binance_client()
+    now = datetime.now(timezone.utc)
+
+    fetched, failed, _ = await _fetch_country_prices({c: COUNTRIES[c] for c in sorted(wanted)}, client)
+    if not fetched:
+        raise RuntimeError(f"Ningún país pudo refrescarse ({sorted(wanted)}); se mantiene la versión {rv.id}.")
+
+    merged: dict[str, CountryPriceRecord] = {c: p for c, p in previous.items() if c in COUNTRIES}
+    for code, info in fetched.items():
+        merged[code] = _to_price_record(code, info)
+
+    if len(merged) < 2:
+        raise RuntimeError("No hay suficientes paises con precios para generar rutas (>=2).")
+
+    changed = set(fetched)
+    codes = sorted(merged)
+    commission_cache = await _load_commissions(
+        (origin, dest) for origin, dest in product(codes, codes) if origin != dest
+    )
+    cash = CashDeliveryParams.from_config(await dynamic_config.get_cash_delivery_config())
+
+    routes = compute_route_matrix(
+        {c: p.buy_price for c, p in merged.items()},
+        {c: p.sell_price for c, p in merged.items()},
+        commission_cache,
+        cash=cash,
+        codes=codes,
+    )
+    _log_cash_routes(routes)
+
+    routes_changed = [(r.origin_country, r.dest_country) for r in routes]
+    if skip_if_unchanged and settings.RATES_SKIP_UNCHANGED:
+        routes_changed = await _diff_against_active(rv.id, routes)
+        if not routes_changed:
+            await _touch_active_version(rv.id, now)
+            logger.info("[rates] incremental sin cambios materiales vs v%s (%s): no se escribe versión nueva", rv.id, sorted(changed))
+            return GenerateResult(
+                version_id=int(rv.id),
+                countries_ok=sorted(changed),
+                countries_failed=failed,
+                any_unverified=any(not merged[c].is_verified for c in changed),
+                countries_circuit_open=[c for c in failed if is_circuit_open(COUNTRIES[c].fiat)],
+                skipped_unchanged=True,
+            )
+
+    async with get_async_conn() as conn:
+        async with conn.transaction():
+            version_id = await write_rate_version_tx(
+                conn,
+                kind=kind,
+                reason=reason,
+                effective_from=now,
+                prices=[merged[c] for c in codes],
+                routes=routes,
+            )
+    await refresh_rates_snapshot()
+
+    logger.info(
+        "[rates] incremental v%s (desde v%s): refrescados=%s rutas=%d cambiadas=%d",
+        version_id, rv.id, sorted(changed), len(routes), len(routes_changed),
+    )
+
+    return GenerateResult(
+        version_id=int(version_id),
+        countries_ok=sorted(changed),
+        countries_failed=failed,
+        any_unverified=any(not merged[c].is_verified for c in changed),
+        countries_circuit_open=[c for c in failed if is_circuit_open(COUNTRIES[c].fiat)],
+        routes_changed=routes_changed,
+    )
@@ -0,0 +1,219 @@
+"""
+Motor de matriz de rutas (rate_base / rate_client para todas las parejas).
+
+Entrada:
+- vector de precios BUY por país   (fiat por 1 USDT)
+- vector de precios SELL por país  (fiat por 1 USDT)
+- matriz de comisiones origin×dest (decimal, 0.06 = 6%)
+- parámetros de Entrega en Efectivo (pseudo-destino VENEZUELA_CASH)
+
+Salida: lista de RouteRate lista para persistir o mostrar.
+
+Es síncrono y sin I/O: lo comparten generate_rates_full, el cálculo al vuelo
+de VENEZUELA_CASH en new_order_flow y las herramientas "what-if"
+(ver scripts/bench_route_matrix.py).
+
+diff_route_matrix compara una matriz nueva con la activa para decidir si
+vale la pena escribir una versión nueva (ver generate_rates_full).
+
+Todo el cálculo es Decimal: mismo resultado exacto que el loop anterior
+(rate_base = sell_dest / buy_origin; rate_client = rate_base * (1 - pct)).
+No está vectorizado (float/NumPy cambiaría el redondeo): sigue siendo un
+loop por pareja. Lo que se ahorra frente al generate_rates_full anterior es
+el await de comisión por pareja y el INSERT por ruta; el loop en sí cuesta
+lo mismo (ver scripts/bench_route_matrix.py).
+El redondeo final lo hace la columna NUMERIC(18,10) al persistir.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Collection, Iterable, Mapping
+
+from src.db.repositories.rates_repo import RouteRate
+
+logger = logging.getLogger(__name__)
+
+CASH_DEST = "VENEZUELA_CASH"
+CASH_ZELLE_ORIGIN = "USA"
+
+_ONE = Decimal("1")
+
+
+@dataclass(frozen=True)
+class CashDeliveryParams:
+    zelle_usdt_cost: Decimal      # e.g. 1.03 USD por 1 USDT (origen USA)
+    margin_cash_zelle: Decimal    # e.g. 0.12
+    margin_cash_general: Decimal  # e.g. 0.10
+
+    @classmethod
+    def from_config(cls, cfg: Mapping[str, Decimal]) -> "CashDeliveryParams":
+        """Desde dynamic_config.get_cash_delivery_config()."""
+        return cls(
+            zelle_usdt_cost=cfg["zelle_usdt_cost"],
+            margin_cash_zelle=cfg["margin_cash_zelle"],
+            margin_cash_general=cfg["margin_cash_general"],
+        )
+
+
+def format_rate_no_noise(rate: Decimal) -> str:
+    """
+    Regla acordada:
+    - Si rate >= 1:
+      - si entero exacto -> "1"
+      - si no -> 2 decimales ("1.03")
+    - Si 0 < rate < 1:
+      - mostrar 3 dígitos significativos
+      - conservar ceros líderes (ej 0.000222 -> "0.000222")
+      - ej 0.875377... -> "0.875"
+    """
+    if rate <= 0:
+        return str(rate)
+
+    if rate >= 1:
+        # entero exacto
+        if rate == rate.to_integral_value():
+            return str(rate.quantize(Decimal("1")))
+        return f"{rate.quantize(Decimal('0.01'))}"
+
+    # 0 < rate < 1
+    s = format(rate, "f")  # decimal sin notación científica
+    if "." not in s:
+        return s
+
+    int_part, frac = s.split(".", 1)
+
+    # contar ceros líderes en la parte fraccionaria
+    zeros = 0
+    for ch in frac:
+        if ch == "0":
+            zeros += 1
+        else:
+            break
+
+    # tomamos 3 dígitos significativos después de los ceros
+    significant = frac[zeros:zeros + 3]
+    if not significant:
+        # caso extremo: es algo como 0.0000...
+        return "0"
+
+    out_frac = frac[:zeros] + significant
+    return f"0.{out_frac}".rstrip("0").rstrip(".")
+
+
+def compute_cash_route(origin: str, buy_origin: Decimal | None, cash: CashDeliveryParams) -> RouteRate:
+    """
+    Ruta origin -> VENEZUELA_CASH.
+    - USA: costo fijo Zelle (buy_origin = zelle_usdt_cost), margen Zelle.
+    - Resto: buy_origin = precio Binance BUY del origen, margen general.
+    sell_dest = 1 (1 USDT = 1 USD efectivo, entrega a la par).
+    """
+    if origin == CASH_ZELLE_ORIGIN:
+        buy = cash.zelle_usdt_cost
+        pct = cash.margin_cash_zelle
+    else:
+        if buy_origin is None:
+            raise ValueError(f"Sin precio BUY para {origin}")
+        buy = buy_origin
+        pct = cash.margin_cash_general
+
+    rate_base = _ONE / buy
+    return RouteRate(origin, CASH_DEST, pct, buy, _ONE, rate_base, rate_base * (_ONE - pct))
+
+
+def compute_route_matrix(
+    buy: Mapping[str, Decimal],
+    sell: Mapping[str, Decimal],
+    commissions: Mapping[tuple[str, str], Decimal],
+    *,
+    cash: CashDeliveryParams | None = None,
+    codes: Iterable[str] | None = None,
+    only: Collection[str] | None = None,
+) -> list[RouteRate]:
+    """
+    Calcula todas las rutas origin != dest (orden: origen, destino alfabético)
+    y, si se pasa `cash`, una ruta VENEZUELA_CASH por origen.
+
+    Con `only` (cálculo parcial, p. ej. what-if) solo se calculan las rutas que
+    tocan esos países: O(len(only) × N) en vez de O(N²). `commissions`
+    solo necesita esas parejas.
+
+    Loop Decimal por pareja con las comisiones ya resueltas en `commissions`
+    (un dict lookup por pareja, sin awaits ni I/O). Una ruta VENEZUELA_CASH
+    que falla para un origen se omite con warning, sin abortar el resto.
+    """
+    codes = sorted(codes if codes is not None else (set(buy) & set(sell)))
+    only_set = set(only) if only is not None else None
+
+    routes: list[RouteRate] = []
+    for origin in codes:
+        buy_o = buy[origin]
+        if only_set is None or origin in only_set:
+            dests = codes
+        else:
+            dests = [d for d in codes if d in only_set]
+        for dest in dests:
+            if dest == origin:
+                continue
+            pct = commissions[(origin, dest)]
+            sell_d = sell[dest]
+            rate_base = sell_d / buy_o
+            routes.append(RouteRate(origin, dest, pct, buy_o, sell_d, rate_base, rate_base * (_ONE - pct)))
+
+    if cash is not None:
+        for origin in codes:
+            if only_set is not None and origin not in only_set:
+                continue
+            try:
+                routes.append(compute_cash_route(origin, buy.get(origin), cash))
+            except Exception as e:
+                logger.warning("Failed to generate VENEZUELA_CASH route for origin=%s: %s", origin, e)
+
+    return routes
+
+
+def diff_route_matrix(
+    new: Iterable[RouteRate],
+    old: Iterable[RouteRate],
+    *,
+    epsilon: Mapping[str, Decimal],
+) -> list[tuple[str, str]]:
+    """
+    Rutas (origin, dest) con cambio material entre `old` (versión activa) y
+    `new` (recién calculada). Cambio material:
+    - ruta nueva o que desaparece
+    - comisión distinta
+    - la tasa mostrada al cliente (format_rate_no_noise) cambia
+    - |Δ rate_client| / rate_client anterior > epsilon de la ruta
+
+    `epsilon`: {"default": x, "ORIGIN_DEST": y} (mismo formato de clave que
+    commission_routes), variación relativa (0.0005 = 0.05%).
+    """
+    default_eps = epsilon.get("default", Decimal("0"))
+    old_by_pair = {(r.origin_country, r.dest_country): r for r in old}
+
+    changed: list[tuple[str, str]] = []
+    for r in new:
+        pair = (r.origin_country, r.dest_country)
+        prev = old_by_pair.pop(pair, None)
+        if prev is None:
+            changed.append(pair)
+            continue
+
+        new_rate = Decimal(str(r.rate_client))
+        old_rate = Decimal(str(prev.rate_client))
+        if Decimal(str(r.commission_pct)) != Decimal(str(prev.commission_pct)):
+            changed.append(pair)
+        elif Decimal(format_rate_no_noise(new_rate)) != Decimal(format_rate_no_noise(old_rate)):
+            changed.append(pair)
+        elif old_rate <= 0:
+            if new_rate != old_rate:
+                changed.append(pair)
+        elif abs(new_rate - old_rate) / old_rate > epsilon.get(f"{pair[0]}_{pair[1]}", default_eps):
+            changed.append(pair)
+
+    # Rutas que ya no se generan (p. ej. país sin precio en esta corrida)
+    changed.extend(sorted(old_by_pair))
+    return changed
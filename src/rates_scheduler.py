@@ -2,8 +2,8 @@
 Scheduler de tasas usando JobQueue de python-telegram-bot.
 
 - run_9am_baseline: genera tasas completas a las 9am VET
-- run_30m_check: compara precios actuales de Binance con la última versión
-  y regenera si la variación supera el umbral configurado (default 3%).
+- run_30m_check: compara precios actuales de Binance (BUY y SELL) con la última
+  versión y regenera si la variación supera el umbral configurado (default 3%).
 
 Sprint 4 (Alert Copilot):
 - run_vault_alert_check: alerta si vault.balance < vault.alert_threshold
@@ -33,30 +33,30 @@ class RatesScheduler:
             res = await generate_rates_full(
                 kind="auto_9am",
                 reason="Baseline diario 9am",
+                skip_if_unchanged=False,  # el check 30m compara contra este baseline
             )
             logger.info(
-                "[rates] 9am OK — version=%s  ok=%s  failed=%s",
+                "[rates] 9am OK — version=%s  ok=%s  failed=%s  circuit_open=%s",
                 res.version_id,
                 res.countries_ok,
                 res.countries_failed,
+                res.countries_circuit_open,
             )
         except Exception:
             logger.exception("[rates] 9am baseline FALLÓ (se reintentará en 30 min)")
 
     async def run_30m_check(self) -> None:
         """
-        Compara precios actuales de Binance con los guardados.
+        Compara precios actuales de Binance (BUY y SELL) con los guardados.
         Si algún país varía más del umbral, regenera tasas.
+        Una query para los precios guardados + consultas a Binance en paralelo
+        (ver src/rates_drift.py).
         """
         logger.info("[rates] 30m check — comparando precios …")
         try:
             from src.db.settings_store import get_setting_float
-            from src.db.repositories.rates_repo import (
-                get_latest_active_rate_version,
-                get_country_price_for_version,
-            )
-            from src.integrations.binance_p2p import BinanceP2PClient
-            from src.integrations.p2p_config import COUNTRIES
+            from src.db.repositories.rates_repo import get_latest_active_rate_version
+            from src.rates_drift import check_price_drift
 
             # Umbral configurable desde DB (default 3%)
             threshold = await get_setting_float(
@@ -70,57 +70,65 @@ class RatesScheduler:
                 await self.run_9am_baseline()
                 return
 
-            client = BinanceP2PClient()
-            try:
-                needs_regen = False
-
-                for code, cfg in COUNTRIES.items():
-                    cp = await get_country_price_for_version(
-                        rate_version_id=rv.id, country=code
-                    )
-                    if not cp:
-                        continue
-
-                    try:
-                        from src.integrations.price_override import get_buy_price
-                        current_buy = await get_buy_price(code, cfg.buy_methods[0])
-                        saved_buy = Decimal(str(cp.buy_price))
-
-                        if saved_buy > 0:
-                            var = abs(current_buy - saved_buy) / saved_buy
-                            if var >= threshold_pct:
-                                logger.info(
-                                    "[rates] %s BUY varió %.2f%% (umbral %.2f%%) — regenerando",
-                                    code,
-                                    float(var * 100),
-                                    float(threshold_pct * 100),
-                                )
-                                needs_regen = True
-                                break
-                    except Exception as e:
-                        logger.warning("[rates] 30m check error para %s: %s", code, e)
-                        continue
-
-                if needs_regen:
-                    from src.rates_generator import generate_rates_full
-
-                    res = await generate_rates_full(
-                        kind="auto_30m",
-                        reason=f"Variación detectada >{threshold}%",
-                    )
-                    logger.info(
-                        "[rates] 30m regen OK — version=%s",
-                        res.version_id,
-                    )
+            report = await check_price_drift(rv.id, threshold_pct)
+            for row in report.countries:
+                if row.error:
+                    logger.warning("[rates] 30m check %s", row.describe())
                 else:
-                    logger.info("[rates] 30m check — sin variación significativa")
+                    logger.info("[rates] 30m check %s", row.describe())
+
+            drifted = report.drifted
+            if drifted:
+                logger.info(
+                    "[rates] variación >= %.2f%% en %s (sin cotización: %s)",
+                    float(threshold_pct * 100),
+                    drifted,
+                    report.failed,
+                )
+                await self._regenerate_for_drift(drifted, threshold)
+            else:
+                logger.info("[rates] 30m check — sin variación significativa")
 
-            finally:
-                await client.close()
+            from src.integrations.binance_p2p import quote_cache
+            logger.info("[rates] p2p quote cache: %s", quote_cache.stats())
 
         except Exception:
             logger.exception("[rates] 30m check FALLÓ")
 
+    async def _regenerate_for_drift(self, drifted: list[str], threshold: float) -> None:
+        """Regenera tasas por variación: incremental (solo países movidos) o completa."""
+        reason = f"Variación detectada >{threshold}% ({', '.join(drifted)})"
+
+        if settings.RATES_INCREMENTAL_REGEN:
+            from src.rates_generator import generate_rates_incremental
+
+            res = await generate_rates_incremental(
+                countries=drifted,
+                kind="auto_30m",
+                reason=reason,
+            )
+        else:
+            from src.rates_generator import generate_rates_full
+
+            res = await generate_rates_full(kind="auto_30m", reason=reason)
+
+        if res.skipped_unchanged:
+            logger.info(
+                "[rates] 30m regen sin cambios materiales — se mantiene version=%s  refrescados=%s  failed=%s",
+                res.version_id,
+                res.countries_ok,
+                res.countries_failed,
+            )
+            return
+
+        logger.info(
+            "[rates] 30m regen OK — version=%s  refrescados=%s  failed=%s  rutas=%d",
+            res.version_id,
+            res.countries_ok,
+            res.countries_failed,
+            len(res.routes_changed),
+        )
+
     # ════════════════════════════════════════════════════════════
     # SPRINT 4 — Copiloto de Alertas
     # ════════════════════════════════════════════════════════════
@@ -0,0 +1,241 @@
+"""
+Snapshot en memoria de la versión de tasas activa.
+
+Las tasas cambian como mucho cada 30 minutos pero se leen en casi cada
+interacción (📈 Tasas, "ver más", resumen de la orden, /api/rates/current).
+En vez de 2+ queries por lectura, el proceso guarda un snapshot inmutable:
+metadatos de la versión + matriz completa de rutas + precios por país.
+
+Actualización:
+- generate_rates_* lo refresca en el mismo proceso al hacer COMMIT
+- NOTIFY rate_version_switched (rates_repo.write_rate_version_tx) para otros
+  procesos/réplicas
+- polling de respaldo cada settings.RATES_SNAPSHOT_POLL_SECONDS (1 fila)
+
+El swap es una sola asignación: un lector ve la versión vieja completa o la
+nueva completa, nunca una mezcla. Lecturas sin snapshot cargado (o sin
+watcher corriendo y snapshot vencido) lo cargan en línea.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+from typing import Iterable, Mapping
+
+from src.config.settings import settings
+from src.db.connection import connect_listener
+from src.db.repositories.rates_repo import (
+    RATE_VERSION_CHANNEL,
+    CountryPriceRecord,
+    RateVersion,
+    RouteRate,
+    get_latest_active_rate_version,
+    list_country_prices_full_for_version,
+    list_route_rates_all_for_version,
+)
+
+logger = logging.getLogger(__name__)
+
+_LISTEN_RETRY_SECONDS = 30.0
+
+
+@dataclass(frozen=True)
+class RatesSnapshot:
+    version: RateVersion
+    routes: Mapping[tuple[str, str], RouteRate]
+    prices: Mapping[str, CountryPriceRecord]
+
+    @property
+    def version_id(self) -> int:
+        return int(self.version.id)
+
+    def route(self, origin: str, dest: str) -> RouteRate | None:
+        return self.routes.get((origin, dest))
+
+    def routes_for(self, pairs: Iterable[tuple[str, str]]) -> list[RouteRate]:
+        """Rutas en el orden de `pairs` (las que no existen se omiten)."""
+        return [rr for rr in (self.routes.get(p) for p in pairs) if rr is not None]
+
+    def routes_by_origin(self, origin: str) -> list[RouteRate]:
+        """Rutas salientes de `origin`, ordenadas por destino."""
+        return sorted(
+            (rr for (o, _), rr in self.routes.items() if o == origin),
+            key=lambda rr: rr.dest_country,
+        )
+
+    def route_pairs(self) -> list[tuple[str, str]]:
+        return list(self.routes)
+
+    def country_price(self, country: str) -> CountryPriceRecord | None:
+        return self.prices.get(country)
+
+
+async def load_rates_snapshot(version: RateVersion) -> RatesSnapshot:
+    routes = await list_route_rates_all_for_version(rate_version_id=version.id)
+    prices = await list_country_prices_full_for_version(rate_version_id=version.id)
+    return RatesSnapshot(
+        version=version,
+        routes=MappingProxyType({(rr.origin_country, rr.dest_country): rr for rr in routes}),
+        prices=MappingProxyType({p.country: p for p in prices}),
+    )
+
+
+async def _close_quietly(conn) -> None:
+    try:
+        await conn.close()
+    except Exception:
+        pass
+
+
+class RatesSnapshotStore:
+    """Snapshot activo + watcher (LISTEN/NOTIFY con polling de respaldo)."""
+
+    def __init__(self, poll_seconds: float):
+        self.poll_seconds = poll_seconds
+        self._snapshot: RatesSnapshot | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._listening = False
+        self._loads = 0
+        self._notifies = 0
+
+    @property
+    def current(self) -> RatesSnapshot | None:
+        return self._snapshot
+
+    async def get(self) -> RatesSnapshot | None:
+        """Snapshot vigente; solo va a DB si no hay uno cargado (o está vencido sin watcher)."""
+        snap = self._snapshot
+        if snap is not None and (self._task is not None or time.monotonic() - self._checked_at < self.poll_seconds):
+            return snap
+        return await self.refresh()
+
+    async def refresh(self) -> RatesSnapshot | None:
+        """
+        Verifica la versión activa (1 fila) y recarga rutas/precios solo si cambió.
+        Llamadas concurrentes comparten la misma verificación.
+        """
+        requested = time.monotonic()
+        async with self._lock:
+            if self._checked_at >= requested:
+                return self._snapshot
+
+            started = time.monotonic()
+            rv = await get_latest_active_rate_version()
+            current = self._snapshot
+            if rv is None:
+                # Sin versión activa: se mantiene la última conocida (si hay)
+                pass
+            elif current is not None and current.version_id == rv.id:
+                if current.version != rv:
+                    self._snapshot = replace(current, version=rv)
+            else:
+                self._snapshot = await load_rates_snapshot(rv)
+                self._loads += 1
+                logger.info(
+                    "[rates_snapshot] versión activa v%s cargada (%d rutas, %d países)",
+                    rv.id, len(self._snapshot.routes), len(self._snapshot.prices),
+                )
+            self._checked_at = started
+            return self._snapshot
+
+    async def _watch(self) -> None:
+        while True:
+            conn = None
+            try:
+                if settings.RATES_SNAPSHOT_LISTEN:
+                    conn = await connect_listener(RATE_VERSION_CHANNEL)
+                    self._listening = True
+                    logger.info("[rates_snapshot] LISTEN %s activo", RATE_VERSION_CHANNEL)
+                while True:
+                    if conn is not None:
+                        async for _ in conn.notifies(timeout=self.poll_seconds, stop_after=1):
+                            self._notifies += 1
+                    else:
+                        await asyncio.sleep(self.poll_seconds)
+                    try:
+                        await self.refresh()
+                    except Exception as e:
+                        logger.warning("[rates_snapshot] refresh falló (se mantiene v%s): %s",
+                                       self._snapshot.version_id if self._snapshot else None, e)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("[rates_snapshot] LISTEN caído, solo polling hasta reintentar: %s", e)
+                self._listening = False
+                if conn is not None:
+                    await _close_quietly(conn)
+                    conn = None
+                deadline = time.monotonic() + _LISTEN_RETRY_SECONDS
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(min(self.poll_seconds, _LISTEN_RETRY_SECONDS))
+                    try:
+                        await self.refresh()
+                    except Exception:
+                        pass
+            finally:
+                self._listening = False
+                if conn is not None:
+                    await _close_quietly(conn)
+
+    async def start(self) -> None:
+        """Carga inicial (best-effort) + watcher en background (idempotente)."""
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning("[rates_snapshot] carga inicial falló (se reintenta en la primera lectura): %s", e)
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch(), name="rates_snapshot_watch")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def stats(self) -> dict:
+        snap = self._snapshot
+        return {
+            "version_id": snap.version_id if snap else None,
+            "routes": len(snap.routes) if snap else 0,
+            "age_seconds": round(time.monotonic() - self._checked_at, 1) if snap else None,
+            "loads": self._loads,
+            "notifies": self._notifies,
+            "listening": self._listening,
+            "watching": self._task is not None,
+        }
+
+
+# --- Store compartido (process-wide) ---
+# Se arranca/detiene con el lifespan de FastAPI (src/main.py).
+
+rates_snapshot = RatesSnapshotStore(poll_seconds=float(settings.RATES_SNAPSHOT_POLL_SECONDS))
+
+
+async def get_rates_snapshot() -> RatesSnapshot | None:
+    """Snapshot de la versión activa (None si todavía no hay tasas)."""
+    return await rates_snapshot.get()
+
+
+async def refresh_rates_snapshot() -> None:
+    """Recarga best-effort (tras escribir una versión en este proceso)."""
+    try:
+        await rates_snapshot.refresh()
+    except Exception as e:
+        logger.warning("[rates_snapshot] refresh tras generar tasas falló: %s", e)
+
+
+async def start_rates_snapshot() -> None:
+    await rates_snapshot.start()
+
+
+async def stop_rates_snapshot() -> None:
+    await rates_snapshot.stop()
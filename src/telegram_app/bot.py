@@ -9,12 +9,13 @@ from telegram.ext import (
     CommandHandler,
     ContextTypes,
     MessageHandler,
-    PicklePersistence,
     filters,
 )
 from telegram.request import HTTPXRequest
 
 from src.config.settings import settings
+from src.telegram_app.db_persistence import build_persistence
+from src.telegram_app.update_processor import ChatOrderedUpdateProcessor
 from src.telegram_app.flows.kyc_flow import build_kyc_conversation
 from src.telegram_app.flows.new_order_flow import build_new_order_conversation
 from src.telegram_app.flows.withdrawal_flow import build_withdrawal_conversation_handler
@@ -46,7 +47,6 @@ from src.telegram_app.handlers.menu import menu_router
 from src.telegram_app.handlers.panic import panic_handler
 from src.telegram_app.handlers.rates_more import handle_rates_more
 from src.telegram_app.handlers.summary import build_summary_callback_handler
-from src.utils.google_drive import init_folders
 
 logger = logging.getLogger(__name__)
 
@@ -84,8 +84,8 @@ async def universal_sniffer(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 def build_bot() -> Application:
-    # Persistencia de sesión (Fase 2)
-    persistence = PicklePersistence(filepath="bot_persistence.pickle")
+    # Persistencia de sesión: Postgres por defecto (src/telegram_app/db_persistence.py)
+    persistence = build_persistence()
     
     request = HTTPXRequest(connect_timeout=20.0, read_timeout=30.0, write_timeout=30.0, pool_timeout=30.0)
 
@@ -96,6 +96,13 @@ def build_bot() -> Application:
         .token(settings.TELEGRAM_BOT_TOKEN)
         .request(request)
         .persistence(persistence)
+        # Paralelo entre chats, en orden dentro de cada chat (src/telegram_app/update_processor.py)
+        .concurrent_updates(
+            ChatOrderedUpdateProcessor(
+                settings.BOT_CONCURRENT_UPDATES,
+                max_queued=settings.WEBHOOK_MAX_PENDING,
+            )
+        )
         .build()
     )
 
@@ -144,11 +151,8 @@ def build_bot() -> Application:
     # Menú (solo APPROVED)
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, menu_router), group=6)
 
-    # Initialize Google Drive Vault Folders
-    try:
-        init_folders()
-    except Exception as e:
-        logger.error("Failed to initialize Google Drive folders: %s", e)
-    
+    # Carpetas del Vault (Google Drive): se resuelven en background al arrancar
+    # el worker de subidas (src/utils/drive_uploads.py), no bloquean build_bot()
+
     logger.info("Bot listo: KYC + órdenes + retiros + admin (Persistence: ON)")
     return app
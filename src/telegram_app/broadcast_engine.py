@@ -0,0 +1,320 @@
+"""
+Motor de difusiones (📢 Difusión del panel admin).
+
+Antes el handler enviaba copy_message uno por uno con sleep(0.05) dentro de
+la conversación: ignoraba RetryAfter, bloqueaba al admin y un reinicio
+perdía el progreso. Ahora:
+
+- la difusión y sus destinatarios se persisten al confirmar
+  (broadcast_repo.create_broadcast) y el handler retorna de inmediato
+- N envíos concurrentes (settings.BROADCAST_CONCURRENCY) pasan por un
+  token bucket global (settings.BROADCAST_RATE_PER_SECOND, límite de Telegram)
+- RetryAfter pausa el bucket completo (el flood-wait de Telegram es por bot)
+  y el destinatario se reintenta
+- resultados por lotes a DB: un reinicio retoma solo los PENDING. Un
+  lote que no se pudo escribir vuelve a la cola del próximo flush
+- cada difusión RUNNING se arrienda (broadcasts.lease_owner/lease_until):
+  con varias réplicas la envía una sola; el supervisor renueva los leases
+  propios y retoma las difusiones cuyo lease venció (instancia caída)
+- Forbidden / chat inexistente -> BLOCKED y user_contacts.blocked_at
+  (las próximas difusiones los saltan)
+- progreso en vivo editando el mensaje de estado del admin
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from src.config.settings import settings
+from src.db.repositories.broadcast_repo import (
+    BLOCKED,
+    FAILED,
+    SENT,
+    Broadcast,
+    claim_broadcasts,
+    fetch_pending_recipients,
+    finish_broadcast,
+    get_broadcast,
+    record_broadcast_results,
+    renew_broadcast_leases,
+)
+
+logger = logging.getLogger(__name__)
+
+_FETCH_BATCH = 500
+_FLUSH_EVERY = 50           # resultados por escritura a DB
+_FLUSH_SECONDS = 2.0
+_PROGRESS_SECONDS = 3.0     # frecuencia de edición del mensaje de progreso
+_MAX_TRANSIENT_RETRIES = 3
+_LEASE_SECONDS = 120.0      # una difusión sin renovar este tiempo la retoma otra instancia
+_SUPERVISE_SECONDS = 30.0   # renovación de leases / búsqueda de difusiones huérfanas
+_UNREACHABLE_NEEDLES = ("chat not found", "user is deactivated", "bot was blocked", "peer_id_invalid")
+
+
+class TokenBucket:
+    """Token bucket async (rate tokens/s, ráfaga `burst`) con pausa global para RetryAfter."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(0.1, float(rate))
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def retry_after_seconds(e: RetryAfter) -> float:
+    ra = e.retry_after
+    return float(ra.total_seconds() if hasattr(ra, "total_seconds") else ra)
+
+
+def progress_text(b: Broadcast, *, done: bool = False) -> str:
+    pct = (b.processed * 100 // b.total) if b.total else 100
+    head = "✅ *Reporte de difusión finalizada*" if done else f"📢 *Difusión en curso* ({pct}%)"
+    return (
+        f"{head}\n\n"
+        f"📬 Enviados: {b.sent}\n"
+        f"🚫 Bloqueados/inactivos: {b.blocked}\n"
+        f"❌ Errores técnicos: {b.failed}\n"
+        f"👥 Procesados: {b.processed}/{b.total}"
+    )
+
+
+class BroadcastEngine:
+    def __init__(self, *, rate_per_second: float, concurrency: int):
+        self.bucket = TokenBucket(rate_per_second, burst=max(1, int(rate_per_second)))
+        self.concurrency = max(1, int(concurrency))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._bot = None
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._leased: set[int] = set()   # difusiones que esta instancia está enviando
+        self._supervisor: asyncio.Task | None = None
+        self._sent = 0
+        self._retry_after_hits = 0
+
+    # --- envío de un destinatario ---
+
+    async def _send_one(self, b: Broadcast, tg_id: int) -> tuple[int, str, str | None]:
+        transient = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                await self._bot.copy_message(chat_id=tg_id, from_chat_id=b.from_chat_id, message_id=b.message_id)
+                self._sent += 1
+                return tg_id, SENT, None
+            except RetryAfter as e:
+                wait = retry_after_seconds(e)
+                self._retry_after_hits += 1
+                logger.warning("[broadcast #%s] RetryAfter %.0fs: pausa global", b.id, wait)
+                self.bucket.pause(wait)
+            except Forbidden as e:
+                return tg_id, BLOCKED, str(e)
+            except BadRequest as e:
+                if any(n in str(e).lower() for n in _UNREACHABLE_NEEDLES):
+                    return tg_id, BLOCKED, str(e)
+                return tg_id, FAILED, str(e)
+            except NetworkError as e:  # incluye TimedOut
+                transient += 1
+                if transient > _MAX_TRANSIENT_RETRIES:
+                    return tg_id, FAILED, str(e)
+                await asyncio.sleep(transient)
+            except Exception as e:
+                return tg_id, FAILED, str(e)
+
+    # --- difusión completa ---
+
+    async def _update_progress(self, broadcast_id: int, *, done: bool = False) -> None:
+        b = await get_broadcast(broadcast_id)
+        if b is None or b.progress_chat_id is None:
+            return
+        text = progress_text(b, done=done)
+        try:
+            if done:
+                from src.telegram_app.ui.admin_keyboards import admin_panel_keyboard
+
+                await self._bot.send_message(
+                    chat_id=b.progress_chat_id, text=text, parse_mode="Markdown",
+                    reply_markup=admin_panel_keyboard(),
+                )
+            elif b.progress_message_id is not None:
+                await self._bot.edit_message_text(
+                    chat_id=b.progress_chat_id, message_id=b.progress_message_id,
+                    text=text, parse_mode="Markdown",
+                )
+        except Exception as e:
+            logger.debug("[broadcast #%s] no pude actualizar progreso: %s", broadcast_id, e)
+
+    async def _run(self, b: Broadcast) -> None:
+        results: list[tuple[int, str, str | None]] = []
+        last_flush = last_progress = time.monotonic()
+        sem = asyncio.Semaphore(self.concurrency)
+        flush_lock = asyncio.Lock()
+
+        async def flush(force: bool = False) -> None:
+            nonlocal last_flush, results
+            async with flush_lock:
+                if not results or (not force and len(results) < _FLUSH_EVERY
+                                   and time.monotonic() - last_flush < _FLUSH_SECONDS):
+                    return
+                batch, results = results, []
+                last_flush = time.monotonic()
+                try:
+                    await record_broadcast_results(b.id, batch)
+                except BaseException as e:
+                    # El lote vuelve a la cola (también si nos cancelan a mitad de la
+                    # escritura): sin esto esos destinatarios seguirían PENDING en DB
+                    # y se les reenviaría al retomar. Reescribirlo es idempotente.
+                    results = batch + results
+                    if isinstance(e, Exception):
+                        logger.warning("[broadcast #%s] no pude guardar %d resultados: %s", b.id, len(batch), e)
+                    if force or not isinstance(e, Exception):
+                        raise
+
+        async def worker(tg_id: int) -> None:
+            nonlocal last_progress
+            async with sem:
+                res = await self._send_one(b, tg_id)
+            results.append(res)
+            await flush()
+            if time.monotonic() - last_progress >= _PROGRESS_SECONDS:
+                last_progress = time.monotonic()
+                await self._update_progress(b.id)
+
+        claimed = await claim_broadcasts(owner=self.owner, lease_seconds=_LEASE_SECONDS, broadcast_id=b.id)
+        if not claimed:
+            logger.info("[broadcast #%s] la envía otra instancia (lease vigente)", b.id)
+            return
+        b = claimed[0]
+        self._leased.add(b.id)
+        logger.info("[broadcast #%s] iniciando (%d destinatarios, %d ya procesados)", b.id, b.total, b.processed)
+        try:
+            try:
+                while True:
+                    pending = await fetch_pending_recipients(b.id, limit=_FETCH_BATCH)
+                    if not pending:
+                        break
+                    await asyncio.gather(*(worker(tg) for tg in pending))
+                    await flush(force=True)
+            finally:
+                # Cancelación (apagado): lo ya enviado queda registrado; el resto sigue PENDING
+                await asyncio.shield(flush(force=True))
+            final = await finish_broadcast(b.id)
+        finally:
+            self._leased.discard(b.id)
+        await self._update_progress(b.id, done=True)
+        logger.info("[broadcast #%s] finalizada: %s", b.id, final)
+
+    def launch(self, b: Broadcast) -> None:
+        """Arranca (o retoma) una difusión en background."""
+        if b.id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(b), name=f"broadcast:{b.id}")
+        self._tasks[b.id] = task
+        task.add_done_callback(lambda t, bid=b.id: self._on_done(bid, t))
+
+    def _on_done(self, broadcast_id: int, task: asyncio.Task) -> None:
+        self._tasks.pop(broadcast_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("[broadcast #%s] falló (se retoma al reiniciar): %s", broadcast_id, task.exception())
+
+    async def _renew_and_resume(self) -> None:
+        """Renueva los leases propios y retoma difusiones RUNNING sin dueño vivo."""
+        mine = sorted(self._leased)
+        kept = await renew_broadcast_leases(mine, owner=self.owner, lease_seconds=_LEASE_SECONDS)
+        for bid in mine:
+            task = self._tasks.get(bid)
+            if bid not in kept and bid in self._leased and task is not None:
+                # Otra instancia la tomó (lease vencido): dos emisores reenviarían
+                logger.warning("[broadcast #%s] perdí el lease: detengo el envío", bid)
+                task.cancel()
+        for b in await claim_broadcasts(owner=self.owner, lease_seconds=_LEASE_SECONDS):
+            if b.id not in self._tasks:
+                logger.info("[broadcast #%s] retomando (%d/%d)", b.id, b.processed, b.total)
+                self.launch(b)
+
+    async def _supervise(self) -> None:
+        while True:
+            await asyncio.sleep(_SUPERVISE_SECONDS)
+            try:
+                await self._renew_and_resume()
+            except Exception as e:
+                logger.warning("[broadcast] supervisor: %s", e)
+
+    async def start(self, bot) -> None:
+        """Guarda el bot, retoma difusiones RUNNING libres (best-effort) y arranca el supervisor."""
+        self._bot = bot
+        try:
+            await self._renew_and_resume()
+        except Exception as e:
+            logger.warning("[broadcast] no pude retomar difusiones pendientes: %s", e)
+        if self._supervisor is None or self._supervisor.done():
+            self._supervisor = asyncio.create_task(self._supervise(), name="broadcast_supervisor")
+
+    async def stop(self) -> None:
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._supervisor = None
+        tasks = list(self._tasks.values())
+        for t in tasks:
+            t.cancel()
+        for t in tasks:
+            try:
+                await t
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "owner": self.owner,
+            "running": sorted(self._tasks),
+            "rate_per_second": self.bucket.rate,
+            "concurrency": self.concurrency,
+            "sent": self._sent,
+            "retry_after_hits": self._retry_after_hits,
+        }
+
+
+# --- Motor compartido (process-wide) ---
+# Se arranca/detiene con el lifespan de FastAPI (src/main.py).
+
+broadcast_engine = BroadcastEngine(
+    rate_per_second=float(settings.BROADCAST_RATE_PER_SECOND),
+    concurrency=int(settings.BROADCAST_CONCURRENCY),
+)
+
+
+async def start_broadcast_engine(bot) -> None:
+    await broadcast_engine.start(bot)
+
+
+async def stop_broadcast_engine() -> None:
+    await broadcast_engine.stop()
@@ -0,0 +1,307 @@
+"""
+Persistencia de PTB en Postgres (reemplaza PicklePersistence).
+
+PicklePersistence re-serializaba TODO user_data / chat_data / conversaciones
+en cada flush, vivía en el disco efímero de Railway (se perdía en cada
+redeploy) y no se podía compartir entre instancias. Ahora:
+
+- una fila por usuario / chat en bot_state (src/db/repositories/bot_state_repo.py)
+- carga perezosa: get_user_data() arranca vacío y refresh_user_data() trae
+  la fila la primera vez que el usuario escribe (arranque O(1), no O(usuarios))
+- solo claves cambiadas: se compara cada valor serializado contra el último
+  escrito; un usuario que tocó `order` escribe solo `order`
+- escrituras por lotes: las llamadas update_* de cada ciclo de
+  Application.update_persistence (settings.PERSISTENCE_UPDATE_INTERVAL_SECONDS)
+  se agrupan en una sola transacción
+
+El costo del flush sigue a la actividad, no al total de usuarios.
+
+Memoria: hay un snapshot (valores ya serializados) por usuario / chat que
+PTB tiene cargado. No se desaloja por LRU a propósito: PTB conserva su
+propio user_data / chat_data de todo usuario visto hasta el reinicio, y un
+snapshot desalojado con el dict de PTB todavía vivo haría que el próximo
+update no borre claves eliminadas y que el refresh las reviva desde DB.
+El snapshot queda acotado por el estado que ya guarda PTB.
+
+Con varias instancias, cada una carga al usuario en su primer acceso: el
+estado sobrevive a redeploys y cambia de instancia, pero no es un caché
+coherente entre instancias que atienden al mismo usuario a la vez.
+
+Migración desde el pickle: scripts/migrate_pickle_persistence.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import logging
+import pickle
+import time
+from typing import Any
+
+from telegram.ext import BasePersistence, PersistenceInput, PicklePersistence
+
+from src.config.settings import settings
+from src.db.repositories.bot_state_repo import (
+    KIND_BOT,
+    KIND_CHAT,
+    KIND_USER,
+    StatePatch,
+    load_conversations,
+    load_state,
+    write_state_batch,
+)
+
+logger = logging.getLogger(__name__)
+
+_BOT_OWNER_ID = 0
+_PICKLED_KEY = "\x1fpk:"  # prefijo de claves no-str (jsonb solo admite claves str)
+
+
+# --- serialización por clave ---
+
+def encode_value(value: Any) -> str:
+    return base64.b64encode(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)).decode("ascii")
+
+
+def decode_value(raw: str) -> Any:
+    return pickle.loads(base64.b64decode(raw))
+
+
+def encode_key(key: Any) -> str:
+    return key if isinstance(key, str) else _PICKLED_KEY + encode_value(key)
+
+
+def decode_key(raw: str) -> Any:
+    return decode_value(raw[len(_PICKLED_KEY):]) if raw.startswith(_PICKLED_KEY) else raw
+
+
+def encode_conversation_key(key: tuple) -> str:
+    return json.dumps(list(key))
+
+
+def decode_conversation_key(raw: str) -> tuple:
+    return tuple(json.loads(raw))
+
+
+def decode_state(data: dict[str, str]) -> dict:
+    out = {}
+    for k, v in data.items():
+        try:
+            out[decode_key(k)] = decode_value(v)
+        except Exception as e:
+            logger.warning("[persistence] clave %r ilegible, se descarta: %s", k, e)
+    return out
+
+
+class PostgresPersistence(BasePersistence):
+    def __init__(self, *, update_interval: float = 60):
+        # callback_data no se usa (el bot no activa arbitrary_callback_data)
+        super().__init__(store_data=PersistenceInput(callback_data=False), update_interval=update_interval)
+        # último valor escrito/leído por fila; clave presente == ya cargada.
+        # Sin desalojo: vive tanto como el user_data / chat_data de PTB (ver docstring)
+        self._snapshots: dict[tuple[str, int], dict[str, str]] = {}
+        self._loading: dict[tuple[str, int], asyncio.Future] = {}
+        self._pending: dict[tuple[str, int], StatePatch] = {}
+        self._pending_conversations: dict[tuple[str, str], bytes | None] = {}
+        self._write_lock = asyncio.Lock()
+        self._loads = 0
+        self._batches = 0
+        self._rows_written = 0
+        self._keys_written = 0
+        self._last_batch_seconds = 0.0
+
+    # --- carga perezosa ---
+
+    async def _load(self, kind: str, owner_id: int) -> dict | None:
+        """Trae la fila una sola vez por proceso (llamadas concurrentes comparten la query)."""
+        key = (kind, owner_id)
+        if key in self._snapshots:
+            return None
+        fut = self._loading.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(load_state(kind, owner_id))
+            self._loading[key] = fut
+            try:
+                raw = await fut
+            except Exception as e:
+                logger.warning("[persistence] no pude cargar %s %s: %s", kind, owner_id, e)
+                return None
+            finally:
+                self._loading.pop(key, None)
+            self._loads += 1
+            self._snapshots[key] = dict(raw or {})
+            return decode_state(raw) if raw else None
+        # Otra llamada ya la está trayendo y llenará el mismo dict de PTB
+        try:
+            await asyncio.shield(fut)
+        except Exception:
+            pass
+        return None
+
+    async def _refresh(self, kind: str, owner_id: int, target: dict) -> None:
+        data = await self._load(kind, owner_id)
+        if data:
+            for k, v in data.items():
+                target.setdefault(k, v)
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return {}
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return await self._load(KIND_BOT, _BOT_OWNER_ID) or {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        out = {}
+        for raw_key, state in await load_conversations(name):
+            try:
+                out[decode_conversation_key(raw_key)] = pickle.loads(state)
+            except Exception as e:
+                logger.warning("[persistence] conversación %s %s ilegible: %s", name, raw_key, e)
+        return out
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        await self._refresh(KIND_USER, int(user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        await self._refresh(KIND_CHAT, int(chat_id), chat_data)
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        return None  # se carga completo en get_bot_data()
+
+    # --- escritura incremental ---
+
+    def _stage(self, kind: str, owner_id: int, data: dict) -> None:
+        key = (kind, owner_id)
+        # sin snapshot (no se pudo cargar) se escriben todas las claves, sin borrar ninguna
+        loaded = key in self._snapshots
+        snapshot = self._snapshots[key] if loaded else {}
+        encoded: dict[str, str] = {}
+        for k, v in data.items():
+            ek = encode_key(k)
+            try:
+                encoded[ek] = encode_value(v)
+            except Exception as e:
+                logger.warning("[persistence] %s %s: valor de %r no serializable: %s", kind, owner_id, k, e)
+                if ek in snapshot:
+                    encoded[ek] = snapshot[ek]
+
+        changed = {k: v for k, v in encoded.items() if snapshot.get(k) != v}
+        removed = snapshot.keys() - encoded.keys()
+        if loaded:
+            self._snapshots[key] = encoded
+        if not changed and not removed:
+            return
+
+        patch = self._pending.setdefault(key, StatePatch(kind, owner_id))
+        for k, v in changed.items():
+            patch.changed[k] = v
+            patch.removed.discard(k)
+        for k in removed:
+            patch.changed.pop(k, None)
+            patch.removed.add(k)
+
+    def _requeue(self, batch: dict[tuple[str, int], StatePatch], conversations: dict) -> None:
+        """Devuelve un lote fallido a la cola sin pisar cambios más nuevos."""
+        for key, old in batch.items():
+            new = self._pending.get(key)
+            if new is None:
+                self._pending[key] = old
+                continue
+            if new.drop:
+                continue
+            for k, v in old.changed.items():
+                if k not in new.changed and k not in new.removed:
+                    new.changed[k] = v
+            for k in old.removed:
+                if k not in new.changed:
+                    new.removed.add(k)
+            new.drop = new.drop or old.drop
+        for key, state in conversations.items():
+            self._pending_conversations.setdefault(key, state)
+
+    async def _write_pending(self) -> None:
+        async with self._write_lock:
+            # PTB lanza todos los update_* del ciclo con gather: un tick para
+            # que el resto encole su parte y salga en esta misma transacción
+            await asyncio.sleep(0)
+            batch, self._pending = self._pending, {}
+            conversations, self._pending_conversations = self._pending_conversations, {}
+            if not batch and not conversations:
+                return
+            t0 = time.perf_counter()
+            try:
+                await write_state_batch(
+                    list(batch.values()),
+                    [(name, ck, state) for (name, ck), state in conversations.items()],
+                )
+            except Exception:
+                self._requeue(batch, conversations)
+                raise
+            self._batches += 1
+            self._rows_written += len(batch) + len(conversations)
+            self._keys_written += sum(len(p.changed) + len(p.removed) for p in batch.values())
+            self._last_batch_seconds = time.perf_counter() - t0
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._stage(KIND_USER, int(user_id), data)
+        await self._write_pending()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._stage(KIND_CHAT, int(chat_id), data)
+        await self._write_pending()
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._stage(KIND_BOT, _BOT_OWNER_ID, data)
+        await self._write_pending()
+
+    async def update_callback_data(self, data) -> None:
+        return None
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        state = None if new_state is None else pickle.dumps(new_state, protocol=pickle.HIGHEST_PROTOCOL)
+        self._pending_conversations[(name, encode_conversation_key(key))] = state
+        await self._write_pending()
+
+    def _drop(self, kind: str, owner_id: int) -> None:
+        key = (kind, owner_id)
+        self._pending[key] = StatePatch(kind, owner_id, drop=True)
+        self._snapshots[key] = {}  # ya sabemos que está vacío
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._drop(KIND_USER, int(user_id))
+        await self._write_pending()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._drop(KIND_CHAT, int(chat_id))
+        await self._write_pending()
+
+    async def flush(self) -> None:
+        await self._write_pending()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "postgres",
+            "loaded": len(self._snapshots),
+            "loads": self._loads,
+            "pending": len(self._pending) + len(self._pending_conversations),
+            "batches": self._batches,
+            "rows_written": self._rows_written,
+            "keys_written": self._keys_written,
+            "last_batch_seconds": round(self._last_batch_seconds, 4),
+        }
+
+
+def build_persistence() -> BasePersistence:
+    """Backend según settings.PERSISTENCE_BACKEND ("postgres" | "pickle")."""
+    interval = float(settings.PERSISTENCE_UPDATE_INTERVAL_SECONDS)
+    if str(settings.PERSISTENCE_BACKEND).lower() == "pickle":
+        return PicklePersistence(filepath=settings.PERSISTENCE_PICKLE_PATH, update_interval=interval)
+    return PostgresPersistence(update_interval=interval)
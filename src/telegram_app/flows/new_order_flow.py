@@ -29,14 +29,11 @@ from src.db.repositories.orders_repo import (
     create_order_tx,
     update_order_status_tx,
 )
-from src.db.repositories.rates_repo import (
-    get_latest_active_rate_version,
-    get_route_rate,
-    get_country_price_for_version,
-)
+from src.db.repositories.rates_repo import get_route_rate
+from src.rates_snapshot import RatesSnapshot, get_rates_snapshot
 from src.db.repositories.users_repo import get_user_by_telegram_id
-from src.utils.google_drive import upload_image_to_drive
-import io
+from src.db.repositories.drive_outbox_repo import PROOF_ORIGEN, enqueue_drive_upload_tx
+from src.utils.drive_uploads import notify_drive_uploads
 from src.telegram_app.utils.templates import format_origin_group_message
 from src.telegram_app.handlers.panic import MENU_BUTTONS_REGEX, panic_handler
 from src.telegram_app.ui.labels import BTN_NEW_ORDER
@@ -44,8 +41,8 @@ from src.telegram_app.ui.routes_popular import (
     COUNTRY_FLAGS,
     COUNTRY_LABELS,
     DEST_ONLY_CODES,
-    format_rate_no_noise,
 )
+from src.rates_matrix import format_rate_no_noise
 from src.telegram_app.utils.text_escape import esc_html
 from src.db.repositories.beneficiary_repo import (
     list_active as list_saved_beneficiaries,
@@ -658,45 +655,25 @@ async def receive_benef(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 
 
 async def _compute_cash_rate_on_the_fly(
-    rate_version_id: int,
+    snap: RatesSnapshot,
     origin: str,
 ) -> "RouteRate | None":
     """
     Calcula la tasa VENEZUELA_CASH al vuelo cuando no está en route_rates todavía.
-    Usa los precios Binance ya almacenados en p2p_country_prices para esta versión.
+    Usa los precios Binance de esta versión (p2p_country_prices, vía snapshot).
     """
     try:
-        from src.db.repositories.rates_repo import RouteRate
-        cash_cfg = await dynamic_config.get_cash_delivery_config()
-        zelle_cost: Decimal = cash_cfg["zelle_usdt_cost"]
-        margin_zelle: Decimal = cash_cfg["margin_cash_zelle"]
-        margin_general: Decimal = cash_cfg["margin_cash_general"]
-
-        if origin == "USA":
-            buy_origin = zelle_cost
-            comm_pct = margin_zelle
-        else:
-            cp = await get_country_price_for_version(
-                rate_version_id=rate_version_id, country=origin
-            )
+        from src.rates_matrix import CashDeliveryParams, compute_cash_route
+        cash = CashDeliveryParams.from_config(await dynamic_config.get_cash_delivery_config())
+
+        buy_origin = None
+        if origin != "USA":
+            cp = snap.country_price(origin)
             if not cp:
                 return None
             buy_origin = cp.buy_price
-            comm_pct = margin_general
-
-        sell_dest = Decimal("1")  # 1 USD efectivo
-        rate_base = sell_dest / buy_origin
-        rate_client = rate_base * (Decimal("1") - comm_pct)
-
-        return RouteRate(
-            origin_country=origin,
-            dest_country="VENEZUELA_CASH",
-            commission_pct=comm_pct,
-            buy_origin=buy_origin,
-            sell_dest=sell_dest,
-            rate_base=rate_base,
-            rate_client=rate_client,
-        )
+
+        return compute_cash_route(origin, buy_origin, cash)
     except Exception as e:
         logger.warning("_compute_cash_rate_on_the_fly failed origin=%s: %s", origin, e)
         return None
@@ -720,10 +697,13 @@ async def receive_proof(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 
     # Acepta comprobante como FOTO o como DOCUMENTO (imagen/archivo)
     file_id = None
+    file_unique_id = None
     if update.message and update.message.photo:
         file_id = update.message.photo[-1].file_id
+        file_unique_id = update.message.photo[-1].file_unique_id
     elif update.message and update.message.document:
         file_id = update.message.document.file_id
+        file_unique_id = update.message.document.file_unique_id
 
     if not file_id:
         await _screen_send_or_edit(
@@ -734,15 +714,16 @@ async def receive_proof(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         )
         return ASK_PROOF
     context.user_data["order"]["proof_file_id"] = file_id
+    context.user_data["order"]["proof_file_unique_id"] = file_unique_id
     await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
 
     try:
-        rv = await asyncio.wait_for(get_latest_active_rate_version(), timeout=5.0)
+        snap = await asyncio.wait_for(get_rates_snapshot(), timeout=5.0)
     except asyncio.TimeoutError:
         await _screen_send_or_edit(update, context, "⏳ Error de conexión. Reintenta en un momento.")
         return ASK_PROOF
 
-    if not rv:
+    if not snap:
         await _screen_send_or_edit(update, context, "No tengo tasas activas ahora mismo. Intenta de nuevo en unos minutos.")
         _reset_flow_memory(context)
         return ConversationHandler.END
@@ -750,12 +731,13 @@ async def receive_proof(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     origin = context.user_data["order"]["origin"]
     dest = context.user_data["order"]["dest"]
 
-    rr = await get_route_rate(rate_version_id=rv.id, origin_country=origin, dest_country=dest)
+    rv = snap.version
+    rr = snap.route(origin, dest)
     if not rr:
         # Si la ruta no está en DB (ej: primera vez con VENEZUELA_CASH antes de regenerar tasas),
         # intentamos calcularla al vuelo desde los precios disponibles.
         if dest == "VENEZUELA_CASH":
-            rr = await _compute_cash_rate_on_the_fly(rv.id, origin)
+            rr = await _compute_cash_rate_on_the_fly(snap, origin)
         if not rr:
             await _screen_send_or_edit(update, context, "Esa ruta no está disponible ahora mismo. Intenta otra ruta.")
             _reset_flow_memory(context)
@@ -779,7 +761,12 @@ async def _show_confirm_screen(update: Update, context: ContextTypes.DEFAULT_TYP
     origin = order_data.get("origin")
     dest = order_data.get("dest")
 
-    rr = await get_route_rate(rate_version_id=rv_id, origin_country=origin, dest_country=dest)
+    # La orden guarda su versión: si sigue siendo la activa se sirve del snapshot
+    snap = await get_rates_snapshot()
+    if snap is not None and snap.version_id == rv_id:
+        rr = snap.route(origin, dest)
+    else:
+        rr = await get_route_rate(rate_version_id=rv_id, origin_country=origin, dest_country=dest)
     if not rr:
         await _screen_send_or_edit(update, context, "No pude reconstruir la ruta ahora mismo. Intenta de nuevo.")
         _reset_flow_memory(context)
@@ -985,6 +972,16 @@ async def receive_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 # 2. Cambiar estado inmediatamente (Atómico)
                 await update_order_status_tx(conn, int(order.public_id), "ORIGEN_VERIFICANDO")
 
+                # 3. Comprobante al outbox del Vault (se sube en background)
+                if file_id:
+                    await enqueue_drive_upload_tx(
+                        conn,
+                        order_public_id=int(order.public_id),
+                        proof_type=PROOF_ORIGEN,
+                        telegram_file_id=file_id,
+                        telegram_unique_id=order_data.get("proof_file_unique_id"),
+                    )
+
     except Exception as e:
         logger.exception(f"Error critico al crear orden para user {user.id}")
         await update.message.reply_text("❌ Error al registrar la orden. Por favor intenta de nuevo.")
@@ -999,21 +996,9 @@ async def receive_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         context=context,
     )
 
-    # Subir comprobante a Google Drive (Vault Fase 3)
+    # Subir comprobante a Google Drive (Vault Fase 3): lo toma el worker del outbox
     if file_id:
-        try:
-            tg_file = await context.bot.get_file(file_id)
-            file_bytes = await tg_file.download_as_bytearray()
-            stream = io.BytesIO(file_bytes)
-            drive_file_id = upload_image_to_drive(
-                stream, 
-                folder_name="Origen", 
-                file_name=f"ORIGEN_ORDEN_{order.public_id}.jpg"
-            )
-            if drive_file_id:
-                logger.info("Comprobante subido al Vault (Origen). Order_ID: %s, Drive_ID: %s", order.public_id, drive_file_id)
-        except Exception as e:
-            logger.error("Error subiendo comprobante Origen de orden %s al Vault: %s", order.public_id, e)
+        notify_drive_uploads()
 
     try:
         if not auto_approved:
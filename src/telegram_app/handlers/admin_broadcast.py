@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import asyncio
 import logging
 import time
 
@@ -17,12 +16,18 @@ from telegram.ext import (
 )
 
 from src.config.settings import settings
-from src.db.connection import get_async_conn
+from src.db.repositories.broadcast_repo import (
+    count_broadcast_recipients,
+    create_broadcast,
+    has_running_broadcast,
+)
+from src.telegram_app.broadcast_engine import broadcast_engine
 from src.telegram_app.handlers.panic import MENU_BUTTONS_REGEX, panic_handler
 from src.telegram_app.ui.admin_keyboards import (
     BTN_ADMIN_BROADCAST,
     admin_panel_keyboard,
 )
+from src.utils.bounded_state import TTLMap
 
 logger = logging.getLogger(__name__)
 
@@ -36,20 +41,18 @@ BTN_CANCEL = "❌ Cancelar"
 # ── Idempotency lock ──────────────────────────────────────────────────────────
 # Evita que el administrador lance dos difusiones simultáneas (re-entry).
 # Clave: admin telegram_id → timestamp UNIX del inicio de la difusión activa.
-_BROADCAST_LOCK: dict[int, float] = {}
 _BROADCAST_LOCK_TTL = 300  # 5 minutos máximo por difusión
+_BROADCAST_LOCK = TTLMap(_BROADCAST_LOCK_TTL, name="broadcast_locks")
 
-# Bloqueo por ID de mensaje de confirmación
-_PROCESSED_BROADCAST_MSGS: set[int] = set()
+# Bloqueo por ID de mensaje de confirmación (doble clic): basta con recordar un día
+_PROCESSED_BROADCAST_MSGS = TTLMap(86400, max_size=1000, name="broadcast_confirm_msgs")
 
 
 def _lock_broadcast(admin_id: int) -> bool:
     """Intenta adquirir el lock. Retorna True si tiene éxito (no hay difusión activa)."""
-    now = time.time()
-    existing = _BROADCAST_LOCK.get(admin_id)
-    if existing and (now - existing) < _BROADCAST_LOCK_TTL:
+    if admin_id in _BROADCAST_LOCK:
         return False  # Lock activo
-    _BROADCAST_LOCK[admin_id] = now
+    _BROADCAST_LOCK[admin_id] = time.time()
     return True
 
 
@@ -66,7 +69,7 @@ async def start_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return ConversationHandler.END
 
     admin_id = int(update.effective_user.id)
-    if not _lock_broadcast(admin_id):
+    if await has_running_broadcast(admin_id) or not _lock_broadcast(admin_id):
         await update.message.reply_text(
             "⚠️ Ya hay una difusión en curso. "
             "Espera a que finalice antes de iniciar otra."
@@ -108,12 +111,8 @@ async def on_broadcast_content(update: Update, context: ContextTypes.DEFAULT_TYP
         message_id=update.message.message_id
     )
 
-    # Contar operadores
-    async with get_async_conn() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT COUNT(*) FROM users WHERE is_active = true;")
-            rows = await cur.fetchall()
-            count = rows[0][0] if rows else 0
+    # Contar operadores (activos y sin bloquear el bot)
+    count = await count_broadcast_recipients()
 
     context.user_data["broadcast_count"] = count
 
@@ -142,7 +141,7 @@ async def on_broadcast_confirm(update: Update, context: ContextTypes.DEFAULT_TYP
     if query.message.message_id in _PROCESSED_BROADCAST_MSGS:
         logger.warning("[Broadcast] Ignorando doble clic en botón inline ID: %s", query.message.message_id)
         return ConversationHandler.END
-    _PROCESSED_BROADCAST_MSGS.add(query.message.message_id)
+    _PROCESSED_BROADCAST_MSGS[query.message.message_id] = True
 
     if action == "bc_cancel":
         _release_broadcast_lock(admin_id)
@@ -153,66 +152,33 @@ async def on_broadcast_confirm(update: Update, context: ContextTypes.DEFAULT_TYP
     if action != "bc_confirm":
         return BROADCAST_CONFIRM
 
-    # Idempotency Lock
-    if context.user_data.get("is_broadcasting"):
-        logger.warning("[Broadcast] Ignorando doble sesión de difusión activa.")
-        return ConversationHandler.END
-    context.user_data["is_broadcasting"] = True
-
     from_chat_id = context.user_data.get("broadcast_from_chat_id")
     message_id = context.user_data.get("broadcast_message_id")
 
-    await query.edit_message_text("🚀 Iniciando difusión... esto puede tardar unos minutos. Por favor no envíes más comandos.")
-
-    async with get_async_conn() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT telegram_user_id FROM users WHERE is_active = true;")
-            rows = await cur.fetchall()
-
-    # Deduplicar IDs — evita enviar dos veces si hay duplicados en DB
-    seen_ids: set[int] = set()
-    success_count = 0
-    fail_count = 0
-    blocked_count = 0
-
-    for row in rows:
-        tg_id = row[0]
-        if not tg_id:
-            continue
-        tg_id_int = int(tg_id)
-        if tg_id_int in seen_ids:
-            logger.warning("[Broadcast] ID duplicado en DB omitido: %s", tg_id_int)
-            continue
-        seen_ids.add(tg_id_int)
-
-        try:
-            await context.bot.copy_message(
-                chat_id=tg_id_int,
-                from_chat_id=from_chat_id,
-                message_id=message_id
-            )
-            success_count += 1
-            await asyncio.sleep(0.05)  # Telegram: 20 req/sec máximo
-        except Exception as e:
-            err_str = str(e).lower()
-            if "blocked" in err_str or "deactivated" in err_str or "forbidden" in err_str:
-                blocked_count += 1
-                logger.info("[Broadcast] Operador bloqueó el bot: %s", tg_id_int)
-            else:
-                logger.warning("[Broadcast] No pude enviar a %s: %s", tg_id_int, e)
-                fail_count += 1
-
-    report = (
-        f"✅ **Reporte de difusión finalizada**\n\n"
-        f"📬 Enviados: {success_count}\n"
-        f"🚫 Bloqueados/inactivos: {blocked_count}\n"
-        f"❌ Errores técnicos: {fail_count}\n"
-        f"👥 Total IDs únicos procesados: {len(seen_ids)}"
+    # La difusión corre en background (broadcast_engine): persistida en DB,
+    # con rate limit global y progreso en vivo en este mensaje.
+    try:
+        broadcast = await create_broadcast(
+            admin_telegram_id=int(admin_id or query.from_user.id),
+            from_chat_id=int(from_chat_id),
+            message_id=int(message_id),
+            progress_chat_id=int(query.message.chat_id),
+            progress_message_id=int(query.message.message_id),
+        )
+    except Exception:
+        logger.exception("[Broadcast] No pude crear la difusión")
+        _release_broadcast_lock(admin_id)
+        await query.edit_message_text("❌ No pude iniciar la difusión. Intenta de nuevo.")
+        return ConversationHandler.END
+
+    await query.edit_message_text(
+        f"🚀 Difusión #{broadcast.id} iniciada para {broadcast.total} operadores.\n"
+        "Este mensaje se actualizará con el progreso; puedes seguir usando el bot."
     )
-    await query.message.reply_text(report, reply_markup=admin_panel_keyboard(), parse_mode="Markdown")
+    broadcast_engine.launch(broadcast)
 
-    # Limpiar estado
-    for k in ["broadcast_from_chat_id", "broadcast_message_id", "broadcast_count", "broadcast_admin_id", "is_broadcasting"]:
+    # Limpiar estado (el lock de composición se libera; la difusión en curso se controla en DB)
+    for k in ["broadcast_from_chat_id", "broadcast_message_id", "broadcast_count", "broadcast_admin_id"]:
         context.user_data.pop(k, None)
     _release_broadcast_lock(admin_id)
 
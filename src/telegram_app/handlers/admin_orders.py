@@ -13,7 +13,7 @@ from src.config.dynamic_settings import dynamic_config
 from src.db.connection import get_async_conn
 from src.db.repositories import rates_repo
 from src.db.repositories.orders_repo import (
-    cancel_order,
+    cancel_order_tx,
     clear_awaiting_paid_proof_tx,
     get_order_by_public_id,
     list_orders_awaiting_paid_proof_by,
@@ -21,18 +21,19 @@ from src.db.repositories.orders_repo import (
     mark_order_paid_tx,
     mark_origin_verified_tx,
     set_awaiting_paid_proof,
-    update_order_status,
+    update_order_status_tx,
 )
 from src.db.repositories.origin_wallet_repo import add_origin_receipt_daily
-from src.db.repositories.users_repo import get_telegram_id_by_user_id
 from src.db.repositories.wallet_repo import add_ledger_entry_tx
 from src.telegram_app.utils.templates import format_payments_group_message
-from src.integrations.binance_p2p import BinanceP2PClient
+from src.integrations.binance_p2p import get_binance_client
 from src.db.repositories.trust_repo import update_trust_score, DELTA_ORDER_COMPLETED, DELTA_ORDER_CANCELLED
 from src.integrations.p2p_config import COUNTRIES
-from src.telegram_app.ui.routes_popular import format_rate_no_noise
-from src.utils.google_drive import upload_image_to_drive
-import io
+from src.rates_matrix import format_rate_no_noise
+from src.db.repositories.drive_outbox_repo import PROOF_PAGO, enqueue_drive_upload_tx
+from src.utils.drive_uploads import notify_drive_uploads
+from src.db.repositories.notification_outbox_repo import enqueue_notification_tx
+from src.telegram_app.notification_dispatcher import notify_notifications
 
 logger = logging.getLogger(__name__)
 
@@ -85,9 +86,10 @@ async def _fetch_realtime_prices(origin_country: str, dest_country: str):
         return None, None
 
     from src.integrations.price_override import get_buy_price, get_sell_price
+    client = get_binance_client()
     try:
-        buy_price = await get_buy_price(origin_country, origin_cfg.buy_methods[0])
-        sell_price = await get_sell_price(dest_country, dest_cfg.sell_methods[0])
+        buy_price = await get_buy_price(origin_country, origin_cfg.buy_methods[0], client=client)
+        sell_price = await get_sell_price(dest_country, dest_cfg.sell_methods[0], client=client)
         return buy_price, sell_price
     except Exception as e:
         logger.warning(f"No pude obtener precios real-time: {e}")
@@ -218,6 +220,12 @@ async def handle_admin_order_action(update: Update, context: ContextTypes.DEFAUL
                 day_vet = datetime.now(tz=timezone.utc).astimezone(VET).date()
                 fiat_currency = ORIGIN_FIAT_CURRENCY.get(str(order.origin_country), str(order.origin_country))
 
+                try:
+                    summary = format_payments_group_message(order)
+                except Exception:
+                    summary = None
+                    logger.exception("orig_ok: no pude armar el resumen para PAYMENTS de la orden %s", public_id)
+
                 async with get_async_conn() as conn:
                     async with conn.transaction():
                         # 1. Confirmar orden (Atómico)
@@ -256,6 +264,26 @@ async def handle_admin_order_action(update: Update, context: ContextTypes.DEFAUL
                                 ref_order_public_id=int(public_id),
                             )
 
+                        # 3. Notificaciones (outbox): salen solo si la orden se confirma
+                        await enqueue_notification_tx(
+                            conn,
+                            operator_of_order=int(public_id),
+                            text=f"✅ Origen confirmado para orden #{public_id}",
+                            dedupe_key=f"order:{public_id}:orig_ok:operator",
+                        )
+                        if summary and settings.PAYMENTS_TELEGRAM_CHAT_ID:
+                            await enqueue_notification_tx(
+                                conn,
+                                chat_id=int(settings.PAYMENTS_TELEGRAM_CHAT_ID),
+                                text=summary,
+                                parse_mode="HTML",
+                                reply_markup=_order_actions_kb(public_id).to_dict(),
+                                disable_web_page_preview=True,
+                                dedupe_key=f"order:{public_id}:orig_ok:payments",
+                            )
+
+                notify_notifications()
+
                 # Si llegamos aquí, la transacción fue exitosa
                 try:
                     await q.edit_message_text(
@@ -267,17 +295,6 @@ async def handle_admin_order_action(update: Update, context: ContextTypes.DEFAUL
                 except Exception:
                     pass
 
-                # Notificación al operador
-                op_tid = await get_telegram_id_by_user_id(int(order.operator_user_id))
-                if op_tid:
-                    try:
-                        await context.bot.send_message(
-                            chat_id=int(op_tid),
-                            text=f"✅ Origen confirmado para orden #{public_id}",
-                        )
-                    except Exception:
-                        pass
-
             except Exception as e:
                 logger.exception("orig_ok: fallo atómico en orden %s: %s", public_id, e)
                 try:
@@ -286,20 +303,6 @@ async def handle_admin_order_action(update: Update, context: ContextTypes.DEFAUL
                     pass
                 return
 
-            try:
-                target_chat_id = int(settings.PAYMENTS_TELEGRAM_CHAT_ID)
-                summary = format_payments_group_message(order)
-
-                await context.bot.send_message(
-                    chat_id=target_chat_id,
-                    text=summary,
-                    parse_mode="HTML",
-                    reply_markup=_order_actions_kb(public_id),
-                    disable_web_page_preview=True,
-                )
-            except Exception:
-                logger.exception("orig_ok: fallo notificando a PAYMENTS para orden %s", public_id)
-
             return
 
         if action == "orig_rej":
@@ -321,7 +324,18 @@ async def handle_admin_order_action(update: Update, context: ContextTypes.DEFAUL
             return
 
         if action == "orig_rej_confirm":
-            ok = await cancel_order(public_id, "ORIGEN RECHAZADO")
+            async with get_async_conn() as conn:
+                async with conn.transaction():
+                    ok = await cancel_order_tx(conn, public_id, "ORIGEN RECHAZADO")
+                    if ok:
+                        await enqueue_notification_tx(
+                            conn,
+                            operator_of_order=int(public_id),
+                            text=f"❌ Tu orden #{public_id} fue cancelada por ORIGEN RECHAZADO.",
+                            dedupe_key=f"order:{public_id}:cancel:operator",
+                        )
+            if ok:
+                notify_notifications()
             try:
                 await q.answer("❌ Origen rechazado" if ok else "⚠️ No pude cancelar", show_alert=not ok)
                 if ok:
@@ -330,16 +344,6 @@ async def handle_admin_order_action(update: Update, context: ContextTypes.DEFAUL
                         reply_markup=None,
                         parse_mode="HTML"
                     )
-                    # Notificar operador
-                    op_tid = await get_telegram_id_by_user_id(int(order.operator_user_id))
-                    if op_tid:
-                        try:
-                            await context.bot.send_message(
-                                chat_id=int(op_tid),
-                                text=f"❌ Tu orden #{public_id} fue cancelada por ORIGEN RECHAZADO.",
-                            )
-                        except Exception:
-                            pass
             except Exception:
                 pass
             return
@@ -361,7 +365,18 @@ async def handle_admin_order_action(update: Update, context: ContextTypes.DEFAUL
             return
 
     if action == "proc":
-        ok = await update_order_status(public_id, "EN_PROCESO")
+        async with get_async_conn() as conn:
+            async with conn.transaction():
+                ok = await update_order_status_tx(conn, public_id, "EN_PROCESO")
+                if ok:
+                    await enqueue_notification_tx(
+                        conn,
+                        operator_of_order=int(public_id),
+                        text=f"⏳ Tu orden #{public_id} esta siendo procesada...",
+                        dedupe_key=f"order:{public_id}:proc:operator",
+                    )
+        if ok:
+            notify_notifications()
         try:
             await q.answer("✅ Marcada en Proceso")
             if ok:
@@ -369,19 +384,6 @@ async def handle_admin_order_action(update: Update, context: ContextTypes.DEFAUL
                 await q.edit_message_text(new_text, reply_markup=_order_actions_kb(public_id))
         except Exception:
             pass
-
-        if ok:
-            order = await get_order_by_public_id(public_id)
-            if order:
-                op_tid = await get_telegram_id_by_user_id(int(order.operator_user_id))
-                if op_tid:
-                    try:
-                        await context.bot.send_message(
-                            chat_id=int(op_tid),
-                            text=f"⏳ Tu orden #{public_id} esta siendo procesada...",
-                        )
-                    except Exception:
-                        pass
         return
 
     if action == "paid":
@@ -469,6 +471,7 @@ async def process_paid_proof_photo(update: Update, context: ContextTypes.DEFAULT
         return
 
     proof_file_id = update.message.photo[-1].file_id
+    proof_file_unique_id = update.message.photo[-1].file_unique_id
 
     try:
         order = await get_order_by_public_id(public_id)
@@ -480,21 +483,6 @@ async def process_paid_proof_photo(update: Update, context: ContextTypes.DEFAULT
             await update.message.reply_text("ℹ️ Esta orden ya fue gestionada previamente por otro administrador o su estado cambió.")
             return
 
-        # Subida asíncrona a Drive (Vault Fase 3)
-        try:
-            tg_file = await context.bot.get_file(proof_file_id)
-            file_bytes = await tg_file.download_as_bytearray()
-            stream = io.BytesIO(file_bytes)
-            drive_file_id = upload_image_to_drive(
-                stream, 
-                folder_name="Pagos", 
-                file_name=f"PAGO_ORDEN_{order.public_id}.jpg"
-            )
-            if drive_file_id:
-                logger.info("Comprobante subido al Vault (Pagos). Order_ID: %s, Drive_ID: %s", order.public_id, drive_file_id)
-        except Exception as e:
-            logger.error("Error subiendo comprobante Pagos de orden %s al Vault: %s", order.public_id, e)
-
         # 1. Profit TEORICO
         rr = await rates_repo.get_route_rate(
             rate_version_id=int(order.rate_version_id),
@@ -599,6 +587,15 @@ async def process_paid_proof_photo(update: Update, context: ContextTypes.DEFAULT
                 if not ok_paid:
                     raise RuntimeError("No pude marcar la orden como COMPLETADA (tx)")
 
+                # Comprobante al outbox del Vault (Fase 3): se sube en background
+                await enqueue_drive_upload_tx(
+                    conn,
+                    order_public_id=int(public_id),
+                    proof_type=PROOF_PAGO,
+                    telegram_file_id=proof_file_id,
+                    telegram_unique_id=proof_file_unique_id,
+                )
+
                 # Guardar datos de ejecucion real
                 async with conn.cursor() as cur:
                     await cur.execute(
@@ -671,6 +668,24 @@ async def process_paid_proof_photo(update: Update, context: ContextTypes.DEFAULT
 
                 await clear_awaiting_paid_proof_tx(conn, int(public_id))
 
+                # Notificación al operador (outbox): mensaje + comprobante, en ese orden
+                await enqueue_notification_tx(
+                    conn,
+                    operator_of_order=int(public_id),
+                    text=f"💰 Pago confirmado para orden #{public_id}\n¡Gracias! 🎉",
+                    dedupe_key=f"order:{public_id}:paid:operator",
+                )
+                await enqueue_notification_tx(
+                    conn,
+                    operator_of_order=int(public_id),
+                    text=f"Comprobante Orden #{public_id}",
+                    photo_file_id=proof_file_id,
+                    dedupe_key=f"order:{public_id}:paid:operator_proof",
+                )
+
+        notify_drive_uploads()
+        notify_notifications()
+
         # Limpiar context
         if context.user_data.get("active_paid_order_id") == public_id:
             context.user_data.pop("active_paid_order_id", None)
@@ -730,22 +745,6 @@ async def process_paid_proof_photo(update: Update, context: ContextTypes.DEFAULT
         await update.message.reply_text("❌ Error interno cerrando la orden. Reintenta subiendo la foto nuevamente.")
         return
 
-    # Notificacion operador (MEJORA 3)
-    op_tid = await get_telegram_id_by_user_id(int(order.operator_user_id))
-    if op_tid:
-        try:
-            await context.bot.send_message(
-                chat_id=int(op_tid),
-                text=f"💰 Pago confirmado para orden #{public_id}\n¡Gracias! 🎉",
-            )
-            await context.bot.send_photo(
-                chat_id=int(op_tid),
-                photo=proof_file_id,
-                caption=f"Comprobante Orden #{public_id}",
-            )
-        except Exception:
-            pass
-
 
 async def handle_cancel_reason_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not _is_authorized(update):
@@ -760,25 +759,23 @@ async def handle_cancel_reason_text(update: Update, context: ContextTypes.DEFAUL
         await update.message.reply_text("Motivo muy corto.")
         return
 
-    ok = await cancel_order(int(public_id), reason)
+    async with get_async_conn() as conn:
+        async with conn.transaction():
+            ok = await cancel_order_tx(conn, int(public_id), reason)
+            if ok:
+                await enqueue_notification_tx(
+                    conn,
+                    operator_of_order=int(public_id),
+                    text=(
+                        f"❌ Orden #{public_id} CANCELADA\n"
+                        f"Motivo: {reason}"
+                    ),
+                    dedupe_key=f"order:{public_id}:cancel:operator",
+                )
     context.user_data.pop("awaiting_cancel_reason_for", None)
 
     if ok:
+        notify_notifications()
         await update.message.reply_text(f"❌ Orden #{public_id} cancelada.\nMotivo: {reason}")
-
-        try:
-            order = await get_order_by_public_id(int(public_id))
-            if order:
-                op_tid = await get_telegram_id_by_user_id(int(order.operator_user_id))
-                if op_tid:
-                    await context.bot.send_message(
-                        chat_id=int(op_tid),
-                        text=(
-                            f"❌ Orden #{public_id} CANCELADA\n"
-                            f"Motivo: {reason}"
-                        ),
-                    )
-        except Exception:
-            logger.exception("cancel_order: no pude notificar al operador para orden %s", public_id)
     else:
         await update.message.reply_text("Error al cancelar.")
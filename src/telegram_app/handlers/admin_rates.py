@@ -26,6 +26,7 @@ async def rates_now(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         res = await generate_rates_full(
             kind="auto_9am",
             reason="Admin forced baseline",
+            skip_if_unchanged=False,
         )
 
         msg = (
@@ -41,6 +42,11 @@ async def rates_now(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         if res.countries_failed:
             await update.message.reply_text(f"⚠️ Países sin datos: {', '.join(res.countries_failed)}")
 
+        if res.countries_circuit_open:
+            await update.message.reply_text(
+                f"🔌 Binance en fail-fast (circuito abierto): {', '.join(res.countries_circuit_open)}"
+            )
+
     except Exception as e:
         logger.exception("Error en rates_now: %s", e)
         await update.message.reply_text("No pude obtener las tasas actuales, intenta de nuevo en unos segundos.")
@@ -21,6 +21,7 @@ from src.telegram_app.ui.labels import (
     BTN_HELP,
     BTN_ADMIN,
 )
+from src.utils.bounded_state import append_capped
 
 # Botones del menú principal (si el usuario presiona cualquiera, consideramos que "salió" del módulo)
 MENU_BUTTONS = {
@@ -36,6 +37,10 @@ MENU_BUTTONS = {
 
 BTN_BACK = "⬅️ Volver"
 
+# Tope de mensajes trackeados por usuario (user_data se persiste: sin tope crecía
+# en cada pantalla que no pasaba por cleanup_bot_messages)
+MAX_TRACKED_MESSAGES = 50
+
 
 async def _best_effort_delete(update: Update, context: ContextTypes.DEFAULT_TYPE, message_id: int) -> None:
     try:
@@ -51,9 +56,8 @@ async def track_message(message, context: ContextTypes.DEFAULT_TYPE):
     if "bot_messages" not in context.user_data:
         context.user_data["bot_messages"] = []
 
-    # Evitar duplicados
-    if message.message_id not in context.user_data["bot_messages"]:
-        context.user_data["bot_messages"].append(message.message_id)
+    # Evitar duplicados; se descartan los más viejos por encima del tope
+    append_capped(context.user_data["bot_messages"], message.message_id, MAX_TRACKED_MESSAGES)
 
 
 async def cleanup_bot_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
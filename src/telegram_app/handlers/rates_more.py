@@ -6,32 +6,15 @@ Con manejo robusto de errores en todos los callbacks.
 from __future__ import annotations
 
 import logging
-from typing import List, Tuple
 
 from telegram import Update
 from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
-from src.db.repositories.rates_repo import (
-    get_latest_active_rate_version,
-    list_all_route_pairs_for_version,
-    list_route_rates_by_origin,
-    list_route_rates_for_version,
-)
-from src.telegram_app.ui.rates_buttons import (
-    rates_country_result_buttons,
-    rates_country_select_buttons,
-    rates_main_buttons,
-    rates_pagination_buttons,
-)
-from src.telegram_app.ui.routes_popular import (
-    POPULAR_ROUTES,
-    format_rate_no_noise,
-    route_label,
-)
+from src.telegram_app.ui.rates_buttons import rates_country_select_buttons
+from src.telegram_app.ui.rates_screens import get_rates_screens
 
 logger = logging.getLogger(__name__)
-PAGE_SIZE = 9
 AVAILABLE_COUNTRIES = ["USA", "VENEZUELA", "CHILE", "PERU", "COLOMBIA", "MEXICO", "ARGENTINA"]
 
 
@@ -50,14 +33,6 @@ def _parse_origin(data: str) -> str:
         return ""
 
 
-def _sort_routes_dest_first(routes: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
-    def key_fn(r: Tuple[str, str]):
-        origin, dest = r
-        venezuela_first = 0 if dest == "VENEZUELA" else 1
-        return (venezuela_first, dest, origin)
-    return sorted(routes, key=key_fn)
-
-
 async def _safe_edit(q, text: str, reply_markup=None):
     """Edita mensaje con protección contra 'message is not modified'"""
     try:
@@ -97,23 +72,12 @@ async def handle_rates_more(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         # 2. VOLVER A TASAS INICIALES
         if data == "rates_more:back":
-            rv = await get_latest_active_rate_version()
-            if not rv:
+            screens = await get_rates_screens()
+            if not screens:
                 await _safe_edit(q, "Aún no hay tasas.")
                 return
 
-            rates = await list_route_rates_for_version(rate_version_id=rv.id, routes=POPULAR_ROUTES)
-            rate_map = {(r.origin_country, r.dest_country): r for r in rates}
-
-            blocks = []
-            for (o, d) in POPULAR_ROUTES:
-                rr = rate_map.get((o, d))
-                if not rr:
-                    continue
-                blocks.append(f"{route_label(o, d)}\nTasa: {format_rate_no_noise(rr.rate_client)}")
-
-            text = "📈 *Tasas de hoy* (Rutas populares)\n\n" + "\n\n".join(blocks)
-            await _safe_edit(q, text, rates_main_buttons())
+            await _safe_edit(q, screens.popular.text, screens.popular.reply_markup)
             return
 
         # 3. SELECCIONAR PAÍS
@@ -124,13 +88,13 @@ async def handle_rates_more(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # 4. MOSTRAR TASAS POR PAÍS
         if data.startswith("rates_more:origin="):
             origin = _parse_origin(data)
-            rv = await get_latest_active_rate_version()
-            if not rv:
+            screens = await get_rates_screens()
+            if not screens:
                 await _safe_edit(q, "No hay tasas activas.")
                 return
 
-            rates = await list_route_rates_by_origin(rate_version_id=rv.id, origin_country=origin)
-            if not rates:
+            screen = screens.origin(origin)
+            if not screen:
                 await _safe_edit(
                     q,
                     f"❌ No encontré tasas para *{origin}*.\n\nIntenta con otro país.",
@@ -138,46 +102,19 @@ async def handle_rates_more(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 )
                 return
 
-            blocks = []
-            for rr in rates:
-                blocks.append(f"{route_label(rr.origin_country, rr.dest_country)}\nTasa: {format_rate_no_noise(rr.rate_client)}")
-
-            text = f"🌎 *Tasas desde {origin}*\n\n" + "\n\n".join(blocks)
-            await _safe_edit(q, text, rates_country_result_buttons())
+            await _safe_edit(q, screen.text, screen.reply_markup)
             return
 
         # 5. PAGINACIÓN
         if data.startswith("rates_more:page="):
             page = _parse_page(data)
-            rv = await get_latest_active_rate_version()
-            if not rv:
+            screens = await get_rates_screens()
+            if not screens:
                 await _safe_edit(q, "Aún no hay tasas.")
                 return
 
-            all_pairs = await list_all_route_pairs_for_version(rate_version_id=rv.id)
-            popular_set = set(POPULAR_ROUTES)
-            rest = [pair for pair in all_pairs if pair not in popular_set]
-            rest = _sort_routes_dest_first(rest)
-
-            total = len(rest)
-            start = (page - 1) * PAGE_SIZE
-            end = start + PAGE_SIZE
-            page_pairs = rest[start:end]
-            has_prev = page > 1
-            has_next = end < total
-
-            rates = await list_route_rates_for_version(rate_version_id=rv.id, routes=page_pairs)
-            rate_map = {(r.origin_country, r.dest_country): r for r in rates}
-
-            blocks = []
-            for (o, d) in page_pairs:
-                rr = rate_map.get((o, d))
-                if not rr:
-                    continue
-                blocks.append(f"{route_label(o, d)}\nTasa: {format_rate_no_noise(rr.rate_client)}")
-
-            text = f"📋 *Todas las tasas* (Página {page})\n\n" + ("\n\n".join(blocks) if blocks else "No hay rutas.")
-            await _safe_edit(q, text, rates_pagination_buttons(page=page, has_prev=has_prev, has_next=has_next))
+            screen = screens.page(page)
+            await _safe_edit(q, screen.text, screen.reply_markup)
             return
 
     except Exception as e:
@@ -0,0 +1,244 @@
+"""
+Envío de notificaciones a operadores y grupos fuera del handler.
+
+Antes los handlers de admin_orders.py (orig_ok, proc, cancelaciones, cierre
+con comprobante) hacían, tras el COMMIT, un get_telegram_id_by_user_id por
+destinatario y cada send_message / send_photo en línea: el tap del admin no
+terminaba hasta que Telegram respondía a todos los envíos. Ahora:
+
+- el handler encola en notification_outbox dentro de la misma transacción
+  del cambio de estado (notification_outbox_repo.enqueue_notification_tx)
+  y despierta al dispatcher con notify_notifications()
+- el dispatcher reclama lotes (settings.NOTIFY_BATCH_SIZE) con el chat de
+  destino ya resuelto en la misma query (JOIN a users, sin query por envío)
+- envíos por un token bucket (settings.NOTIFY_RATE_PER_SECOND); chats
+  distintos en paralelo, los de un mismo chat en orden (si uno falla, los
+  siguientes de ese chat esperan al reintento)
+- RetryAfter pausa el bucket y reencola sin gastar intento; Forbidden /
+  chat inexistente -> FAILED; el resto reintenta con backoff hasta
+  settings.NOTIFY_MAX_ATTEMPTS
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from src.config.settings import settings
+from src.db.repositories.notification_outbox_repo import (
+    Notification,
+    claim_due_notifications,
+    defer_notifications,
+    mark_notification_retry,
+    mark_notifications_sent,
+)
+from src.telegram_app.broadcast_engine import TokenBucket, retry_after_seconds
+from src.utils.backoff import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+_LEASE_SECONDS = 300.0     # una fila reclamada vuelve a estar disponible si el proceso muere
+_ERROR_RETRY_SECONDS = 5.0
+_BACKOFF_BASE_SECONDS = 5.0
+_BACKOFF_MAX_SECONDS = 900.0
+_UNREACHABLE_NEEDLES = ("chat not found", "user is deactivated", "bot was blocked", "peer_id_invalid")
+
+
+class _GiveUp(Exception):
+    """El destinatario no es alcanzable: no tiene sentido reintentar."""
+
+
+class NotificationDispatcher:
+    def __init__(self, *, rate_per_second: float, batch_size: int, poll_seconds: float):
+        self.bucket = TokenBucket(rate_per_second, burst=max(1, int(rate_per_second)))
+        self.batch_size = max(1, int(batch_size))
+        self.poll_seconds = poll_seconds
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self._bot = None
+        self._inflight = 0
+        self._sent = 0
+        self._failed = 0
+        self._gave_up = 0
+        self._retry_after_hits = 0
+        self._last_error: str | None = None
+
+    def notify(self) -> None:
+        """Despierta al dispatcher (hay filas nuevas en el outbox)."""
+        self._wake.set()
+
+    async def _send(self, bot, n: Notification) -> None:
+        if n.chat_id is None:
+            raise _GiveUp("destinatario sin telegram_user_id")
+        markup = InlineKeyboardMarkup.de_json(n.reply_markup, bot) if n.reply_markup else None
+        await self.bucket.acquire()
+        try:
+            if n.photo_file_id:
+                await bot.send_photo(
+                    chat_id=n.chat_id,
+                    photo=n.photo_file_id,
+                    caption=n.text,
+                    parse_mode=n.parse_mode,
+                    reply_markup=markup,
+                )
+            else:
+                await bot.send_message(
+                    chat_id=n.chat_id,
+                    text=n.text,
+                    parse_mode=n.parse_mode,
+                    reply_markup=markup,
+                    disable_web_page_preview=n.disable_web_page_preview,
+                )
+        except Forbidden as e:
+            raise _GiveUp(str(e)) from e
+        except BadRequest as e:
+            if any(needle in str(e).lower() for needle in _UNREACHABLE_NEEDLES):
+                raise _GiveUp(str(e)) from e
+            raise
+
+    async def _process_chat(self, bot, items: list[Notification], sent: list[int]) -> None:
+        """
+        Envía en orden las notificaciones de un chat. Cada id enviado se agrega
+        a `sent` apenas sale, así un error posterior no lo pierde (y no se
+        reenvía al vencer el lease).
+        """
+        for i, n in enumerate(items):
+            self._inflight += 1
+            try:
+                await self._send(bot, n)
+            except RetryAfter as e:
+                wait = retry_after_seconds(e)
+                self._retry_after_hits += 1
+                logger.warning("[notifications] RetryAfter %.0fs: pausa global", wait)
+                self.bucket.pause(wait)
+                await defer_notifications([x.id for x in items[i:]], delay_seconds=wait)
+                return
+            except _GiveUp as e:
+                self._gave_up += 1
+                self._last_error = f"chat {n.chat_id}: {e}"
+                logger.warning("[notifications] #%s a chat %s descartada: %s", n.id, n.chat_id, e)
+                # mismo chat: el resto tampoco va a llegar
+                for x in items[i:]:
+                    await mark_notification_retry(x.id, error=str(e), delay_seconds=0, give_up=True)
+                return
+            except Exception as e:
+                self._failed += 1
+                self._last_error = f"chat {n.chat_id}: {e}"
+                give_up = n.attempts >= int(settings.NOTIFY_MAX_ATTEMPTS)
+                delay = backoff_delay(n.attempts, base=_BACKOFF_BASE_SECONDS, cap=_BACKOFF_MAX_SECONDS)
+                if give_up:
+                    self._gave_up += 1
+                    logger.error("[notifications] #%s agotó %d intentos: %s", n.id, n.attempts, e)
+                else:
+                    logger.warning("[notifications] #%s falló (intento %d), reintento en %.0fs: %s",
+                                   n.id, n.attempts, delay, e)
+                await mark_notification_retry(n.id, error=str(e), delay_seconds=delay, give_up=give_up)
+                # lo que sigue del chat sale después, para no adelantarse
+                await defer_notifications([x.id for x in items[i + 1:]], delay_seconds=delay)
+                return
+            finally:
+                self._inflight -= 1
+            sent.append(n.id)
+            self._sent += 1
+
+    async def drain_once(self, bot) -> int:
+        """Envía un lote de filas vencidas. Devuelve cuántas reclamó."""
+        batch = await claim_due_notifications(limit=self.batch_size, lease_seconds=_LEASE_SECONDS)
+        if not batch:
+            return 0
+        by_chat: dict[int | None, list[Notification]] = defaultdict(list)
+        for n in batch:
+            by_chat[n.chat_id].append(n)
+        sent: list[int] = []
+        try:
+            results = await asyncio.gather(
+                *(self._process_chat(bot, items, sent) for items in by_chat.values()), return_exceptions=True,
+            )
+            for r in results:
+                if isinstance(r, Exception):
+                    logger.warning("[notifications] error en lote: %s", r)
+        finally:
+            # también si un chat falló o nos cancelan: lo ya enviado no se repite
+            await asyncio.shield(mark_notifications_sent(sent))
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await self.drain_once(self._bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("[notifications] error drenando el outbox: %s", e)
+                await asyncio.sleep(_ERROR_RETRY_SECONDS)
+                continue
+            if claimed:
+                continue  # puede haber más filas vencidas
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, bot) -> None:
+        """Arranca el dispatcher en background (idempotente)."""
+        self._bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="notification_dispatcher")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Detiene el dispatcher esperando (hasta `timeout`) los envíos en curso.
+        Lo pendiente queda en el outbox y sale al volver a arrancar.
+        """
+        task, self._task = self._task, None
+        if task is not None:
+            deadline = time.monotonic() + timeout
+            while self._inflight and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "rate_per_second": self.bucket.rate,
+            "batch_size": self.batch_size,
+            "inflight": self._inflight,
+            "sent": self._sent,
+            "failed": self._failed,
+            "gave_up": self._gave_up,
+            "retry_after_hits": self._retry_after_hits,
+            "last_error": self._last_error,
+        }
+
+
+# --- Dispatcher compartido (process-wide) ---
+# Se arranca/detiene con el lifespan de FastAPI (src/main.py).
+
+notification_dispatcher = NotificationDispatcher(
+    rate_per_second=float(settings.NOTIFY_RATE_PER_SECOND),
+    batch_size=int(settings.NOTIFY_BATCH_SIZE),
+    poll_seconds=float(settings.NOTIFY_POLL_SECONDS),
+)
+
+
+def notify_notifications() -> None:
+    """Llamar tras hacer COMMIT de enqueue_notification_tx."""
+    notification_dispatcher.notify()
+
+
+def start_notification_dispatcher(bot) -> None:
+    notification_dispatcher.start(bot)
+
+
+async def stop_notification_dispatcher() -> None:
+    await notification_dispatcher.stop()
@@ -0,0 +1,155 @@
+"""
+Pantallas de 📈 Tasas pre-renderizadas por versión de tasas.
+
+Todas las pantallas (populares, por país de origen y cada página de
+"Ver más") se arman UNA vez por versión a partir del snapshot en memoria
+(src/rates_snapshot.py). Los handlers quedan en un lookup + un envío/edición.
+Al cambiar la versión activa el cache se reconstruye en la siguiente lectura.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from telegram import InlineKeyboardMarkup
+
+from src.rates_snapshot import RatesSnapshot, get_rates_snapshot
+from src.telegram_app.ui.labels import BTN_NEW_ORDER
+from src.telegram_app.ui.rates_buttons import (
+    rates_country_result_buttons,
+    rates_main_buttons,
+    rates_pagination_buttons,
+)
+from src.rates_matrix import format_rate_no_noise
+from src.telegram_app.ui.routes_popular import POPULAR_ROUTES, route_label
+
+PAGE_SIZE = 9
+
+POPULAR_HEADER = "📈 *Tasas de hoy* (Rutas populares)\n\n"
+
+
+@dataclass(frozen=True)
+class Screen:
+    text: str
+    reply_markup: InlineKeyboardMarkup | None = None
+
+
+@dataclass(frozen=True)
+class RatesScreens:
+    version_id: int
+    popular: Screen                  # "Volver a tasas"
+    popular_with_cta: Screen | None  # 📈 Tasas (con llamado a "Nueva orden"); None = sin rutas populares
+    by_origin: dict[str, Screen]
+    pages: list[Screen]
+
+    def origin(self, origin: str) -> Screen | None:
+        return self.by_origin.get(origin)
+
+    def page(self, page: int) -> Screen:
+        if 1 <= page <= len(self.pages):
+            return self.pages[page - 1]
+        # Página fuera de rango (callback viejo): misma pantalla que antes
+        return Screen(
+            f"📋 *Todas las tasas* (Página {page})\n\nNo hay rutas.",
+            rates_pagination_buttons(page=page, has_prev=page > 1, has_next=False),
+        )
+
+
+def sort_routes_dest_first(routes: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    def key_fn(r: Tuple[str, str]):
+        origin, dest = r
+        venezuela_first = 0 if dest == "VENEZUELA" else 1
+        return (venezuela_first, dest, origin)
+    return sorted(routes, key=key_fn)
+
+
+def build_rates_screens(snap: RatesSnapshot) -> RatesScreens:
+    block_cache: dict[tuple[str, str], str] = {}
+
+    def _block(o: str, d: str) -> str:
+        b = block_cache.get((o, d))
+        if b is None:
+            b = f"{route_label(o, d)}\nTasa: {format_rate_no_noise(snap.routes[(o, d)].rate_client)}"
+            block_cache[(o, d)] = b
+        return b
+
+    # Populares
+    popular_blocks = [_block(o, d) for (o, d) in POPULAR_ROUTES if (o, d) in snap.routes]
+    body = POPULAR_HEADER + "\n\n".join(popular_blocks)
+    popular = Screen(body, rates_main_buttons())
+    popular_with_cta = None
+    if popular_blocks:
+        popular_with_cta = Screen(body + f"\n\n¿Listo para enviar? Toca {BTN_NEW_ORDER}.", rates_main_buttons())
+
+    # Por país de origen
+    by_origin: dict[str, Screen] = {}
+    result_buttons = rates_country_result_buttons()
+    for origin in sorted({o for (o, _) in snap.routes}):
+        blocks = [_block(rr.origin_country, rr.dest_country) for rr in snap.routes_by_origin(origin)]
+        by_origin[origin] = Screen(f"🌎 *Tasas desde {origin}*\n\n" + "\n\n".join(blocks), result_buttons)
+
+    # Páginas de "Ver más" (todo menos populares)
+    popular_set = set(POPULAR_ROUTES)
+    rest = sort_routes_dest_first([pair for pair in snap.route_pairs() if pair not in popular_set])
+    pages: list[Screen] = []
+    total = len(rest)
+    for start in range(0, max(total, 1), PAGE_SIZE):
+        page = start // PAGE_SIZE + 1
+        end = start + PAGE_SIZE
+        blocks = [_block(o, d) for (o, d) in rest[start:end]]
+        text = f"📋 *Todas las tasas* (Página {page})\n\n" + ("\n\n".join(blocks) if blocks else "No hay rutas.")
+        pages.append(Screen(text, rates_pagination_buttons(page=page, has_prev=page > 1, has_next=end < total)))
+
+    return RatesScreens(
+        version_id=snap.version_id,
+        popular=popular,
+        popular_with_cta=popular_with_cta,
+        by_origin=by_origin,
+        pages=pages,
+    )
+
+
+class RatesScreenCache:
+    """Pantallas de la versión activa; se reconstruyen cuando cambia el snapshot."""
+
+    def __init__(self) -> None:
+        self._screens: RatesScreens | None = None
+        self._routes_key: object | None = None  # snap.routes de la versión renderizada
+        self._hits = 0
+        self._misses = 0
+
+    async def get(self) -> RatesScreens | None:
+        snap = await get_rates_snapshot()
+        if snap is None:
+            return None
+        # Mismo mapping de rutas = misma versión (un refresh de metadatos no invalida).
+        # build_rates_screens es síncrono: no hay carrera entre el chequeo y el swap.
+        if self._routes_key is snap.routes and self._screens is not None:
+            self._hits += 1
+            return self._screens
+        self._misses += 1
+        self._screens = build_rates_screens(snap)
+        self._routes_key = snap.routes
+        return self._screens
+
+    def invalidate(self) -> None:
+        self._screens = None
+        self._routes_key = None
+
+    def stats(self) -> dict:
+        total = self._hits + self._misses
+        return {
+            "version_id": self._screens.version_id if self._screens else None,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / total, 4) if total else None,
+        }
+
+
+rates_screens = RatesScreenCache()
+
+
+async def get_rates_screens() -> RatesScreens | None:
+    """Pantallas pre-renderizadas de la versión activa (None si no hay tasas)."""
+    return await rates_screens.get()
@@ -0,0 +1,136 @@
+"""
+Procesamiento concurrente de updates con orden por chat.
+
+Sin concurrent_updates, PTB procesa un update a la vez: un handler lento
+(descarga de comprobante, Binance en process_paid_proof_photo, un timeout
+de DB de 5s) frenaba los updates de TODOS los usuarios.
+
+ChatOrderedUpdateProcessor:
+- updates de chats distintos corren en paralelo, hasta
+  settings.BOT_CONCURRENT_UPDATES a la vez
+- los de un mismo chat (y por lo tanto cada ConversationHandler, que
+  indexa por chat/usuario) se procesan estrictamente en orden de llegada:
+  un lock FIFO por chat, tomado ANTES del cupo global para que un chat con
+  cola no ocupe cupos esperando su turno
+- stats(): updates en curso / esperando, chats activos y tiempo de espera
+  (cola del chat + cupo) de los últimos updates
+- on_start (opcional): se llama con cada update al empezar su handler
+  (webhook_intake mide recepción -> inicio)
+
+Contrato con PTB: process_update es @final y toma el semáforo de PTB antes
+de llamar a do_process_update; todo el orden por chat vive en
+do_process_update. Para que un chat con cola no ocupe cupos, el semáforo
+de PTB NO es el límite de ejecución: se dimensiona como admisión
+(max_concurrent_updates + max_queued updates dentro del procesador) y el
+límite real de handlers corriendo es `max_running`, un semáforo propio que
+se toma DESPUÉS del lock del chat. Por eso Application.concurrent_updates
+reporta la admisión, no los handlers en paralelo.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+_WAIT_SAMPLES = 1000
+
+
+class _ChatSlot:
+    __slots__ = ("lock", "queued")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.queued = 0  # updates del chat dentro del procesador (esperando + corriendo)
+
+
+def chat_key(update: object) -> int | None:
+    """Chat del update (o usuario, si no trae chat). None = sin orden (corre libre)."""
+    if isinstance(update, Update):
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return update.effective_user.id
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int, *, max_queued: int = 1000):
+        self.max_running = max(1, int(max_concurrent_updates))
+        # semáforo de PTB = admisión (corriendo + esperando turno), ver docstring
+        super().__init__(self.max_running + max(0, int(max_queued)))
+        self._slots = asyncio.BoundedSemaphore(self.max_running)
+        self._chats: dict[int, _ChatSlot] = {}
+        self._waits: deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self._waiting = 0
+        self._running = 0
+        self._processed = 0
+        self.on_start: Callable[[object], None] | None = None
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = chat_key(update)
+        enqueued = time.monotonic()
+        started = False
+        self._waiting += 1
+        slot = None
+        if key is not None:
+            slot = self._chats.get(key)
+            if slot is None:
+                slot = self._chats[key] = _ChatSlot()
+            slot.queued += 1
+        try:
+            if slot is not None:
+                await slot.lock.acquire()
+            try:
+                async with self._slots:
+                    self._waits.append(time.monotonic() - enqueued)
+                    self._waiting -= 1
+                    self._running += 1
+                    started = True
+                    if self.on_start is not None:
+                        self.on_start(update)
+                    try:
+                        await coroutine
+                    finally:
+                        self._running -= 1
+                        self._processed += 1
+            finally:
+                if slot is not None:
+                    slot.lock.release()
+        finally:
+            if not started:
+                self._waiting -= 1
+                coroutine.close()  # cancelado antes de su turno
+            if slot is not None:
+                slot.queued -= 1
+                if slot.queued == 0:
+                    self._chats.pop(key, None)
+
+    async def initialize(self) -> None:
+        return None
+
+    async def shutdown(self) -> None:
+        return None
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "max_concurrent": self.max_running,
+            "max_admitted": self.max_concurrent_updates,
+            "running": self._running,
+            "waiting": self._waiting,
+            "chats_active": len(self._chats),
+            "max_chat_backlog": max((s.queued for s in self._chats.values()), default=0),
+            "processed": self._processed,
+            "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_p95_ms": round(waits[max(0, int(len(waits) * 0.95) - 1)] * 1000, 1) if waits else 0.0,
+            "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
@@ -0,0 +1,170 @@
+"""
+Entrada de updates del webhook (/webhook en src/main.py).
+
+Antes el endpoint hacía request.json() + log + Update.de_json +
+update_queue.put sin límite: si Telegram re-entregaba tras una respuesta
+lenta, el mismo update_id se procesaba dos veces, y con el bot ocupado la
+cola crecía sin techo. Ahora accept() solo:
+
+1. parsea el body con orjson (json de la stdlib si no está instalado)
+2. descarta update_id repetidos dentro de settings.WEBHOOK_DEDUPE_SECONDS
+   (responde 200: Telegram deja de reintentar)
+3. si hay más de settings.WEBHOOK_MAX_PENDING updates sin empezar
+   (esta cola + update_queue de PTB + esperando en el procesador), responde
+   503 con Retry-After SIN marcar el update_id: Telegram lo re-entrega
+4. encola el dict crudo y responde 200
+
+Un consumidor en background construye el Update (de_json) y lo pasa a
+update_queue en orden de llegada. El tiempo recepción -> inicio del
+handler se mide con el hook on_start de ChatOrderedUpdateProcessor.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+from telegram import Update
+
+from src.config.settings import settings
+from src.utils.bounded_state import TTLMap
+
+logger = logging.getLogger(__name__)
+
+try:  # opcional: 3-5x más rápido que json en payloads de Telegram
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+    _loads = json.loads
+
+OVERLOAD_RETRY_AFTER_SECONDS = 5
+_LATENCY_SAMPLES = 1000
+
+
+class WebhookIntake:
+    def __init__(self, *, max_pending: int, dedupe_seconds: float):
+        self.max_pending = max(1, int(max_pending))
+        self._queue: asyncio.Queue[tuple[float, dict]] = asyncio.Queue()
+        self._seen = TTLMap(dedupe_seconds, max_size=100_000, name="webhook_update_ids")
+        # update_id -> recepción, hasta que el handler arranca
+        self._received = TTLMap(300, max_size=max(1000, self.max_pending * 2), name="webhook_received_at")
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        self._app = None
+        self._task: asyncio.Task | None = None
+        self._closed = False
+        self._accepted = 0
+        self._duplicates = 0
+        self._overloaded = 0
+        self._invalid = 0
+
+    def backlog(self) -> int:
+        """Updates recibidos que todavía no empezaron a procesarse."""
+        n = self._queue.qsize()
+        if self._app is not None:
+            n += self._app.update_queue.qsize()
+            n += getattr(self._app.update_processor, "waiting", 0)
+        return n
+
+    def accept(self, body: bytes) -> int:
+        """Status HTTP para Telegram: 200 (aceptado o repetido), 400 o 503."""
+        try:
+            data = _loads(body)
+            update_id = int(data["update_id"])
+        except Exception:
+            self._invalid += 1
+            return 400
+
+        if update_id in self._seen:
+            self._duplicates += 1
+            logger.info("[webhook] update_id=%s repetido, ignorado", update_id)
+            return 200
+        if self._closed or self.backlog() >= self.max_pending:
+            self._overloaded += 1
+            return 503
+
+        now = time.monotonic()
+        self._seen[update_id] = True
+        self._received[update_id] = now
+        self._queue.put_nowait((now, data))
+        self._accepted += 1
+        logger.debug("[webhook] update_id=%s encolado", update_id)
+        return 200
+
+    def mark_started(self, update: object) -> None:
+        """Hook del procesador de updates: registra recepción -> inicio del handler."""
+        received = self._received.pop(getattr(update, "update_id", None))
+        if received is not None:
+            self._latencies.append(time.monotonic() - received)
+
+    async def _consume(self) -> None:
+        while True:
+            _, data = await self._queue.get()
+            try:
+                update = Update.de_json(data, self._app.bot)
+            except Exception as e:
+                logger.warning("[webhook] update inválido descartado: %s", e)
+                continue
+            await self._app.update_queue.put(update)
+
+    def start(self, app) -> None:
+        self._app = app
+        self._closed = False
+        processor = app.update_processor
+        if hasattr(processor, "on_start"):
+            processor.on_start = self.mark_started
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._consume(), name="webhook_intake")
+
+    async def stop(self) -> None:
+        """Deja de aceptar (503: Telegram re-entrega a la nueva instancia) y vuelca lo pendiente a PTB."""
+        self._closed = True
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        while self._app is not None and not self._queue.empty():
+            _, data = self._queue.get_nowait()
+            try:
+                self._app.update_queue.put_nowait(Update.de_json(data, self._app.bot))
+            except Exception as e:
+                logger.warning("[webhook] update descartado al apagar: %s", e)
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencies)
+        return {
+            "parser": "orjson" if orjson is not None else "json",
+            "backlog": self.backlog(),
+            "max_pending": self.max_pending,
+            "accepted": self._accepted,
+            "duplicates": self._duplicates,
+            "overloaded": self._overloaded,
+            "invalid": self._invalid,
+            "receipt_to_start_avg_ms": round(sum(lat) / len(lat) * 1000, 1) if lat else 0.0,
+            "receipt_to_start_p95_ms": round(lat[max(0, int(len(lat) * 0.95) - 1)] * 1000, 1) if lat else 0.0,
+            "receipt_to_start_max_ms": round(lat[-1] * 1000, 1) if lat else 0.0,
+        }
+
+
+# --- Entrada compartida (process-wide) ---
+# Se arranca/detiene con el lifespan de FastAPI (src/main.py).
+
+webhook_intake = WebhookIntake(
+    max_pending=int(settings.WEBHOOK_MAX_PENDING),
+    dedupe_seconds=float(settings.WEBHOOK_DEDUPE_SECONDS),
+)
+
+
+def start_webhook_intake(app) -> None:
+    webhook_intake.start(app)
+
+
+async def stop_webhook_intake() -> None:
+    await webhook_intake.stop()
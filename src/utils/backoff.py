@@ -0,0 +1,14 @@
+"""
+Backoff exponencial con jitter para los workers de outbox (subidas a Drive,
+notificaciones de Telegram).
+"""
+
+from __future__ import annotations
+
+import random
+
+
+def backoff_delay(attempts: int, *, base: float, cap: float) -> float:
+    """Espera antes del intento `attempts + 1`: base * 2^(attempts-1), tope `cap`, jitter ±20%."""
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
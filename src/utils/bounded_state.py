@@ -0,0 +1,223 @@
+"""
+Estado en memoria acotado (TTL / LRU / listas con tope).
+
+Varios dicts y sets de módulo crecían sin límite durante la vida del
+proceso (locks de difusión, intentos de login, códigos de reset, ...) y la
+memoria subía hasta que el contenedor se reiniciaba. Este módulo da:
+
+- TTLMap: entradas que expiran `ttl_seconds` después de escribirse;
+  `max_size` opcional (desaloja la más vieja)
+- LRUMap: tope de entradas, desaloja la menos usada
+- append_capped: agrega a una lista normal (p. ej. en user_data, que se
+  persiste) descartando las más viejas por encima del tope
+
+Cada estructura con `name` se registra para bounded_state_stats() (health)
+y las TTLMap se barren en background (start_state_sweeper), así las
+claves que nadie vuelve a leer también se liberan.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Hashable, Iterator
+
+logger = logging.getLogger(__name__)
+
+_registry: "weakref.WeakValueDictionary[str, _Bounded]" = weakref.WeakValueDictionary()
+_MISSING = object()
+
+
+class _Bounded:
+    def __init__(self, name: str | None, max_size: int | None):
+        self.name = name
+        self.max_size = int(max_size) if max_size else None
+        self.evictions = 0
+        if name:
+            _registry[name] = self
+
+    def sweep(self) -> int:
+        return 0
+
+    def stats(self) -> dict:
+        return {"size": len(self), "max_size": self.max_size, "evictions": self.evictions}
+
+
+class TTLMap(_Bounded):
+    """Dict cuyas entradas expiran `ttl_seconds` después de escribirse (la escritura renueva)."""
+
+    def __init__(self, ttl_seconds: float, *, max_size: int | None = None, name: str | None = None):
+        super().__init__(name, max_size)
+        self.ttl_seconds = float(ttl_seconds)
+        # orden de inserción == orden de expiración (TTL fijo): el barrido corta en la primera viva
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.expired = 0
+
+    def _alive(self, key: Hashable) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return _MISSING
+        if item[0] <= time.monotonic():
+            del self._data[key]
+            self.expired += 1
+            return _MISSING
+        return item[1]
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self._data.pop(key, None)
+        self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+        if self.max_size is not None:
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self._alive(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self._data[key]
+
+    def __contains__(self, key: object) -> bool:
+        return self._alive(key) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        self.sweep()
+        return iter(list(self._data))
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._alive(key)
+        return default if value is _MISSING else value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        value = self._alive(key)
+        self._data.pop(key, None)
+        return default if value is _MISSING else value
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def sweep(self) -> int:
+        """Borra las entradas vencidas; retorna cuántas."""
+        now = time.monotonic()
+        removed = 0
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[key]
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def stats(self) -> dict:
+        return {**super().stats(), "ttl_seconds": self.ttl_seconds, "expired": self.expired}
+
+
+class LRUMap(_Bounded):
+    """Dict con tope `max_size`: al pasarse desaloja la entrada menos usada."""
+
+    def __init__(self, max_size: int, *, name: str | None = None):
+        super().__init__(name, max(1, int(max_size)))
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self._data[key]
+        self._data.move_to_end(key)
+        return value
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self._data[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._data))
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._data:
+            return default
+        return self[key]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+def append_capped(items: list, value: Any, cap: int, *, unique: bool = True) -> list:
+    """
+    Agrega `value` a `items` (in place) y descarta las más viejas si
+    supera `cap`. Sigue siendo una lista normal (picklable / persistible).
+    """
+    if unique and value in items:
+        return items
+    items.append(value)
+    overflow = len(items) - max(1, int(cap))
+    if overflow > 0:
+        del items[:overflow]
+    return items
+
+
+def bounded_state_stats() -> dict[str, dict]:
+    return {name: s.stats() for name, s in sorted(_registry.items())}
+
+
+def sweep_all() -> int:
+    removed = 0
+    for s in list(_registry.values()):
+        removed += s.sweep()
+    return removed
+
+
+# --- Barrido en background (lifespan de FastAPI, src/main.py) ---
+
+_sweeper: asyncio.Task | None = None
+
+
+async def _sweep_loop(interval_seconds: float) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            removed = sweep_all()
+            if removed:
+                logger.debug("[bounded_state] %d entradas vencidas liberadas", removed)
+        except Exception as e:
+            logger.warning("[bounded_state] error en barrido: %s", e)
+
+
+def start_state_sweeper(interval_seconds: float = 60.0) -> None:
+    global _sweeper
+    if _sweeper is None or _sweeper.done():
+        _sweeper = asyncio.create_task(_sweep_loop(max(1.0, float(interval_seconds))), name="bounded_state_sweeper")
+
+
+async def stop_state_sweeper() -> None:
+    global _sweeper
+    task, _sweeper = _sweeper, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,265 @@
+"""
+Transferencia en streaming Telegram -> Google Drive.
+
+En vez de descargar el comprobante completo (download_as_bytearray) y
+subirlo desde memoria, la descarga de Telegram se lee por partes y se
+envía por chunks a una sesión de subida resumable de Drive:
+
+- memoria por transferencia acotada a ~1 chunk
+  (settings.DRIVE_STREAM_CHUNK_BYTES, múltiplo de 256 KiB como exige Drive)
+- transferencias simultáneas acotadas (settings.DRIVE_STREAM_MAX_CONCURRENT)
+
+Pico de memoria ≈ chunk × transferencias simultáneas, sin importar cuántos
+operadores manden comprobantes a la vez ni el tamaño del archivo. La única
+excepción, una imagen que hay que reducir (read + send_bytes), se lee
+completa pero dentro del mismo cupo (reserve()), así que también cuenta
+contra DRIVE_STREAM_MAX_CONCURRENT.
+
+La URL de descarga de Telegram lleva el token del bot: un fallo de esa
+pierna se relanza como TelegramDownloadError, con un mensaje sin URL (ese
+texto termina en logs y en drive_upload_outbox.last_error).
+
+Protocolo: https://developers.google.com/drive/api/guides/manage-uploads#resumable
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import httpx
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+DRIVE_UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3/files"
+CHUNK_QUANTUM = 256 * 1024  # Drive exige chunks intermedios múltiplos de 256 KiB
+_READ_SIZE = 64 * 1024      # lectura máxima de la descarga de Telegram por iteración
+
+
+class TelegramDownloadError(RuntimeError):
+    """Fallo al leer el archivo de Telegram. El mensaje nunca incluye la URL (trae el token)."""
+
+
+async def _telegram_pieces(src: httpx.Response):
+    try:
+        async for piece in src.aiter_bytes(_READ_SIZE):
+            yield piece
+    except httpx.HTTPError as e:
+        raise TelegramDownloadError(f"descarga de Telegram interrumpida ({type(e).__name__})") from None
+
+
+def sniff_mime(head: bytes) -> str:
+    """Tipo de contenido por magic bytes (los comprobantes pueden ser foto o documento)."""
+    if head.startswith(b"%PDF"):
+        return "application/pdf"
+    if head.startswith(b"\x89PNG"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def _name_for(file_name: str, mime_type: str) -> str:
+    if mime_type == "application/pdf" and file_name.lower().endswith(".jpg"):
+        return file_name[:-4] + ".pdf"
+    return file_name
+
+
+def _acked_bytes(resp: httpx.Response) -> int:
+    """Bytes que Drive confirmó (header Range: bytes=0-N de una respuesta 308)."""
+    rng = resp.headers.get("Range")
+    if not rng:
+        return 0
+    return int(rng.rsplit("-", 1)[1]) + 1
+
+
+class DriveStreamUploader:
+    """Cliente HTTP compartido + límite de transferencias simultáneas."""
+
+    def __init__(self, *, chunk_bytes: int, max_concurrent: int, timeout_seconds: float):
+        self.chunk_bytes = max(CHUNK_QUANTUM, int(chunk_bytes) // CHUNK_QUANTUM * CHUNK_QUANTUM)
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.timeout_seconds = timeout_seconds
+        self._sem = asyncio.Semaphore(self.max_concurrent)
+        self._client: httpx.AsyncClient | None = None
+        self._active = 0
+        self._transfers = 0
+        self._bytes = 0
+        self._peak_buffer = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout_seconds)
+        return self._client
+
+    async def close(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+    async def _start_session(
+        self, client: httpx.AsyncClient, *, access_token: str, folder_id: str,
+        file_name: str, mime_type: str, total_size: int | None,
+    ) -> str:
+        headers = {"Authorization": f"Bearer {access_token}", "X-Upload-Content-Type": mime_type}
+        if total_size:
+            headers["X-Upload-Content-Length"] = str(total_size)
+        resp = await client.post(
+            DRIVE_UPLOAD_URL,
+            params={"uploadType": "resumable", "fields": "id"},
+            headers=headers,
+            json={"name": file_name, "parents": [folder_id]},
+        )
+        resp.raise_for_status()
+        return resp.headers["Location"]
+
+    @asynccontextmanager
+    async def reserve(self):
+        """
+        Cupo de transferencia. transfer / transfer_bytes lo toman solos; read +
+        send_bytes (archivo en memoria) deben correr dentro de uno.
+        """
+        async with self._sem:
+            self._active += 1
+            try:
+                yield
+            finally:
+                self._active -= 1
+
+    async def read(self, source_url: str, *, max_bytes: int, hasher=None) -> bytearray:
+        """
+        Descarga completa del archivo de Telegram (llamar dentro de reserve()).
+        `hasher` recibe cada parte al vuelo; más de `max_bytes` es un error.
+        """
+        client = self._get_client()
+        buf = bytearray()
+        async with self._open_source(client, source_url) as pieces:
+            async for piece in pieces:
+                if hasher is not None:
+                    hasher.update(piece)
+                buf += piece
+                if len(buf) > max_bytes:
+                    raise TelegramDownloadError(f"archivo de Telegram mayor a {max_bytes} bytes")
+        self._peak_buffer = max(self._peak_buffer, len(buf))
+        return buf
+
+    @asynccontextmanager
+    async def _open_source(self, client: httpx.AsyncClient, source_url: str):
+        """Partes de la descarga de Telegram; errores redactados (ver TelegramDownloadError)."""
+        try:
+            src = await client.send(client.build_request("GET", source_url), stream=True)
+        except httpx.HTTPError as e:
+            # `from None`: la excepción original (y su traceback) llevan la URL con el token
+            raise TelegramDownloadError(f"descarga de Telegram falló ({type(e).__name__})") from None
+        try:
+            if src.is_error:
+                raise TelegramDownloadError(f"descarga de Telegram falló: HTTP {src.status_code}")
+            yield _telegram_pieces(src)
+        finally:
+            await src.aclose()
+
+    async def transfer(
+        self,
+        source_url: str,
+        *,
+        access_token: str,
+        folder_id: str,
+        file_name: str,
+        total_size: int | None = None,
+        hasher=None,
+    ) -> str:
+        """
+        Copia `source_url` (archivo de Telegram) a Drive por chunks. Devuelve el
+        Drive file id. `hasher` (hashlib) recibe cada parte leída.
+        """
+        async with self.reserve():
+            client = self._get_client()
+            async with self._open_source(client, source_url) as pieces:
+                return await self._transfer(pieces, access_token, folder_id, file_name, total_size, hasher)
+
+    async def transfer_bytes(self, data: bytes, *, access_token: str, folder_id: str, file_name: str) -> str:
+        """Sube un contenido ya en memoria (p.ej. imagen re-encodeada) con el mismo protocolo."""
+        async with self.reserve():
+            return await self.send_bytes(data, access_token=access_token, folder_id=folder_id, file_name=file_name)
+
+    async def send_bytes(self, data: bytes, *, access_token: str, folder_id: str, file_name: str) -> str:
+        """Como transfer_bytes, para quien ya tiene el cupo (dentro de reserve())."""
+
+        async def _pieces():
+            view = memoryview(data)
+            for start in range(0, len(view), _READ_SIZE):
+                yield view[start:start + _READ_SIZE]
+
+        return await self._transfer(_pieces(), access_token, folder_id, file_name, len(data), None)
+
+    async def _transfer(self, pieces, access_token, folder_id, file_name, total_size, hasher) -> str:
+        client = self._get_client()
+        auth = {"Authorization": f"Bearer {access_token}"}
+        session: str | None = None
+        offset = 0           # bytes ya confirmados por Drive
+        buf = bytearray()    # pendiente de enviar (≤ chunk + una lectura)
+
+        async def _open_session() -> str:
+            mime = sniff_mime(bytes(buf[:16]))
+            return await self._start_session(
+                client, access_token=access_token, folder_id=folder_id,
+                file_name=_name_for(file_name, mime), mime_type=mime, total_size=total_size,
+            )
+
+        async for piece in pieces:
+            if hasher is not None:
+                hasher.update(piece)
+            buf += piece
+            self._peak_buffer = max(self._peak_buffer, len(buf))
+            if session is None and len(buf) >= 16:
+                session = await _open_session()
+            while len(buf) >= self.chunk_bytes:
+                chunk = bytes(buf[:self.chunk_bytes])
+                resp = await client.put(
+                    session,
+                    content=chunk,
+                    headers={**auth, "Content-Range": f"bytes {offset}-{offset + len(chunk) - 1}/*"},
+                )
+                if resp.status_code != 308:
+                    resp.raise_for_status()
+                    raise RuntimeError(f"Drive respondió {resp.status_code} a un chunk intermedio")
+                # Drive puede persistir menos de lo enviado: lo no confirmado se reenvía
+                acked = _acked_bytes(resp) - offset
+                if acked <= 0:
+                    raise RuntimeError(f"Drive no confirmó bytes del chunk en offset {offset}")
+                del buf[:acked]
+                offset += acked
+
+        if session is None:
+            session = await _open_session()
+
+        total = offset + len(buf)
+        content_range = f"bytes {offset}-{total - 1}/{total}" if buf else f"bytes */{total}"
+        resp = await client.put(session, content=bytes(buf), headers={**auth, "Content-Range": content_range})
+        resp.raise_for_status()
+        self._transfers += 1
+        self._bytes += total
+        return resp.json()["id"]
+
+    def stats(self) -> dict:
+        return {
+            "chunk_bytes": self.chunk_bytes,
+            "max_concurrent": self.max_concurrent,
+            "active": self._active,
+            "transfers": self._transfers,
+            "bytes": self._bytes,
+            "peak_buffer_bytes": self._peak_buffer,
+        }
+
+
+# --- Uploader compartido (process-wide) ---
+# Lo usa el worker de subidas (src/utils/drive_uploads.py), que lo cierra al apagar.
+
+drive_stream = DriveStreamUploader(
+    chunk_bytes=settings.DRIVE_STREAM_CHUNK_BYTES,
+    max_concurrent=settings.DRIVE_STREAM_MAX_CONCURRENT,
+    timeout_seconds=float(settings.DRIVE_STREAM_TIMEOUT_SECONDS),
+)
@@ -0,0 +1,408 @@
+"""
+Subidas al Vault (Google Drive) fuera del camino del handler.
+
+googleapiclient es síncrono (.execute() bloquea): llamado desde un handler
+congelaba el event loop de PTB (webhooks incluidos) durante todo el
+round-trip a Drive. Ahora:
+
+- el handler encola el comprobante en drive_upload_outbox dentro de la
+  misma transacción de la orden (drive_outbox_repo.enqueue_drive_upload_tx)
+  y despierta al worker con notify_drive_uploads()
+- el worker reclama filas vencidas y copia el archivo de Telegram a Drive
+  en streaming por chunks (src/utils/drive_stream.py); lo síncrono de la
+  API de Google (token, carpetas) corre en un ThreadPoolExecutor acotado
+  (settings.DRIVE_UPLOAD_WORKERS hilos)
+- un fallo se reintenta con backoff exponencial (+ jitter) hasta
+  settings.DRIVE_UPLOAD_MAX_ATTEMPTS; luego queda FAILED
+  (scripts/backfill_drive_uploads.py --retry-failed lo reactiva)
+
+La confirmación de la orden / del pago no espera a Drive y una caída de
+Drive no pierde comprobantes: quedan en la tabla hasta subir.
+
+El SHA-256 del contenido se calcula al vuelo mientras se lee de Telegram:
+un reenvío idéntico de la misma orden y tipo se enlaza al archivo de Drive
+existente. Solo las imágenes grandes (> DRIVE_IMAGE_DOWNSCALE_MIN_BYTES) se
+leen completas a memoria, dentro de un cupo de drive_stream, y se reducen a
+settings.DRIVE_IMAGE_MAX_SIDE en el pool de procesos
+(src/utils/proof_images.py). Un
+comprobante idéntico al de OTRA orden no se enlaza: se sube igual, queda
+anotado en duplicate_of y se avisa a admins (posible comprobante reciclado).
+
+Credenciales, cliente de Drive (uno por hilo del pool) e IDs de carpetas
+se cachean en src/utils/google_drive.py; las carpetas se resuelven en
+background al arrancar (o en la primera subida).
+
+Métricas (stats()): en curso, completadas, fallidas, latencia de Drive.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import hashlib
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from src.config.settings import settings
+from src.db.repositories.drive_outbox_repo import (
+    DriveUpload,
+    UploadedProof,
+    claim_due_uploads,
+    find_uploaded_duplicate,
+    mark_upload_done,
+    mark_upload_retry,
+)
+from src.utils.backoff import backoff_delay
+from src.utils.drive_stream import drive_stream
+from src.utils.google_drive import drive_client, get_folder_id, init_folders
+from src.utils.proof_images import (
+    downscale_image,
+    pillow_available,
+    run_cpu,
+    shutdown_image_pool,
+)
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_WINDOW = 200      # últimas subidas consideradas para avg/p95
+_LEASE_SECONDS = 600.0     # una fila reclamada vuelve a estar disponible si el worker muere
+_ERROR_RETRY_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class UploadOutcome:
+    drive_file_id: str
+    content_sha256: str | None = None
+    duplicate_of: int | None = None   # fila del outbox con el mismo contenido
+    linked: bool = False              # True: se reutilizó el archivo de Drive de duplicate_of (sin subir)
+
+
+class DriveUploadService:
+    """Worker del outbox de subidas a Drive con pool de hilos acotado."""
+
+    def __init__(self, workers: int, poll_seconds: float):
+        self.workers = max(1, int(workers))
+        self.poll_seconds = poll_seconds
+        self._executor: ThreadPoolExecutor | None = None
+        self._task: asyncio.Task | None = None
+        self._warm_task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self._bot = None
+        self._inflight = 0
+        self._done = 0
+        self._failed = 0
+        self._gave_up = 0
+        self._dedupe_hits = 0
+        self._cross_order_hits = 0
+        self._downscaled = 0
+        self._bytes_saved = 0
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._last_error: str | None = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="drive_upload")
+        return self._executor
+
+    def notify(self) -> None:
+        """Despierta al worker (hay filas nuevas en el outbox)."""
+        self._wake.set()
+
+    @contextmanager
+    def _measure(self):
+        self._inflight += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._inflight -= 1
+            self._latencies.append(time.monotonic() - started)
+
+    async def _drive_target(self, folder_name: str) -> tuple[str, str]:
+        """(folder_id, access_token); lo bloqueante de la API de Google corre en el pool."""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        folder_id = await loop.run_in_executor(executor, get_folder_id, folder_name)
+        if not folder_id:
+            raise RuntimeError(f"carpeta /{folder_name} del Vault no disponible")
+        access_token = await loop.run_in_executor(executor, drive_client.access_token)
+        if not access_token:
+            raise RuntimeError("Drive no configurado (sin credenciales)")
+        return folder_id, access_token
+
+    def _duplicate(self, dup: UploadedProof, sha: str | None) -> UploadOutcome:
+        self._dedupe_hits += 1
+        return UploadOutcome(drive_file_id=dup.drive_file_id, content_sha256=sha, duplicate_of=dup.id, linked=True)
+
+    async def _find_duplicate(self, bot, job: DriveUpload, **key) -> UploadedProof | None:
+        """
+        Busca un comprobante idéntico ya subido. Si es de otra orden (o de otro
+        tipo) se avisa: el mismo comprobante no debería respaldar dos pagos.
+        """
+        dup = await find_uploaded_duplicate(exclude_id=job.id, **key)
+        if dup is not None and not dup.same_slot(job):
+            await self._flag_cross_order(bot, job, dup)
+        return dup
+
+    async def _flag_cross_order(self, bot, job: DriveUpload, dup: UploadedProof) -> None:
+        self._cross_order_hits += 1
+        logger.warning(
+            "[drive_uploads] %s es idéntico al comprobante %s de la orden #%s (fila #%s): se sube igual",
+            job.file_name, dup.proof_type, dup.order_public_id, dup.id,
+        )
+        chat_id = settings.ALERTS_TELEGRAM_CHAT_ID or settings.ADMIN_TELEGRAM_USER_ID
+        if not chat_id:
+            return
+        try:
+            await bot.send_message(
+                chat_id=int(chat_id),
+                text=(
+                    "⚠️ Comprobante repetido\n"
+                    f"El comprobante {job.proof_type} de la orden #{job.order_public_id} es idéntico "
+                    f"al {dup.proof_type} de la orden #{dup.order_public_id}."
+                ),
+            )
+        except Exception as e:
+            logger.warning("[drive_uploads] no se pudo alertar comprobante repetido: %s", e)
+
+    async def upload(self, bot, job: DriveUpload) -> UploadOutcome:
+        """
+        Pipeline de un comprobante. Lanza excepción si falla.
+        1. mismo file_unique_id que uno ya subido de la misma orden y tipo ->
+           se enlaza (sin descargar)
+        2. imágenes candidatas a downscale (entre DRIVE_IMAGE_DOWNSCALE_MIN_BYTES
+           y DRIVE_IMAGE_MAX_INPUT_BYTES): se leen a memoria con hash al vuelo
+           DENTRO de un cupo de drive_stream, dedupe, downscale en el pool de
+           procesos y subida desde memoria
+        3. resto (la mayoría de las fotos, PDF, tamaño desconocido): streaming
+           con hash al vuelo, memoria acotada a un chunk
+        Un idéntico de otra orden se sube igual y queda en duplicate_of.
+        """
+        seen: UploadedProof | None = None
+        if job.telegram_unique_id:
+            seen = await self._find_duplicate(bot, job, telegram_unique_id=job.telegram_unique_id)
+            if seen is not None and seen.same_slot(job):
+                return self._duplicate(seen, None)
+
+        tg_file = await bot.get_file(job.telegram_file_id)
+        size = int(tg_file.file_size or 0)
+        if self._wants_downscale(size):
+            outcome = await self._upload_processed(bot, tg_file, job, seen)
+        else:
+            outcome = await self._upload_streaming(bot, tg_file, job, seen)
+        if seen is not None and outcome.duplicate_of is None:
+            outcome = dataclasses.replace(outcome, duplicate_of=seen.id)
+        return outcome
+
+    @staticmethod
+    def _wants_downscale(size: int) -> bool:
+        """Solo vale la pena leer a memoria un archivo que podría reducirse."""
+        return (
+            settings.DRIVE_IMAGE_PIPELINE
+            and pillow_available()
+            and int(settings.DRIVE_IMAGE_MAX_SIDE) > 0
+            and int(settings.DRIVE_IMAGE_DOWNSCALE_MIN_BYTES) < size <= int(settings.DRIVE_IMAGE_MAX_INPUT_BYTES)
+        )
+
+    async def _upload_processed(self, bot, tg_file, job: DriveUpload, seen: UploadedProof | None) -> UploadOutcome:
+        # El archivo completo vive en memoria solo dentro del cupo de drive_stream
+        async with drive_stream.reserve():
+            hasher = hashlib.sha256()
+            data = await drive_stream.read(
+                tg_file.file_path, max_bytes=int(settings.DRIVE_IMAGE_MAX_INPUT_BYTES), hasher=hasher,
+            )
+            sha = hasher.hexdigest()
+            dup = seen
+            if dup is None:
+                dup = await self._find_duplicate(bot, job, content_sha256=sha)
+                if dup is not None and dup.same_slot(job):
+                    return self._duplicate(dup, sha)
+
+            smaller = await run_cpu(
+                downscale_image, data, int(settings.DRIVE_IMAGE_MAX_SIDE), int(settings.DRIVE_IMAGE_JPEG_QUALITY),
+            )
+            if smaller is not None:
+                self._downscaled += 1
+                self._bytes_saved += len(data) - len(smaller)
+                data = smaller
+
+            folder_id, access_token = await self._drive_target(job.folder_name)
+            with self._measure():
+                drive_file_id = await drive_stream.send_bytes(
+                    data, access_token=access_token, folder_id=folder_id, file_name=job.file_name,
+                )
+        return UploadOutcome(drive_file_id=drive_file_id, content_sha256=sha, duplicate_of=dup.id if dup else None)
+
+    async def _upload_streaming(self, bot, tg_file, job: DriveUpload, seen: UploadedProof | None) -> UploadOutcome:
+        folder_id, access_token = await self._drive_target(job.folder_name)
+        hasher = hashlib.sha256()
+        with self._measure():
+            drive_file_id = await drive_stream.transfer(
+                tg_file.file_path,
+                access_token=access_token,
+                folder_id=folder_id,
+                file_name=job.file_name,
+                total_size=tg_file.file_size,
+                hasher=hasher,
+            )
+        sha = hasher.hexdigest()
+        # el hash solo se conoce al terminar: aquí el dedupe solo deja constancia
+        dup = seen or await self._find_duplicate(bot, job, content_sha256=sha)
+        return UploadOutcome(drive_file_id=drive_file_id, content_sha256=sha, duplicate_of=dup.id if dup else None)
+
+    async def _process(self, bot, job: DriveUpload) -> None:
+        try:
+            outcome = await self.upload(bot, job)
+        except Exception as e:
+            self._failed += 1
+            self._last_error = f"{job.file_name}: {e}"
+            give_up = job.attempts >= int(settings.DRIVE_UPLOAD_MAX_ATTEMPTS)
+            delay = backoff_delay(
+                job.attempts,
+                base=float(settings.DRIVE_UPLOAD_BACKOFF_BASE_SECONDS),
+                cap=float(settings.DRIVE_UPLOAD_BACKOFF_MAX_SECONDS),
+            )
+            if give_up:
+                self._gave_up += 1
+                logger.error("[drive_uploads] %s agotó %d intentos: %s", job.file_name, job.attempts, e)
+            else:
+                logger.warning("[drive_uploads] %s falló (intento %d), reintento en %.0fs: %s",
+                               job.file_name, job.attempts, delay, e)
+            await mark_upload_retry(
+                job.id,
+                telegram_file_id=job.telegram_file_id,
+                error=str(e),
+                delay_seconds=delay,
+                give_up=give_up,
+            )
+            return
+
+        await mark_upload_done(
+            job.id,
+            outcome.drive_file_id,
+            telegram_file_id=job.telegram_file_id,
+            content_sha256=outcome.content_sha256,
+            duplicate_of=outcome.duplicate_of,
+        )
+        if outcome.linked:
+            logger.info("[drive_uploads] %s es duplicado de #%s: enlazado a Drive_ID %s (sin subir)",
+                        job.file_name, outcome.duplicate_of, outcome.drive_file_id)
+            return
+        self._done += 1
+        logger.info("[drive_uploads] %s subido al Vault (/%s). Drive_ID: %s",
+                    job.file_name, job.folder_name, outcome.drive_file_id)
+
+    async def drain_once(self, bot) -> int:
+        """Procesa un lote de filas vencidas (hasta `workers`). Devuelve cuántas reclamó."""
+        jobs = await claim_due_uploads(limit=self.workers, lease_seconds=_LEASE_SECONDS)
+        if jobs:
+            await asyncio.gather(*(self._process(bot, job) for job in jobs), return_exceptions=True)
+        return len(jobs)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await self.drain_once(self._bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("[drive_uploads] error drenando el outbox: %s", e)
+                await asyncio.sleep(_ERROR_RETRY_SECONDS)
+                continue
+            if claimed:
+                continue  # puede haber más filas vencidas
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _warm_up(self) -> None:
+        """Credenciales + cliente + IDs de carpetas del Vault, en un hilo del pool."""
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._get_executor(), init_folders)
+        except Exception as e:
+            logger.warning("[drive_uploads] warm-up de Drive falló (se resuelve en la primera subida): %s", e)
+
+    def start(self, bot) -> None:
+        """
+        Arranca el worker en background (idempotente). Las carpetas del Vault
+        se resuelven en background: el arranque del bot no espera a Google.
+        """
+        self._bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="drive_uploads_worker")
+            self._warm_task = asyncio.create_task(self._warm_up(), name="drive_uploads_warm_up")
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """
+        Detiene el worker esperando (hasta `timeout`) el lote en curso.
+        Lo que no termine queda en el outbox y se retoma al volver a arrancar.
+        """
+        warm, self._warm_task = self._warm_task, None
+        if warm is not None:
+            warm.cancel()
+        task, self._task = self._task, None
+        if task is not None:
+            self._wake.set()
+            deadline = time.monotonic() + timeout
+            while self._inflight and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        await drive_stream.close()
+        shutdown_image_pool()
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencies)
+        return {
+            "workers": self.workers,
+            "running": self._task is not None,
+            "inflight": self._inflight,
+            "uploaded": self._done,
+            "failed": self._failed,
+            "gave_up": self._gave_up,
+            "dedupe_hits": self._dedupe_hits,
+            "cross_order_duplicates": self._cross_order_hits,
+            "downscaled": self._downscaled,
+            "bytes_saved": self._bytes_saved,
+            "pillow": pillow_available(),
+            "latency_avg_seconds": round(sum(lat) / len(lat), 3) if lat else None,
+            "latency_p95_seconds": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 3) if lat else None,
+            "latency_max_seconds": round(lat[-1], 3) if lat else None,
+            "last_error": self._last_error,
+            "client": drive_client.stats(),
+            "stream": drive_stream.stats(),
+        }
+
+
+# --- Servicio compartido (process-wide) ---
+# Se arranca/detiene con el lifespan de FastAPI (src/main.py).
+
+drive_uploads = DriveUploadService(
+    workers=settings.DRIVE_UPLOAD_WORKERS,
+    poll_seconds=float(settings.DRIVE_UPLOAD_POLL_SECONDS),
+)
+
+
+def notify_drive_uploads() -> None:
+    """Llamar tras hacer COMMIT de enqueue_drive_upload_tx."""
+    drive_uploads.notify()
+
+
+def start_drive_uploads(bot) -> None:
+    drive_uploads.start(bot)
+
+
+async def stop_drive_uploads() -> None:
+    await drive_uploads.stop()
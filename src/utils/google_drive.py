@@ -1,17 +1,21 @@
+import datetime
 import json
 import logging
-from io import BytesIO
+import threading
 import os
 
+from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
 
 logger = logging.getLogger(__name__)
 
 SCOPES = ['https://www.googleapis.com/auth/drive']
 ROOT_DRIVE_ID = os.getenv("DRIVE_ROOT_ID", "1b5S0KHTlGbSYHEppPejgXWu9aUdajvKt")
 
+# Refresh the access token this long before it expires (never on the upload path)
+_TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
 # Globals to cache folder IDs to avoid multiple API calls
 _folder_ids = {
     "KYC": None,
@@ -20,19 +24,101 @@ _folder_ids = {
     "Perfiles": None
 }
 
+
+class DriveClientManager:
+    """
+    Drive API clients built once and reused.
+
+    - Credentials are parsed from GOOGLE_CREDENTIALS_JSON once per process.
+    - The discovery client is built once per thread (httplib2 is not thread-safe),
+      so each upload worker thread keeps its own service.
+    - The access token is refreshed proactively when it is close to expiring.
+    """
+
+    def __init__(self):
+        self._creds = None
+        self._creds_failed = False
+        self._creds_lock = threading.Lock()
+        self._local = threading.local()
+        self._builds = 0
+        self._refreshes = 0
+
+    def _credentials(self):
+        if self._creds is not None or self._creds_failed:
+            return self._creds
+        with self._creds_lock:
+            if self._creds is not None or self._creds_failed:
+                return self._creds
+            creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
+            if not creds_json:
+                logger.error("GOOGLE_CREDENTIALS_JSON environment variable is missing.")
+                self._creds_failed = True
+                return None
+            try:
+                self._creds = Credentials.from_service_account_info(json.loads(creds_json), scopes=SCOPES)
+                logger.info("🔑 GOOGLE_CREDENTIALS_JSON detected and Drive credentials loaded.")
+            except Exception as e:
+                logger.error(f"Failed to load Drive credentials: {e}")
+                self._creds_failed = True
+            return self._creds
+
+    def _ensure_fresh(self, creds) -> None:
+        """Refreshes the token if missing or about to expire (one thread refreshes, the rest reuse it)."""
+        def _expiring():
+            if not creds.token or creds.expiry is None:
+                return True
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)  # google-auth uses naive UTC
+            return creds.expiry - now < _TOKEN_REFRESH_MARGIN
+
+        if not _expiring():
+            return
+        with self._creds_lock:
+            if _expiring():
+                creds.refresh(Request())
+                self._refreshes += 1
+
+    def service(self):
+        """Drive service for the calling thread (None if Drive is not configured)."""
+        creds = self._credentials()
+        if creds is None:
+            return None
+        try:
+            self._ensure_fresh(creds)
+        except Exception as e:
+            # The service refreshes on 401 anyway; don't block the upload on this
+            logger.warning(f"Drive token refresh failed: {e}")
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+            self._local.service = service
+            self._builds += 1
+        return service
+
+    def access_token(self) -> str | None:
+        """Valid bearer token for direct HTTP calls (blocking if a refresh is due)."""
+        creds = self._credentials()
+        if creds is None:
+            return None
+        self._ensure_fresh(creds)
+        return creds.token
+
+    def stats(self) -> dict:
+        return {
+            "configured": self._creds is not None,
+            "services_built": self._builds,
+            "token_refreshes": self._refreshes,
+            "folders_resolved": sorted(k for k, v in _folder_ids.items() if v),
+        }
+
+
+drive_client = DriveClientManager()
+_folders_lock = threading.Lock()
+
+
 def get_drive_service():
-    """Builds and returns the Drive API service from GOOGLE_CREDENTIALS_JSON environment variable."""
-    creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
-    if not creds_json:
-        logger.error("GOOGLE_CREDENTIALS_JSON environment variable is missing.")
-        # Return none instead of crashing hard to allow bot to start without drive
-        return None
+    """Returns the cached Drive API service for this thread (None if unavailable)."""
     try:
-        creds_dict = json.loads(creds_json)
-        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        service = build('drive', 'v3', credentials=creds, cache_discovery=False)
-        logger.info("🔑 GOOGLE_CREDENTIALS_JSON detected and Drive service authenticated successfully.")
-        return service
+        return drive_client.service()
     except Exception as e:
         logger.error(f"Failed to authenticate Drive service: {e}")
         return None
@@ -58,53 +144,35 @@ def init_folders():
         logger.warning("Drive service not available. Skipper folder init.")
         return
 
-    try:
-        # Search for existing folders in root
-        query = f"'{ROOT_DRIVE_ID}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        results = service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
-        items = results.get('files', [])
-
-        existing_folders = {item['name']: item['id'] for item in items}
-
-        for folder_name in _folder_ids.keys():
-            if folder_name in existing_folders:
-                _folder_ids[folder_name] = existing_folders[folder_name]
-                logger.info(f"Directory /{folder_name} already exists (ID: {_folder_ids[folder_name]})")
-            else:
-                new_id = _create_folder(service, ROOT_DRIVE_ID, folder_name)
-                if new_id:
-                    _folder_ids[folder_name] = new_id
-                    logger.info(f"Directory /{folder_name} created successfully (ID: {new_id})")
-    except Exception as e:
-        logger.error(f"Error initializing drive folders: {e}")
+    with _folders_lock:
+        if all(_folder_ids.values()):
+            return
+        try:
+            # Search for existing folders in root
+            query = f"'{ROOT_DRIVE_ID}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
+            results = service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
+            items = results.get('files', [])
 
-def upload_image_to_drive(file_stream: BytesIO, folder_name: str, file_name: str, mime_type: str = 'image/jpeg') -> str | None:
-    """
-    Uploads an image from memory to the specified Drive folder.
-    Returns the Drive File ID.
-    """
-    service = get_drive_service()
-    if not service:
-        logger.error("Cannot upload: Drive service unavailable.")
-        return None
+            existing_folders = {item['name']: item['id'] for item in items}
 
-    folder_id = _folder_ids.get(folder_name)
-    if not folder_id:
-        logger.error(f"Cannot upload: Target folder /{folder_name} ID is not known (run init_folders first).")
-        return None
+            for folder_name in _folder_ids.keys():
+                if _folder_ids[folder_name]:
+                    continue
+                if folder_name in existing_folders:
+                    _folder_ids[folder_name] = existing_folders[folder_name]
+                    logger.info(f"Directory /{folder_name} already exists (ID: {_folder_ids[folder_name]})")
+                else:
+                    new_id = _create_folder(service, ROOT_DRIVE_ID, folder_name)
+                    if new_id:
+                        _folder_ids[folder_name] = new_id
+                        logger.info(f"Directory /{folder_name} created successfully (ID: {new_id})")
+        except Exception as e:
+            logger.error(f"Error initializing drive folders: {e}")
 
-    try:
-        # Important: Make sure stream is reset to the beginning
-        file_stream.seek(0)
-        
-        file_metadata = {
-            'name': file_name,
-            'parents': [folder_id]
-        }
-        media = MediaIoBaseUpload(file_stream, mimetype=mime_type, resumable=True)
-        file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        logger.info(f"Successfully uploaded {file_name} to /{folder_name} (File ID: {file.get('id')})")
-        return file.get('id')
-    except Exception as e:
-        logger.error(f"Error uploading {file_name} to {folder_name}: {e}")
-        return None
+def get_folder_id(folder_name: str) -> str | None:
+    """Cached Vault folder ID; resolves the folders on first use."""
+    folder_id = _folder_ids.get(folder_name)
+    if not folder_id and folder_name in _folder_ids:
+        init_folders()
+        folder_id = _folder_ids.get(folder_name)
+    return folder_id
@@ -0,0 +1,80 @@
+"""
+Etapa de imagen previa a la subida al Vault (CPU, en un pool de procesos).
+
+- downscale_image: re-encodea a JPEG las imágenes que superan
+  settings.DRIVE_IMAGE_MAX_SIDE px en su lado mayor
+
+Es una función pura de módulo (picklable) y corre en un
+ProcessPoolExecutor (settings.DRIVE_IMAGE_PROCESSES) vía run_cpu(): el
+re-encode de fotos de varios MB no bloquea el event loop ni compite por el
+GIL con el bot. El hash de contenido se calcula al vuelo durante la
+descarga (src/utils/drive_uploads.py), no aquí.
+
+Pillow es opcional: sin él no hay downscale (el dedupe sigue funcionando).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+try:  # opcional
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - depende del entorno
+    Image = None
+    ImageOps = None
+
+
+def downscale_image(data: bytes, max_side: int, quality: int) -> bytes | None:
+    """
+    JPEG re-encodeado con el lado mayor <= `max_side` (respeta la orientación
+    EXIF). None si no aplica: sin Pillow, no es imagen (PDF) o ya cabe.
+    """
+    if Image is None or max_side <= 0:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if max(img.size) <= max_side:
+                return None
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=int(quality), optimize=True)
+    except Exception:
+        return None
+    result = out.getvalue()
+    return result if len(result) < len(data) else None
+
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, int(settings.DRIVE_IMAGE_PROCESSES)))
+    return _pool
+
+
+async def run_cpu(fn, *args):
+    """Ejecuta `fn(*args)` en el pool de procesos sin bloquear el loop."""
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), fn, *args)
+
+
+def shutdown_image_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def pillow_available() -> bool:
+    return Image is not None
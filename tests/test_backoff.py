@@ -0,0 +1,6 @@
+from src.utils.backoff import backoff_delay
+
+
+def test_backoff_delay_is_capped():
+    assert backoff_delay(30, base=30, cap=3600) <= 3600 * 1.2
+    assert 24 <= backoff_delay(1, base=30, cap=3600) <= 36
@@ -0,0 +1,87 @@
+import pytest
+
+from src.integrations import binance_p2p
+
+
+@pytest.mark.asyncio
+async def test_shared_client_is_reused_until_closed():
+    await binance_p2p.close_binance_client()
+
+    c1 = binance_p2p.get_binance_client()
+    c2 = binance_p2p.get_binance_client()
+    assert c1 is c2
+    assert not c1.is_closed
+
+    await binance_p2p.close_binance_client()
+    assert c1.is_closed
+
+    c3 = binance_p2p.get_binance_client()
+    assert c3 is not c1
+    await binance_p2p.close_binance_client()
+
+
+def _breaker(threshold=2, cooldown=60.0):
+    return binance_p2p.CircuitBreaker("USD/BUY", failure_threshold=threshold, cooldown_seconds=cooldown)
+
+
+def test_circuit_opens_after_threshold_and_fails_fast():
+    cb = _breaker(threshold=2)
+    assert cb.allow()
+    cb.record_failure(RuntimeError("timeout"))
+    assert cb.state == cb.CLOSED
+    cb.record_failure(RuntimeError("timeout"))
+    assert cb.state == cb.OPEN
+    assert not cb.allow()
+    assert cb.snapshot()["retry_in_seconds"] > 0
+
+
+def test_circuit_half_open_allows_single_probe_then_closes():
+    cb = _breaker(threshold=1, cooldown=0.0)
+    cb.record_failure(RuntimeError("timeout"))
+    assert cb.state == cb.OPEN
+
+    assert cb.allow()  # cooldown vencido -> sonda
+    assert cb.state == cb.HALF_OPEN
+    assert not cb.allow()  # solo una sonda a la vez
+
+    cb.record_success()
+    assert cb.state == cb.CLOSED
+    assert cb.allow()
+
+
+def test_circuit_half_open_failure_reopens():
+    cb = _breaker(threshold=5, cooldown=0.0)
+    cb.state = cb.OPEN
+    cb.opened_at = 0.0
+    assert cb.allow()
+    cb.record_failure(RuntimeError("still down"))
+    assert cb.state == cb.OPEN
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast_without_http_call(monkeypatch):
+    binance_p2p._breakers.clear()
+    binance_p2p.quote_cache.invalidate()
+
+    client = binance_p2p.BinanceP2PClient()
+    calls = 0
+
+    async def fake_uncached(**kwargs):
+        nonlocal calls
+        calls += 1
+        raise binance_p2p.BinanceUnavailableError("Timeout consulting Binance P2P")
+
+    monkeypatch.setattr(client, "_fetch_first_price_uncached", fake_uncached)
+    monkeypatch.setattr(binance_p2p.settings, "BINANCE_CB_FAILURE_THRESHOLD", 1)
+
+    kwargs = dict(fiat="ZZZ", trade_type="BUY", pay_methods=["M"], trans_amount=1)
+    with pytest.raises(binance_p2p.BinanceUnavailableError):
+        await client.fetch_first_price(**kwargs)
+    assert binance_p2p.is_circuit_open("ZZZ")
+
+    with pytest.raises(binance_p2p.CircuitOpenError):
+        await client.fetch_first_price(**kwargs)
+    assert calls == 1
+
+    await client.close()
+    binance_p2p._breakers.clear()
@@ -0,0 +1,64 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from src.utils import bounded_state
+from src.utils.bounded_state import LRUMap, TTLMap, append_capped, bounded_state_stats
+
+
+def test_ttl_map_expires_and_sweeps_in_order():
+    now = [1000.0]
+    with patch.object(bounded_state.time, "monotonic", lambda: now[0]):
+        m = TTLMap(10, name="test_ttl")
+        m["a"] = 1
+        now[0] += 5
+        m["b"] = 2
+        assert "a" in m and m.get("b") == 2
+
+        now[0] += 6                     # "a" venció, "b" sigue viva
+        assert m.sweep() == 1
+        assert len(m) == 1 and "a" not in m and m["b"] == 2
+
+        now[0] += 10
+        assert m.get("b") is None and len(m) == 0
+        with pytest.raises(KeyError):
+            m["b"]
+    stats = bounded_state_stats()["test_ttl"]
+    assert stats["expired"] == 2 and stats["ttl_seconds"] == 10
+
+
+def test_ttl_map_max_size_evicts_oldest_and_rewrite_renews():
+    m = TTLMap(60, max_size=2)
+    m["a"], m["b"] = 1, 2
+    m["a"] = 3                          # renueva: "b" pasa a ser la más vieja
+    m["c"] = 4
+    assert "b" not in m and m["a"] == 3 and m["c"] == 4
+    assert m.evictions == 1
+
+
+def test_lru_map_evicts_least_recently_used():
+    m = LRUMap(2, name="test_lru")
+    m["a"], m["b"] = 1, 2
+    assert m["a"] == 1                  # "a" pasa a ser la más reciente
+    m["c"] = 3
+    assert "b" not in m and list(m) == ["a", "c"]
+    assert bounded_state_stats()["test_lru"] == {"size": 2, "max_size": 2, "evictions": 1}
+
+
+def test_append_capped_keeps_plain_list_and_drops_oldest():
+    items = []
+    for i in [1, 2, 2, 3, 4]:
+        append_capped(items, i, 3)
+    assert items == [2, 3, 4] and type(items) is list
+
+
+@pytest.mark.asyncio
+async def test_background_sweeper_frees_unread_keys():
+    m = TTLMap(0.01, name="test_sweeper")
+    for i in range(100):
+        m[i] = i
+    task = asyncio.create_task(bounded_state._sweep_loop(0.02))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    assert len(m) == 0                  # nadie las leyó: las liberó el barrido
@@ -0,0 +1,201 @@
+import asyncio
+import time
+from contextlib import ExitStack, contextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from src.db.repositories.broadcast_repo import BLOCKED, FAILED, SENT, Broadcast
+from src.telegram_app import broadcast_engine as be
+
+
+def _broadcast(total, bid=1):
+    return Broadcast(bid, 99, 500, 7, "RUNNING", total, 0, 0, 0, 99, 1000)
+
+
+class _FakeRepo:
+    """Destinatarios en memoria con la misma semántica PENDING -> resultado."""
+
+    def __init__(self, ids):
+        self.status = {i: "PENDING" for i in ids}
+        self.flushes = []
+
+    async def fetch(self, broadcast_id, *, limit):
+        return [i for i, s in sorted(self.status.items()) if s == "PENDING"][:limit]
+
+    async def record(self, broadcast_id, results):
+        self.flushes.append(list(results))
+        for tg, st, _ in results:
+            if self.status[tg] == "PENDING":
+                self.status[tg] = st
+
+
+def _patches(repo, total):
+    done = _broadcast(total)
+    return (
+        patch.object(be, "fetch_pending_recipients", side_effect=repo.fetch),
+        patch.object(be, "record_broadcast_results", side_effect=repo.record),
+        patch.object(be, "finish_broadcast", AsyncMock(return_value=done)),
+        patch.object(be, "get_broadcast", AsyncMock(return_value=done)),
+        patch.object(be, "claim_broadcasts", AsyncMock(return_value=[_broadcast(total)])),
+    )
+
+
+@contextmanager
+def _all(patches):
+    with ExitStack() as stack:
+        for p in patches:
+            stack.enter_context(p)
+        yield
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate_after_burst():
+    bucket = be.TokenBucket(rate=50, burst=5)
+    t0 = time.monotonic()
+    for _ in range(15):
+        await bucket.acquire()
+    elapsed = time.monotonic() - t0
+    assert 0.15 <= elapsed < 0.4  # 5 de ráfaga + 10 a 50/s
+
+
+@pytest.mark.asyncio
+async def test_broadcast_sends_concurrently_honors_retry_after_and_marks_blocked():
+    ids = list(range(1, 41))
+    repo = _FakeRepo(ids)
+    calls = {"retry": 0}
+
+    async def copy_message(*, chat_id, from_chat_id, message_id):
+        await asyncio.sleep(0.02)
+        if chat_id == 5 and calls["retry"] == 0:
+            calls["retry"] += 1
+            raise RetryAfter(1)
+        if chat_id == 7:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if chat_id == 8:
+            raise BadRequest("Chat not found")
+        if chat_id == 9:
+            raise BadRequest("Message is too long")
+
+    bot = MagicMock()
+    bot.copy_message = AsyncMock(side_effect=copy_message)
+    bot.send_message = AsyncMock()
+    engine = be.BroadcastEngine(rate_per_second=200, concurrency=8)
+    engine._bot = bot
+
+    with _all(_patches(repo, len(ids))):
+        t0 = time.monotonic()
+        await engine._run(_broadcast(len(ids)))
+        elapsed = time.monotonic() - t0
+
+    assert repo.status[7] == BLOCKED and repo.status[8] == BLOCKED
+    assert repo.status[9] == FAILED
+    assert repo.status[5] == SENT                       # reintentado tras RetryAfter
+    assert sum(s == SENT for s in repo.status.values()) == 37
+    assert 1.0 <= elapsed < 1.8                          # pausa global de 1s, resto concurrente
+    assert engine.stats()["retry_after_hits"] == 1
+    bot.send_message.assert_awaited_once()               # reporte final al admin
+
+
+@pytest.mark.asyncio
+async def test_cancelled_broadcast_keeps_progress_and_resume_sends_only_pending():
+    ids = list(range(1, 31))
+    repo = _FakeRepo(ids)
+    sent_to = []
+
+    async def copy_message(*, chat_id, from_chat_id, message_id):
+        sent_to.append(chat_id)
+        await asyncio.sleep(0.01)
+
+    bot = MagicMock()
+    bot.copy_message = AsyncMock(side_effect=copy_message)
+    bot.send_message = AsyncMock()
+
+    with _all(_patches(repo, len(ids))):
+        engine = be.BroadcastEngine(rate_per_second=100, concurrency=2)
+        engine._bot = bot
+        task = asyncio.create_task(engine._run(_broadcast(len(ids))))
+        await asyncio.sleep(0.12)
+        task.cancel()                                    # "reinicio"
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        first_round = [tg for tg, s in repo.status.items() if s == SENT]
+        assert 0 < len(first_round) < len(ids)
+
+        with patch.object(be, "renew_broadcast_leases", AsyncMock(return_value=set())):
+            engine2 = be.BroadcastEngine(rate_per_second=1000, concurrency=4)
+            await engine2.start(bot)
+            await asyncio.gather(*engine2._tasks.values())
+            await engine2.stop()
+
+    assert all(s == SENT for s in repo.status.values())
+    # Nadie que quedó registrado como SENT recibió el mensaje de nuevo
+    assert all(sent_to.count(tg) == 1 for tg in first_round)
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_puts_the_batch_back_for_the_next_write():
+    ids = list(range(1, 11))
+    repo = _FakeRepo(ids)
+    fails = {"n": 1}
+
+    async def flaky_record(broadcast_id, results):
+        if fails["n"]:
+            fails["n"] -= 1
+            raise RuntimeError("db caída")
+        await repo.record(broadcast_id, results)
+
+    bot = MagicMock()
+    bot.copy_message = AsyncMock()
+    bot.send_message = AsyncMock()
+    engine = be.BroadcastEngine(rate_per_second=1000, concurrency=4)
+    engine._bot = bot
+
+    patches = list(_patches(repo, len(ids)))
+    patches[1] = patch.object(be, "record_broadcast_results", side_effect=flaky_record)
+    with _all(patches), patch.object(be, "_FLUSH_EVERY", 3):
+        await engine._run(_broadcast(len(ids)))
+
+    assert all(s == SENT for s in repo.status.values())
+    assert fails["n"] == 0
+    assert bot.copy_message.await_count == len(ids)     # nadie recibió el mensaje dos veces
+
+
+@pytest.mark.asyncio
+async def test_broadcast_leased_by_another_instance_is_not_sent():
+    bot = MagicMock()
+    bot.copy_message = AsyncMock()
+    engine = be.BroadcastEngine(rate_per_second=1000, concurrency=4)
+    engine._bot = bot
+    with (
+        patch.object(be, "claim_broadcasts", AsyncMock(return_value=[])) as claim,
+        patch.object(be, "fetch_pending_recipients", AsyncMock()) as fetch,
+        patch.object(be, "finish_broadcast", AsyncMock()) as finish,
+    ):
+        await engine._run(_broadcast(5))
+
+    assert claim.await_args.kwargs == {"owner": engine.owner, "lease_seconds": be._LEASE_SECONDS, "broadcast_id": 1}
+    fetch.assert_not_awaited()
+    finish.assert_not_awaited()
+    bot.copy_message.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_supervisor_stops_a_broadcast_whose_lease_was_lost_and_claims_orphans():
+    engine = be.BroadcastEngine(rate_per_second=1000, concurrency=4)
+    stuck = asyncio.create_task(asyncio.sleep(60))
+    engine._tasks[1] = stuck
+    engine._leased.add(1)
+    with (
+        patch.object(be, "renew_broadcast_leases", AsyncMock(return_value=set())) as renew,
+        patch.object(be, "claim_broadcasts", AsyncMock(return_value=[_broadcast(3, bid=2)])),
+        patch.object(engine, "launch") as launch,
+    ):
+        await engine._renew_and_resume()
+
+    renew.assert_awaited_once_with([1], owner=engine.owner, lease_seconds=be._LEASE_SECONDS)
+    with pytest.raises(asyncio.CancelledError):
+        await stuck
+    assert launch.call_args.args[0].id == 2
@@ -0,0 +1,117 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.telegram_app import db_persistence as dbp
+from src.telegram_app.db_persistence import PostgresPersistence, encode_value
+
+
+@pytest.mark.asyncio
+async def test_user_data_is_loaded_lazily_once():
+    stored = {"order": encode_value({"amount": 100}), "\x1fpk:" + encode_value(7): encode_value("x")}
+
+    async def slow_load(kind, owner_id):
+        await asyncio.sleep(0.01)
+        return stored if owner_id == 5 else None
+
+    p = PostgresPersistence()
+    with patch.object(dbp, "load_state", AsyncMock(side_effect=slow_load)) as load:
+        assert await p.get_user_data() == {}           # arranque sin leer usuarios
+        ud = {}
+        await asyncio.gather(p.refresh_user_data(5, ud), p.refresh_user_data(5, ud))
+        await p.refresh_user_data(5, ud)
+        await p.refresh_user_data(6, {})
+
+    assert ud == {"order": {"amount": 100}, 7: "x"}
+    assert load.await_count == 2                       # una vez por usuario
+    assert p.stats()["loads"] == 2
+
+
+@pytest.mark.asyncio
+async def test_only_changed_keys_are_written_in_one_batch():
+    p = PostgresPersistence()
+    write = AsyncMock()
+    with patch.object(dbp, "write_state_batch", write), patch.object(dbp, "load_state", AsyncMock(return_value=None)):
+        await p.refresh_user_data(1, {})
+        await p.refresh_user_data(2, {})
+        await asyncio.gather(
+            p.update_user_data(1, {"order": {"a": 1}, "menu_last_ts": 10}),
+            p.update_user_data(2, {"order": {"a": 2}}),
+            p.update_conversation("broadcast", (9, 9), 1),
+        )
+        assert write.await_count == 1                   # mismo ciclo -> una transacción
+        patches, convs = write.await_args.args
+        assert {(x.kind, x.owner_id) for x in patches} == {("user", 1), ("user", 2)}
+        assert convs[0][:2] == ("broadcast", "[9, 9]")
+
+        write.reset_mock()
+        await p.update_user_data(1, {"order": {"a": 1}, "menu_last_ts": 11})
+        (patch1,), _ = write.await_args.args
+        assert set(patch1.changed) == {"menu_last_ts"} and not patch1.removed
+
+        write.reset_mock()
+        await p.update_user_data(1, {"menu_last_ts": 11})
+        (patch1,), _ = write.await_args.args
+        assert patch1.changed == {} and patch1.removed == {"order"}
+
+        write.reset_mock()
+        await p.update_user_data(1, {"menu_last_ts": 11})   # sin cambios
+        await p.update_conversation("broadcast", (9, 9), None)
+        patches, convs = write.await_args.args
+        assert patches == [] and convs == [("broadcast", "[9, 9]", None)]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_requeued_without_losing_newer_changes():
+    p = PostgresPersistence()
+    with patch.object(dbp, "load_state", AsyncMock(return_value=None)):
+        await p.refresh_user_data(1, {})
+    with patch.object(dbp, "write_state_batch", AsyncMock(side_effect=RuntimeError("db down"))):
+        with pytest.raises(RuntimeError):
+            await p.update_user_data(1, {"order": 1, "mode": "a"})
+
+    write = AsyncMock()
+    with patch.object(dbp, "write_state_batch", write):
+        await p.update_user_data(1, {"order": 2, "mode": "a"})
+
+    (patch1,), _ = write.await_args.args
+    assert patch1.changed == {"order": encode_value(2), "mode": encode_value("a")}
+    assert p.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_drop_then_new_data_writes_fresh_row():
+    p = PostgresPersistence()
+    write = AsyncMock()
+    with patch.object(dbp, "write_state_batch", write), patch.object(dbp, "load_state", AsyncMock()) as load:
+        await p.update_user_data(1, {"order": 1})
+        p._drop("user", 1)
+        p._stage("user", 1, {"mode": "b"})
+        await p.flush()
+        await p.refresh_user_data(1, {})
+
+    (patch1,), _ = write.await_args.args
+    assert patch1.drop and patch1.changed == {"mode": encode_value("b")}
+    load.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_deleted_key_is_not_revived_by_a_later_refresh():
+    p = PostgresPersistence()
+    write = AsyncMock()
+    stored = {"order": encode_value(1), "mode": encode_value("a")}
+    with patch.object(dbp, "write_state_batch", write), patch.object(dbp, "load_state", AsyncMock(return_value=stored)) as load:
+        ud = {}
+        await p.refresh_user_data(1, ud)
+        del ud["order"]
+        await p.update_user_data(1, ud)
+        for uid in range(2, 50):                        # muchos otros usuarios activos
+            await p.refresh_user_data(uid, {})
+        await p.refresh_user_data(1, ud)
+        await p.update_user_data(1, ud)
+
+    assert ud == {"mode": "a"}
+    assert [c.args[1] for c in load.await_args_list].count(1) == 1   # la fila de 1 no se relee
+    (patch1,), _ = write.await_args_list[0].args
+    assert patch1.removed == {"order"}
@@ -0,0 +1,112 @@
+import json
+import traceback
+
+import httpx
+import pytest
+
+from src.utils.drive_stream import CHUNK_QUANTUM, DriveStreamUploader, TelegramDownloadError, sniff_mime
+
+SESSION = "https://www.googleapis.com/upload/drive/v3/files?upload_id=abc"
+
+
+def _uploader(handler):
+    up = DriveStreamUploader(chunk_bytes=CHUNK_QUANTUM, max_concurrent=2, timeout_seconds=5)
+    up._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return up
+
+
+def _drive_handler(payload: bytes, puts: list, *, short_ack_first=False):
+    received = bytearray()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, content=payload)
+        if request.method == "POST":
+            meta = json.loads(request.content)
+            puts.append(("POST", request.headers["X-Upload-Content-Type"], meta["name"], meta["parents"]))
+            return httpx.Response(200, headers={"Location": SESSION})
+        body = request.content
+        rng = request.headers["Content-Range"]
+        puts.append(("PUT", rng, len(body)))
+        if rng.endswith("/*"):
+            start = int(rng.split()[1].split("-")[0])
+            keep = len(body) // 2 if (short_ack_first and len(puts) == 2) else len(body)
+            received[start:start + keep] = body[:keep]
+            return httpx.Response(308, headers={"Range": f"bytes=0-{len(received) - 1}"})
+        if not rng.startswith("bytes */"):
+            start = int(rng.split()[1].split("-")[0])
+            received[start:start + len(body)] = body
+        assert bytes(received) == payload
+        return httpx.Response(200, json={"id": "drive-123"})
+
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_transfer_streams_in_fixed_chunks_with_bounded_buffer():
+    payload = b"\xff\xd8\xff" + bytes(range(256)) * 2800  # ~700 KiB, JPEG
+    puts = []
+    up = _uploader(_drive_handler(payload, puts))
+
+    file_id = await up.transfer(
+        "https://api.telegram.org/file/botX/p.jpg",
+        access_token="tok", folder_id="fold", file_name="ORIGEN_ORDEN_1.jpg", total_size=len(payload),
+    )
+    await up.close()
+
+    assert file_id == "drive-123"
+    assert puts[0] == ("POST", "image/jpeg", "ORIGEN_ORDEN_1.jpg", ["fold"])
+    assert puts[1] == ("PUT", f"bytes 0-{CHUNK_QUANTUM - 1}/*", CHUNK_QUANTUM)
+    assert puts[2] == ("PUT", f"bytes {CHUNK_QUANTUM}-{2 * CHUNK_QUANTUM - 1}/*", CHUNK_QUANTUM)
+    assert puts[3] == ("PUT", f"bytes {2 * CHUNK_QUANTUM}-{len(payload) - 1}/{len(payload)}", len(payload) - 2 * CHUNK_QUANTUM)
+    stats = up.stats()
+    assert stats["peak_buffer_bytes"] < CHUNK_QUANTUM + 64 * 1024
+    assert stats["transfers"] == 1 and stats["bytes"] == len(payload)
+
+
+@pytest.mark.asyncio
+async def test_transfer_resends_unacknowledged_tail_and_names_pdf():
+    payload = b"%PDF-1.7\n" + b"x" * (CHUNK_QUANTUM + 1000)
+    puts = []
+    up = _uploader(_drive_handler(payload, puts, short_ack_first=True))
+
+    assert await up.transfer("https://t/f", access_token="tok", folder_id="f", file_name="PAGO_ORDEN_9.jpg") == "drive-123"
+    await up.close()
+
+    assert puts[0][1:3] == ("application/pdf", "PAGO_ORDEN_9.pdf")
+    half = CHUNK_QUANTUM // 2
+    assert puts[2][1] == f"bytes {half}-{len(payload) - 1}/{len(payload)}"
+
+
+@pytest.mark.asyncio
+async def test_exact_multiple_finalizes_with_empty_put():
+    payload = b"\x89PNG" + b"y" * (CHUNK_QUANTUM - 4)
+    puts = []
+    up = _uploader(_drive_handler(payload, puts))
+    assert await up.transfer("https://t/f", access_token="tok", folder_id="f", file_name="a.jpg") == "drive-123"
+    await up.close()
+    assert puts[-1] == ("PUT", f"bytes */{CHUNK_QUANTUM}", 0)
+
+
+def test_sniff_mime():
+    assert sniff_mime(b"RIFF\x00\x00\x00\x00WEBPVP8") == "image/webp"
+    assert sniff_mime(b"\xff\xd8\xff\xe0") == "image/jpeg"
+
+
+@pytest.mark.asyncio
+async def test_telegram_errors_never_carry_the_tokenized_url():
+    url = "https://api.telegram.org/file/bot123456:SECRET/photos/p.jpg"
+
+    def not_found(request):
+        return httpx.Response(404)
+
+    def unreachable(request):
+        raise httpx.ConnectError(f"cannot reach {request.url}", request=request)
+
+    for handler, expected in ((not_found, "HTTP 404"), (unreachable, "ConnectError")):
+        up = _uploader(handler)
+        with pytest.raises(TelegramDownloadError) as exc:
+            await up.transfer(url, access_token="tok", folder_id="fold", file_name="PAGO_ORDEN_1.jpg")
+        await up.close()
+        assert expected in str(exc.value)
+        assert "SECRET" not in "".join(traceback.format_exception(exc.value))   # ni en el traceback encadenado
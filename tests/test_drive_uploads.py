@@ -0,0 +1,322 @@
+import asyncio
+import hashlib
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.db.repositories import drive_outbox_repo
+from src.db.repositories.drive_outbox_repo import DriveUpload, UploadedProof
+from src.utils import drive_uploads
+
+
+def _fake_bot(data=b"\xff\xd8\xffimg"):
+    tg_file = MagicMock()
+    tg_file.file_path = "https://api.telegram.org/file/botX/photos/p.jpg"
+    tg_file.file_size = len(data)
+    tg_file.download_as_bytearray = AsyncMock(return_value=bytearray(data))
+    bot = MagicMock()
+    bot.get_file = AsyncMock(return_value=tg_file)
+    return bot
+
+
+def _patch_drive(transfer, folder_id="folder"):
+    return (
+        patch.object(drive_uploads, "get_folder_id", return_value=folder_id),
+        patch.object(drive_uploads.drive_client, "access_token", return_value="tok"),
+        patch.object(drive_uploads.drive_stream, "transfer", transfer),
+        patch.object(drive_uploads, "find_uploaded_duplicate", AsyncMock(return_value=None)),
+    )
+
+
+@pytest.mark.asyncio
+async def test_drain_resolves_blocking_bits_in_pool_streams_and_marks_done():
+    service = drive_uploads.DriveUploadService(workers=2, poll_seconds=1)
+    jobs = [DriveUpload(1, 101, "ORIGEN", "tg1", 1), DriveUpload(2, 101, "PAGO", "tg2", 1)]
+    threads = []
+
+    def folder_lookup(name):
+        threads.append(threading.current_thread().name)
+        time.sleep(0.05)  # bloqueante, como googleapiclient
+        return f"id-{name}"
+
+    async def transfer(url, *, access_token, folder_id, file_name, total_size, hasher):
+        hasher.update(b"abc")
+        await asyncio.sleep(0.2)
+        return f"drive-{folder_id}-{file_name}"
+
+    done = AsyncMock()
+    _, token_p, transfer_p, dup_p = _patch_drive(AsyncMock(side_effect=transfer))
+    with (
+        patch.object(drive_uploads, "claim_due_uploads", AsyncMock(return_value=jobs)) as claim,
+        patch.object(drive_uploads, "mark_upload_done", done),
+        patch.object(drive_uploads, "get_folder_id", side_effect=folder_lookup),
+        patch.object(drive_uploads.settings, "DRIVE_IMAGE_PIPELINE", False),
+        token_p,
+        transfer_p as tr,
+        dup_p,
+    ):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        t = asyncio.create_task(ticker())
+        t0 = time.monotonic()
+        assert await service.drain_once(_fake_bot()) == 2
+        elapsed = time.monotonic() - t0
+        t.cancel()
+        await service.stop()
+
+    claim.assert_awaited_once()
+    assert claim.await_args.kwargs["limit"] == 2
+    assert elapsed < 0.4           # dos transferencias de 0.2s en paralelo
+    assert ticks > 5               # el loop siguió libre mientras Drive trabajaba
+    assert all(name.startswith("drive_upload") for name in threads)
+    assert tr.await_args_list[0].args == ("https://api.telegram.org/file/botX/photos/p.jpg",)
+    assert tr.await_args_list[0].kwargs["total_size"] == 6
+    assert sorted(c.args for c in done.await_args_list) == [
+        (1, "drive-id-Origen-ORIGEN_ORDEN_101.jpg"),
+        (2, "drive-id-Pagos-PAGO_ORDEN_101.jpg"),
+    ]
+    assert done.await_args_list[0].kwargs["content_sha256"] == hashlib.sha256(b"abc").hexdigest()
+    assert sorted(c.kwargs["telegram_file_id"] for c in done.await_args_list) == ["tg1", "tg2"]
+    stats = service.stats()
+    assert stats["uploaded"] == 2 and stats["failed"] == 0
+    assert stats["latency_max_seconds"] >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_is_rescheduled_with_backoff_then_gives_up():
+    service = drive_uploads.DriveUploadService(workers=1, poll_seconds=1)
+    retry = AsyncMock()
+    folder_p, token_p, transfer_p, dup_p = _patch_drive(AsyncMock(side_effect=RuntimeError("500 drive")))
+    with (
+        patch.object(drive_uploads, "claim_due_uploads", AsyncMock(side_effect=[
+            [DriveUpload(5, 7, "PAGO", "tg", 3)],
+            [DriveUpload(5, 7, "PAGO", "tg", 15)],
+        ])),
+        patch.object(drive_uploads, "mark_upload_retry", retry),
+        patch.object(drive_uploads, "mark_upload_done", AsyncMock()) as done,
+        folder_p, token_p, transfer_p, dup_p,
+        patch.object(drive_uploads.settings, "DRIVE_IMAGE_PIPELINE", False),
+        patch.object(drive_uploads.settings, "DRIVE_UPLOAD_BACKOFF_BASE_SECONDS", 30.0),
+        patch.object(drive_uploads.settings, "DRIVE_UPLOAD_BACKOFF_MAX_SECONDS", 3600.0),
+        patch.object(drive_uploads.settings, "DRIVE_UPLOAD_MAX_ATTEMPTS", 15),
+    ):
+        await service.drain_once(_fake_bot())
+        await service.drain_once(_fake_bot())
+        await service.stop()
+
+    done.assert_not_awaited()
+    first, last = retry.await_args_list
+    assert first.args == (5,) and not first.kwargs["give_up"]
+    assert first.kwargs["telegram_file_id"] == "tg"
+    assert 96 <= first.kwargs["delay_seconds"] <= 144   # 30 * 2^2 ± 20%
+    assert last.kwargs["give_up"]
+    stats = service.stats()
+    assert stats["failed"] == 2 and stats["gave_up"] == 1
+    assert "PAGO_ORDEN_7.jpg" in stats["last_error"]
+
+
+@pytest.mark.asyncio
+async def test_missing_folder_fails_without_transfer():
+    service = drive_uploads.DriveUploadService(workers=1, poll_seconds=1)
+    folder_p, token_p, transfer_p, dup_p = _patch_drive(AsyncMock(), folder_id=None)
+    with folder_p, token_p, transfer_p as tr, dup_p, patch.object(drive_uploads.settings, "DRIVE_IMAGE_PIPELINE", False):
+        with pytest.raises(RuntimeError):
+            await service.upload(_fake_bot(), DriveUpload(1, 9, "PAGO", "tg", 1))
+        await service.stop()
+    tr.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_same_telegram_file_is_linked_without_download():
+    service = drive_uploads.DriveUploadService(workers=1, poll_seconds=1)
+    bot = _fake_bot()
+    done = AsyncMock()
+    with (
+        patch.object(drive_uploads, "claim_due_uploads", AsyncMock(return_value=[DriveUpload(8, 55, "PAGO", "tg", 1, "uniq-1")])),
+        patch.object(
+            drive_uploads, "find_uploaded_duplicate", AsyncMock(return_value=UploadedProof(3, "drive-old", 55, "PAGO")),
+        ) as find,
+        patch.object(drive_uploads, "mark_upload_done", done),
+    ):
+        await service.drain_once(bot)
+        await service.stop()
+
+    find.assert_awaited_once_with(exclude_id=8, telegram_unique_id="uniq-1")
+    bot.get_file.assert_not_awaited()
+    done.assert_awaited_once_with(8, "drive-old", telegram_file_id="tg", content_sha256=None, duplicate_of=3)
+    assert service.stats()["dedupe_hits"] == 1 and service.stats()["uploaded"] == 0
+
+
+def _fake_read(data):
+    async def read(url, *, max_bytes, hasher=None):
+        assert drive_uploads.drive_stream._active == 1      # leído dentro de un cupo de drive_stream
+        if hasher is not None:
+            hasher.update(data)
+        return bytearray(data)
+    return read
+
+
+def _downscale_settings(min_bytes=100):
+    return (
+        patch.object(drive_uploads.settings, "DRIVE_IMAGE_PIPELINE", True),
+        patch.object(drive_uploads.settings, "DRIVE_IMAGE_DOWNSCALE_MIN_BYTES", min_bytes),
+        patch.object(drive_uploads, "pillow_available", return_value=True),
+    )
+
+
+@pytest.mark.asyncio
+async def test_identical_content_is_deduped_by_hash_computed_while_reading():
+    data = b"\xff\xd8\xff" + b"same screenshot" * 100
+    service = drive_uploads.DriveUploadService(workers=1, poll_seconds=1)
+    folder_p, token_p, transfer_p, _ = _patch_drive(AsyncMock())
+    pipe_p, min_p, pil_p = _downscale_settings()
+    with (
+        folder_p, token_p, transfer_p as tr, pipe_p, min_p, pil_p,
+        patch.object(drive_uploads.drive_stream, "read", side_effect=_fake_read(data)),
+        patch.object(drive_uploads, "run_cpu", AsyncMock()) as cpu,
+        patch.object(
+            drive_uploads, "find_uploaded_duplicate", AsyncMock(return_value=UploadedProof(3, "drive-old", 56, "ORIGEN")),
+        ) as find,
+    ):
+        outcome = await service.upload(_fake_bot(data), DriveUpload(9, 56, "ORIGEN", "tg", 1))
+        await service.stop()
+
+    sha = hashlib.sha256(data).hexdigest()
+    find.assert_awaited_once_with(exclude_id=9, content_sha256=sha)
+    assert outcome == drive_uploads.UploadOutcome("drive-old", sha, 3, linked=True)
+    tr.assert_not_awaited()
+    cpu.assert_not_awaited()                                # nada al pool si se enlaza
+    assert drive_uploads.drive_stream._active == 0
+
+
+@pytest.mark.asyncio
+async def test_small_images_stream_without_buffering():
+    service = drive_uploads.DriveUploadService(workers=1, poll_seconds=1)
+    folder_p, token_p, transfer_p, dup_p = _patch_drive(AsyncMock(return_value="drive-new"))
+    pipe_p, min_p, pil_p = _downscale_settings(min_bytes=1_000_000)
+    with (
+        folder_p, token_p, transfer_p as tr, dup_p, pipe_p, min_p, pil_p,
+        patch.object(drive_uploads.drive_stream, "read", AsyncMock()) as read,
+    ):
+        outcome = await service.upload(_fake_bot(b"\xff\xd8\xff" + b"x" * 5000), DriveUpload(9, 57, "ORIGEN", "tg", 1))
+        await service.stop()
+
+    assert outcome.drive_file_id == "drive-new"
+    tr.assert_awaited_once()
+    read.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_identical_proof_from_another_order_is_uploaded_flagged_and_alerted():
+    service = drive_uploads.DriveUploadService(workers=1, poll_seconds=1)
+    bot = _fake_bot()
+    bot.send_message = AsyncMock()
+    done = AsyncMock()
+    folder_p, token_p, transfer_p, _ = _patch_drive(AsyncMock(return_value="drive-new"))
+    with (
+        folder_p, token_p, transfer_p as tr,
+        patch.object(drive_uploads, "claim_due_uploads", AsyncMock(return_value=[DriveUpload(8, 55, "PAGO", "tg", 1, "uniq-1")])),
+        patch.object(
+            drive_uploads, "find_uploaded_duplicate", AsyncMock(return_value=UploadedProof(3, "drive-old", 40, "PAGO")),
+        ) as find,
+        patch.object(drive_uploads, "mark_upload_done", done),
+        patch.object(drive_uploads.settings, "DRIVE_IMAGE_PIPELINE", False),
+        patch.object(drive_uploads.settings, "ALERTS_TELEGRAM_CHAT_ID", 777),
+    ):
+        await service.drain_once(bot)
+        await service.stop()
+
+    find.assert_awaited_once_with(exclude_id=8, telegram_unique_id="uniq-1")   # no se repite la búsqueda por hash
+    tr.assert_awaited_once()                                                   # se sube igual, no se enlaza
+    assert done.await_args.args == (8, "drive-new")
+    assert done.await_args.kwargs["duplicate_of"] == 3
+    assert bot.send_message.await_args.kwargs["chat_id"] == 777
+    assert "#40" in bot.send_message.await_args.kwargs["text"]
+    stats = service.stats()
+    assert stats["dedupe_hits"] == 0 and stats["cross_order_duplicates"] == 1 and stats["uploaded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_oversized_image_is_downscaled_before_upload():
+    data = b"\xff\xd8\xff" + b"x" * 5000
+
+    async def fake_run_cpu(fn, *args):
+        assert fn is drive_uploads.downscale_image
+        assert drive_uploads.drive_stream._active == 1      # el buffer no sale del cupo
+        return b"\xff\xd8\xffsmall"
+
+    service = drive_uploads.DriveUploadService(workers=1, poll_seconds=1)
+    folder_p, token_p, _, dup_p = _patch_drive(AsyncMock())
+    pipe_p, min_p, pil_p = _downscale_settings()
+    with (
+        folder_p, token_p, dup_p, pipe_p, min_p, pil_p,
+        patch.object(drive_uploads.drive_stream, "read", side_effect=_fake_read(data)),
+        patch.object(drive_uploads.drive_stream, "send_bytes", AsyncMock(return_value="drive-new")) as sb,
+        patch.object(drive_uploads, "run_cpu", side_effect=fake_run_cpu),
+    ):
+        outcome = await service.upload(_fake_bot(data), DriveUpload(9, 57, "ORIGEN", "tg", 1))
+        await service.stop()
+
+    assert outcome.drive_file_id == "drive-new"
+    assert outcome.content_sha256 == hashlib.sha256(data).hexdigest()  # hash del original
+    assert sb.await_args.args == (b"\xff\xd8\xffsmall",)
+    assert service.stats()["downscaled"] == 1
+    assert service.stats()["bytes_saved"] == len(data) - 8
+
+
+class _Ctx:
+    def __init__(self, value=None):
+        self.value = value
+        self.exc = None
+
+    async def __aenter__(self):
+        return self.value
+
+    async def __aexit__(self, *exc):
+        self.exc = exc[0]
+        return False
+
+
+def _fake_conn(cur):
+    conn = MagicMock()
+    conn.savepoint = _Ctx()
+    conn.cursor = lambda: _Ctx(cur)
+    conn.transaction = lambda: conn.savepoint
+    return conn
+
+
+@pytest.mark.asyncio
+async def test_enqueue_tx_is_idempotent_per_order_and_proof_type():
+    cur = AsyncMock()
+    conn = _fake_conn(cur)
+    assert await drive_outbox_repo.enqueue_drive_upload_tx(
+        conn, order_public_id=42, proof_type="ORIGEN", telegram_file_id="tgX",
+    )
+    sql, params = cur.execute.await_args.args
+    assert "ON CONFLICT (order_public_id, proof_type)" in sql
+    assert params == (42, "ORIGEN", "tgX", None)
+
+    with pytest.raises(ValueError):
+        await drive_outbox_repo.enqueue_drive_upload_tx(
+            conn, order_public_id=42, proof_type="KYC", telegram_file_id="tgX",
+        )
+
+
+@pytest.mark.asyncio
+async def test_enqueue_tx_failure_rolls_back_savepoint_without_raising():
+    cur = AsyncMock()
+    cur.execute.side_effect = RuntimeError("outbox caído")
+    conn = _fake_conn(cur)
+    ok = await drive_outbox_repo.enqueue_drive_upload_tx(
+        conn, order_public_id=42, proof_type="PAGO", telegram_file_id="tgX",
+    )
+    assert ok is False
+    assert conn.savepoint.exc is RuntimeError   # el savepoint vio la excepción -> ROLLBACK TO
@@ -0,0 +1,60 @@
+from decimal import Decimal
+from types import MappingProxyType
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.config import dynamic_settings
+from src.config.dynamic_settings import CommissionTable, DynamicConfig, resolve_commission_pct
+
+CFG = {
+    "commission_routes": {"CHILE_VENEZUELA": 0.02, "PERU_USA": "bad"},
+    "cash_delivery": {"zelle_usdt_cost": 1.03, "margin_cash_zelle": 12.0, "margin_cash_general": 80.0},
+    "margin_route_usa_venez": {"percent": 0.08},
+    "margin_dest_venez": {"percent": 0.05},
+    "margin_origin_peru": {"percent": 0.04},
+    "margin_default": {"percent": 0.07},
+}
+
+
+def test_resolve_follows_hierarchy_and_clamps():
+    assert resolve_commission_pct(CFG, "chile", "venezuela") == Decimal("0.02")       # ruta específica
+    assert resolve_commission_pct(CFG, "USA", "VENEZUELA_CASH") == Decimal("0.12")    # efectivo Zelle
+    assert resolve_commission_pct(CFG, "PERU", "VENEZUELA_CASH") == Decimal("0.50")   # 80% acotado
+    assert resolve_commission_pct(CFG, "USA", "VENEZUELA") == Decimal("0.08")
+    assert resolve_commission_pct(CFG, "MEXICO", "VENEZUELA") == Decimal("0.05")
+    assert resolve_commission_pct(CFG, "PERU", "USA") == Decimal("0.04")              # ruta inválida -> origen
+    assert resolve_commission_pct(CFG, "MEXICO", "CHILE") == Decimal("0.07")
+
+
+def test_resolve_falls_back_to_static_settings():
+    s = dynamic_settings.static_settings
+    assert resolve_commission_pct({}, "USA", "VENEZUELA") == Decimal(str(s.COMMISSION_USA_TO_VENEZUELA))
+    assert resolve_commission_pct({}, "CHILE", "PERU") == Decimal(str(s.COMMISSION_DEFAULT))
+    assert resolve_commission_pct({"margin_origin_chile": {"percent": 0}}, "CHILE", "PERU") == Decimal("0.0")
+
+
+def test_table_matrix_covers_all_pairs_plus_cash():
+    table = CommissionTable(CFG, ["CHILE", "USA", "VENEZUELA"])
+    matrix = table.matrix()
+    assert len(matrix) == 3 * 2 + 3
+    assert matrix[("CHILE", "VENEZUELA")] == Decimal("0.02")
+    assert table.get("usa", "venezuela_cash") == Decimal("0.12")
+    assert table.get("ARGENTINA", "CHILE") == Decimal("0.07")  # fuera de la tabla: se resuelve igual
+
+
+@pytest.mark.asyncio
+async def test_table_recompiles_only_when_commission_settings_change():
+    cfg1 = MappingProxyType(dict(CFG))
+    cfg2 = MappingProxyType({**CFG, "profit_split": {"sponsor": 0.2}})           # cambio ajeno
+    cfg3 = MappingProxyType({**CFG, "margin_default": {"percent": 0.09}})        # cambio relevante
+    config = DynamicConfig()
+    with patch.object(dynamic_settings, "get_settings_map", AsyncMock(side_effect=[cfg1, cfg1, cfg2, cfg3])):
+        t1 = await config.commission_table()
+        assert await config.commission_table() is t1
+        assert await config.commission_table() is t1
+        t3 = await config.commission_table()
+
+    assert t3 is not t1
+    assert config.commission_compiles == 2
+    assert t3.get("MEXICO", "CHILE") == Decimal("0.09")
@@ -0,0 +1,77 @@
+import datetime
+import threading
+from unittest.mock import MagicMock, patch
+
+from src.utils import google_drive
+
+
+def _creds(expiry=None, token="tok"):
+    creds = MagicMock()
+    creds.token = token
+    creds.expiry = expiry
+
+    def _refresh(request):
+        creds.token = "fresh"
+        creds.expiry = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(hours=1)
+
+    creds.refresh.side_effect = _refresh
+    return creds
+
+
+def test_credentials_parsed_once_and_service_built_once_per_thread(monkeypatch):
+    monkeypatch.setenv("GOOGLE_CREDENTIALS_JSON", '{"type": "service_account"}')
+    manager = google_drive.DriveClientManager()
+    creds = _creds()
+    with (
+        patch.object(google_drive.Credentials, "from_service_account_info", return_value=creds) as parse,
+        patch.object(google_drive, "build", side_effect=lambda *a, **k: object()) as build,
+    ):
+        first = manager.service()
+        assert manager.service() is first
+
+        other = []
+        t = threading.Thread(target=lambda: other.append(manager.service()))
+        t.start()
+        t.join()
+
+    assert other[0] is not first
+    assert parse.call_count == 1
+    assert build.call_count == 2
+    assert creds.refresh.call_count == 1  # token inicial; luego vigente
+    assert manager.stats()["services_built"] == 2
+
+
+def test_token_refreshed_proactively_before_expiry(monkeypatch):
+    monkeypatch.setenv("GOOGLE_CREDENTIALS_JSON", "{}")
+    manager = google_drive.DriveClientManager()
+    soon = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(minutes=2)
+    creds = _creds(expiry=soon)
+    with (
+        patch.object(google_drive.Credentials, "from_service_account_info", return_value=creds),
+        patch.object(google_drive, "build", return_value=object()),
+    ):
+        manager.service()
+        manager.service()
+    assert creds.refresh.call_count == 1
+    assert manager.stats()["token_refreshes"] == 1
+
+
+def test_missing_credentials_logged_once(monkeypatch):
+    monkeypatch.delenv("GOOGLE_CREDENTIALS_JSON", raising=False)
+    manager = google_drive.DriveClientManager()
+    with patch.object(google_drive.logger, "error") as err:
+        assert manager.service() is None
+        assert manager.service() is None
+    assert err.call_count == 1
+
+
+def test_folder_ids_resolved_lazily_and_cached(monkeypatch):
+    monkeypatch.setattr(google_drive, "_folder_ids", {"KYC": None, "Origen": None, "Pagos": None, "Perfiles": None})
+    service = MagicMock()
+    service.files.return_value.list.return_value.execute.return_value = {
+        "files": [{"id": f"id-{n}", "name": n} for n in ("KYC", "Origen", "Pagos", "Perfiles")]
+    }
+    with patch.object(google_drive, "get_drive_service", return_value=service):
+        assert google_drive.get_folder_id("Pagos") == "id-Pagos"
+        assert google_drive.get_folder_id("Origen") == "id-Origen"
+    assert service.files.return_value.list.call_count == 1
@@ -0,0 +1,173 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from telegram.error import Forbidden, NetworkError, RetryAfter
+
+from src.db.repositories import notification_outbox_repo
+from src.db.repositories.notification_outbox_repo import Notification
+from src.telegram_app import notification_dispatcher as nd
+from src.telegram_app.notification_dispatcher import NotificationDispatcher
+
+
+def _n(id_, chat_id, text="hola", *, photo=None, markup=None, attempts=1):
+    return Notification(id_, chat_id, text, photo, None, markup, False, attempts)
+
+
+def _bot():
+    bot = MagicMock()
+    bot.send_message = AsyncMock()
+    bot.send_photo = AsyncMock()
+    return bot
+
+
+def _repo(batch):
+    return {
+        "claim_due_notifications": AsyncMock(return_value=batch),
+        "mark_notifications_sent": AsyncMock(),
+        "mark_notification_retry": AsyncMock(),
+        "defer_notifications": AsyncMock(),
+    }
+
+
+@pytest.mark.asyncio
+async def test_batch_is_sent_in_order_per_chat_and_marked_once():
+    kb = {"inline_keyboard": [[{"text": "OK", "callback_data": "ord:proc:7"}]]}
+    batch = [_n(1, 10, "a"), _n(2, 20, "b", markup=kb), _n(3, 10, "cap", photo="FILE")]
+    bot = _bot()
+    repo = _repo(batch)
+    d = NotificationDispatcher(rate_per_second=1000, batch_size=50, poll_seconds=1)
+    with patch.multiple(nd, **repo):
+        assert await d.drain_once(bot) == 3
+
+    assert [c.kwargs["chat_id"] for c in bot.send_message.await_args_list] == [10, 20]
+    assert bot.send_message.await_args_list[1].kwargs["reply_markup"].inline_keyboard[0][0].callback_data == "ord:proc:7"
+    bot.send_photo.assert_awaited_once()
+    assert bot.send_photo.await_args.kwargs["caption"] == "cap"
+    (sent,), _ = repo["mark_notifications_sent"].await_args
+    assert sorted(sent) == [1, 2, 3]
+    assert d.stats()["sent"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failure_defers_rest_of_same_chat_only():
+    batch = [_n(1, 10, "a"), _n(2, 10, "b"), _n(3, 20, "c")]
+    bot = _bot()
+
+    async def send(chat_id, text, **kw):
+        if text == "a":
+            raise NetworkError("timeout")
+
+    bot.send_message.side_effect = send
+    repo = _repo(batch)
+    d = NotificationDispatcher(rate_per_second=1000, batch_size=50, poll_seconds=1)
+    with patch.multiple(nd, **repo):
+        await d.drain_once(bot)
+
+    retry = repo["mark_notification_retry"].await_args
+    assert retry.args == (1,) and retry.kwargs["give_up"] is False
+    assert repo["defer_notifications"].await_args.args == ([2],)
+    assert repo["mark_notifications_sent"].await_args.args == ([3],)
+
+
+@pytest.mark.asyncio
+async def test_unreachable_recipients_and_retry_after():
+    batch = [_n(1, 10), _n(2, 10), _n(3, None), _n(4, 30)]
+    bot = _bot()
+
+    async def send(chat_id, text, **kw):
+        if chat_id == 10:
+            raise Forbidden("bot was blocked by the user")
+        if chat_id == 30:
+            raise RetryAfter(2)
+
+    bot.send_message.side_effect = send
+    repo = _repo(batch)
+    d = NotificationDispatcher(rate_per_second=1000, batch_size=50, poll_seconds=1)
+    with patch.multiple(nd, **repo):
+        await d.drain_once(bot)
+
+    gave_up = {c.args[0] for c in repo["mark_notification_retry"].await_args_list if c.kwargs["give_up"]}
+    assert gave_up == {1, 2, 3}
+    deferred = repo["defer_notifications"].await_args
+    assert deferred.args == ([4],) and deferred.kwargs["delay_seconds"] == 2
+    assert d.bucket._paused_until > 0
+    assert repo["mark_notifications_sent"].await_args.args == ([],)
+
+
+@pytest.mark.asyncio
+async def test_notify_wakes_the_worker():
+    d = NotificationDispatcher(rate_per_second=1000, batch_size=50, poll_seconds=60)
+    claim = AsyncMock(return_value=[])
+    with patch.object(nd, "claim_due_notifications", claim):
+        d.start(_bot())
+        await asyncio.sleep(0.01)
+        d.notify()
+        await asyncio.sleep(0.01)
+        await d.stop()
+
+    assert claim.await_count == 2
+    assert d.stats()["running"] is False
+
+
+@pytest.mark.asyncio
+async def test_ids_sent_before_a_chat_error_are_still_marked_sent():
+    batch = [_n(1, 10, "a"), _n(2, 10, "b"), _n(3, 20, "c")]
+    bot = _bot()
+
+    async def send(chat_id, text, **kw):
+        if text == "b":
+            raise NetworkError("timeout")
+
+    bot.send_message.side_effect = send
+    repo = _repo(batch)
+    repo["mark_notification_retry"] = AsyncMock(side_effect=RuntimeError("db caída"))
+    d = NotificationDispatcher(rate_per_second=1000, batch_size=50, poll_seconds=1)
+    with patch.multiple(nd, **repo):
+        await d.drain_once(bot)
+
+    (sent,), _ = repo["mark_notifications_sent"].await_args
+    assert sorted(sent) == [1, 3]          # el 1 salió antes del error del chat 10
+
+
+class _Ctx:
+    def __init__(self, value=None):
+        self.value = value
+        self.exc = None
+
+    async def __aenter__(self):
+        return self.value
+
+    async def __aexit__(self, *exc):
+        self.exc = exc[0]
+        return False
+
+
+def _fake_conn(cur):
+    conn = MagicMock()
+    conn.savepoint = _Ctx()
+    conn.cursor = lambda: _Ctx(cur)
+    conn.transaction = lambda: conn.savepoint
+    return conn
+
+
+@pytest.mark.asyncio
+async def test_enqueue_skips_order_without_operator_instead_of_violating_the_check():
+    cur = AsyncMock()
+    cur.rowcount = 0
+    conn = _fake_conn(cur)
+    ok = await notification_outbox_repo.enqueue_notification_tx(conn, operator_of_order=77, text="hola")
+    sql, params = cur.execute.await_args.args
+    assert "WHERE r.chat_id IS NOT NULL OR r.user_id IS NOT NULL" in sql
+    assert params[-3:] == (None, None, 77)
+    assert ok is False
+
+
+@pytest.mark.asyncio
+async def test_enqueue_failure_is_contained_in_a_savepoint():
+    cur = AsyncMock()
+    cur.execute.side_effect = RuntimeError("outbox caído")
+    conn = _fake_conn(cur)
+    ok = await notification_outbox_repo.enqueue_notification_tx(conn, chat_id=10, text="hola")
+    assert ok is False                                  # no propaga: la orden sigue
+    assert conn.savepoint.exc is RuntimeError           # rollback solo del savepoint
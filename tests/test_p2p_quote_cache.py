@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from src.integrations.p2p_quote_cache import QuoteCache
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_inflight_fetch():
+    cache = QuoteCache(ttl_seconds=60)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return 42
+
+    results = await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(10)))
+
+    assert results == [42] * 10
+    assert calls == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 9
+
+    assert await cache.get_or_fetch("k", fetch) == 42
+    assert calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_serves_stale_value_when_fetch_fails():
+    cache = QuoteCache(ttl_seconds=0.01, max_stale_seconds=60)
+
+    async def ok():
+        return "v1"
+
+    async def boom():
+        raise RuntimeError("binance down")
+
+    assert await cache.get_or_fetch("k", ok) == "v1"
+    await asyncio.sleep(0.02)
+
+    assert await cache.get_or_fetch("k", boom) == "v1"
+    stats = cache.stats()
+    assert stats["stale"] == 1
+    assert stats["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_allow_stale_false_propagates_error():
+    cache = QuoteCache(ttl_seconds=0.01, max_stale_seconds=60)
+
+    async def ok():
+        return "v1"
+
+    async def boom():
+        raise RuntimeError("binance down")
+
+    assert await cache.get_or_fetch("k", ok) == "v1"
+    await asyncio.sleep(0.02)
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_fetch("k", boom, allow_stale=False)
+    assert cache.stats()["stale"] == 0
+
+
+@pytest.mark.asyncio
+async def test_error_without_stale_value_propagates():
+    cache = QuoteCache(ttl_seconds=60, max_stale_seconds=0)
+
+    async def boom():
+        raise RuntimeError("binance down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_fetch("k", boom)
+    assert cache.stats()["inflight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_fetch_is_cancelled_when_its_last_waiter_is_cancelled():
+    cache = QuoteCache(ttl_seconds=60)
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def slow():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "v"
+
+    a = asyncio.create_task(cache.get_or_fetch("k", slow))
+    b = asyncio.create_task(cache.get_or_fetch("k", slow))
+    await started.wait()
+    a.cancel()
+    await asyncio.sleep(0)
+    assert not cancelled.is_set()          # b sigue esperando: la consulta continúa
+    b.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert cache.stats()["inflight"] == 0 and cache.stats()["errors"] == 0
+
+    async def fast():
+        return "nuevo"
+
+    assert await cache.get_or_fetch("k", fast) == "nuevo"   # no hereda la consulta cancelada
@@ -0,0 +1,23 @@
+import io
+
+import pytest
+
+from src.utils import proof_images
+
+
+def test_downscale_skips_non_images_and_small_images():
+    assert proof_images.downscale_image(b"%PDF-1.7 ...", 2048, 85) is None
+    assert proof_images.downscale_image(b"anything", 0, 85) is None
+
+
+def test_downscale_large_photo_to_max_side():
+    Image = pytest.importorskip("PIL.Image")
+    src = io.BytesIO()
+    Image.new("RGB", (4000, 3000), (120, 30, 200)).save(src, format="PNG")
+
+    out = proof_images.downscale_image(src.getvalue(), 1024, 80)
+
+    assert out is not None and len(out) < len(src.getvalue())
+    with Image.open(io.BytesIO(out)) as img:
+        assert img.format == "JPEG"
+        assert max(img.size) == 1024
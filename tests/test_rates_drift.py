@@ -0,0 +1,97 @@
+import asyncio
+import time
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src import rates_drift
+from src.db.repositories.rates_repo import CountryPriceRecord
+from src.integrations.p2p_config import CountryP2PConfig
+
+
+def _cfg(code, fiat):
+    return CountryP2PConfig(
+        country=code, fiat=fiat, buy_methods=["M1"], sell_methods=["M1"], trans_amount=100,
+    )
+
+
+def _saved(code, buy, sell):
+    return CountryPriceRecord(code, code[:3], Decimal(buy), Decimal(sell), "BUY:M1|SELL:M1", Decimal("100"), "binance_p2p", True)
+
+
+@pytest.mark.asyncio
+async def test_check_price_drift_one_query_parallel_quotes_buy_and_sell_report():
+    countries = {c: _cfg(c, c[:3]) for c in ("AAA", "BBB", "CCC", "NEW")}
+    saved = [_saved("AAA", "10", "9"), _saved("BBB", "10", "9"), _saved("CCC", "10", "9")]
+    current_buy = {"AAA": Decimal("10.1"), "BBB": Decimal("10"), "CCC": Decimal("10")}
+    current_sell = {"AAA": Decimal("9"), "BBB": Decimal("9.5"), "CCC": Decimal("9")}
+
+    async def fake_buy(country, method, client=None, allow_stale=True):
+        assert allow_stale is False
+        await asyncio.sleep(0.1)
+        return current_buy[country]
+
+    async def fake_sell(country, method, client=None, allow_stale=True):
+        assert allow_stale is False
+        await asyncio.sleep(0.1)
+        if country == "CCC":
+            raise ValueError("binance down")
+        return current_sell[country]
+
+    load_mock = AsyncMock(return_value=saved)
+    with (
+        patch.object(rates_drift, "COUNTRIES", countries),
+        patch.object(rates_drift, "list_country_prices_full_for_version", load_mock),
+        patch.object(rates_drift, "get_buy_price", side_effect=fake_buy),
+        patch.object(rates_drift, "get_sell_price", side_effect=fake_sell),
+        patch.object(rates_drift.settings, "RATES_FETCH_CONCURRENCY", 8),
+    ):
+        t0 = time.monotonic()
+        report = await rates_drift.check_price_drift(7, Decimal("0.03"), client=object())
+        elapsed = time.monotonic() - t0
+
+    load_mock.assert_awaited_once_with(rate_version_id=7)
+    assert elapsed < 0.5  # 6 consultas de 0.1s en paralelo
+
+    rows = {r.country: r for r in report.countries}
+    assert set(rows) == {"AAA", "BBB", "CCC"}  # NEW no tiene precio guardado
+    assert rows["AAA"].buy_var == Decimal("0.01") and not rows["AAA"].drifted
+    assert rows["BBB"].sell_var > Decimal("0.05") and rows["BBB"].drifted
+    assert rows["CCC"].current_sell is None and rows["CCC"].error and not rows["CCC"].drifted
+    assert report.drifted == ["BBB"]
+    assert report.failed == ["CCC"]
+
+
+def test_build_drift_report_flags_buy_side_at_threshold():
+    report = rates_drift.build_drift_report(
+        1,
+        {"AAA": _saved("AAA", "100", "90")},
+        {"AAA": (Decimal("103"), Decimal("90"), None)},
+        Decimal("0.03"),
+    )
+    assert report.drifted == ["AAA"]
+    assert "DRIFT" in report.countries[0].describe()
+
+
+@pytest.mark.asyncio
+async def test_drift_deadline_does_not_count_time_waiting_for_a_slot():
+    countries = {c: _cfg(c, c[:3]) for c in ("AAA", "BBB", "CCC")}
+    saved = [_saved(c, "10", "9") for c in countries]
+
+    async def quote(country, method, client=None, allow_stale=True):
+        await asyncio.sleep(0.1)
+        return Decimal("10")
+
+    with (
+        patch.object(rates_drift, "COUNTRIES", countries),
+        patch.object(rates_drift, "list_country_prices_full_for_version", AsyncMock(return_value=saved)),
+        patch.object(rates_drift, "get_buy_price", side_effect=quote),
+        patch.object(rates_drift, "get_sell_price", side_effect=quote),
+        patch.object(rates_drift.settings, "RATES_FETCH_CONCURRENCY", 1),
+        patch.object(rates_drift.settings, "RATES_COUNTRY_DEADLINE_SECONDS", 0.25),
+    ):
+        report = await rates_drift.check_price_drift(7, Decimal("0.03"), client=object())
+
+    # 6 consultas de 0.1s en fila (0.6s) con deadline 0.25s: ninguna vence en la cola
+    assert report.failed == []
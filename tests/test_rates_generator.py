@@ -0,0 +1,355 @@
+import asyncio
+import time
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from src import rates_generator
+from src.integrations.p2p_config import CountryP2PConfig
+
+
+def _cfg(code, fiat):
+    return CountryP2PConfig(
+        country=code, fiat=fiat, buy_methods=["M1", "M2"], sell_methods=["M1"], trans_amount=100,
+    )
+
+
+def _flat_commissions(codes, pct=0.1):
+    from src.config.dynamic_settings import CommissionTable
+
+    return CommissionTable({"margin_default": {"percent": pct}}, codes)
+
+
+COUNTRIES = {
+    "AAA": _cfg("AAA", "AAF"),
+    "BBB": _cfg("BBB", "BBF"),
+    "SLOW": _cfg("SLOW", "SLF"),
+}
+
+
+@pytest.mark.asyncio
+async def test_fetch_country_prices_runs_concurrently_and_times_out_slow_country():
+    async def fake_price(country, client, *, trade_type, method):
+        if country == "SLOW":
+            await asyncio.sleep(5)
+        await asyncio.sleep(0.05)
+        return Decimal("10") if trade_type == "BUY" else Decimal("9")
+
+    with (
+        patch.object(rates_generator, "_price_for_method", side_effect=fake_price),
+        patch.object(rates_generator.settings, "RATES_FETCH_CONCURRENCY", 8),
+        patch.object(rates_generator.settings, "RATES_COUNTRY_DEADLINE_SECONDS", 0.3),
+    ):
+        t0 = time.perf_counter()
+        prices, failed, any_unverified = await rates_generator._fetch_country_prices(COUNTRIES, None)
+        elapsed = time.perf_counter() - t0
+
+    assert sorted(prices) == ["AAA", "BBB"]
+    assert failed == ["SLOW"]
+    assert any_unverified is False
+    assert prices["AAA"]["methods_used"] == "BUY:M1|SELL:M1"
+    assert prices["AAA"]["buy"] == Decimal("10")
+    # Acotado por el deadline, no por la suma de países
+    assert elapsed < 1.0
+
+
+@pytest.mark.asyncio
+async def test_fetch_country_prices_respects_concurrency_limit():
+    in_flight = 0
+    peak = 0
+
+    async def fake_price(country, client, *, trade_type, method):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            # el método preferido de BUY va lento: el hedge lanza M2 y también pide cupo
+            await asyncio.sleep(0.2 if (trade_type, method) == ("BUY", "M1") else 0.02)
+        finally:
+            in_flight -= 1
+        return Decimal("1")
+
+    with (
+        patch.object(rates_generator, "_price_for_method", side_effect=fake_price),
+        patch.object(rates_generator.settings, "RATES_FETCH_CONCURRENCY", 2),
+        patch.object(rates_generator.settings, "RATES_COUNTRY_DEADLINE_SECONDS", 5.0),
+        patch.object(rates_generator.settings, "RATES_METHOD_HEDGE_DELAY_SECONDS", 0.01),
+    ):
+        prices, failed, _ = await rates_generator._fetch_country_prices(COUNTRIES, None)
+
+    assert len(prices) == 3 and not failed
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_deadline_does_not_count_time_waiting_for_a_slot():
+    async def fake_price(country, client, *, trade_type, method):
+        await asyncio.sleep(0.1)
+        return Decimal("1")
+
+    with (
+        patch.object(rates_generator, "_price_for_method", side_effect=fake_price),
+        patch.object(rates_generator.settings, "RATES_FETCH_CONCURRENCY", 1),
+        patch.object(rates_generator.settings, "RATES_COUNTRY_DEADLINE_SECONDS", 0.25),
+    ):
+        # 6 consultas en fila de a una (~0.6s): ninguna excede 0.25s una vez con cupo
+        prices, failed, _ = await rates_generator._fetch_country_prices(COUNTRIES, None)
+
+    assert sorted(prices) == ["AAA", "BBB", "SLOW"] and not failed
+
+
+@pytest.mark.asyncio
+async def test_hedged_fallback_races_slow_preferred_method():
+    cancelled = []
+
+    async def fake_price(country, client, *, trade_type, method):
+        if method == "Zelle":
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(method)
+                raise
+        await asyncio.sleep(0.01)
+        return Decimal("1.01")
+
+    with patch.object(rates_generator, "_price_for_method", side_effect=fake_price):
+        t0 = time.perf_counter()
+        price, verified, method = await rates_generator._pick_price_hedged(
+            "USA", None, fiat="USD", trade_type="BUY", methods=["Zelle", "BankofAmerica"], hedge_delay=0.05,
+        )
+        elapsed = time.perf_counter() - t0
+        await asyncio.sleep(0)
+
+    assert (price, verified, method) == (Decimal("1.01"), True, "BankofAmerica")
+    assert elapsed < 1.0
+    assert cancelled == ["Zelle"]
+
+
+@pytest.mark.asyncio
+async def test_hedged_fallback_prefers_first_method_when_fast():
+    launched = []
+
+    async def fake_price(country, client, *, trade_type, method):
+        launched.append(method)
+        return Decimal("36.5")
+
+    with patch.object(rates_generator, "_price_for_method", side_effect=fake_price):
+        res = await rates_generator._pick_price_hedged(
+            "VENEZUELA", None, fiat="VES", trade_type="SELL", methods=["PagoMovil", "Banesco"], hedge_delay=1.0,
+        )
+
+    assert res == (Decimal("36.5"), True, "PagoMovil")
+    assert launched == ["PagoMovil"]
+
+
+@pytest.mark.asyncio
+async def test_hedged_fallback_moves_on_after_failure_and_raises_when_all_fail():
+    async def fake_price(country, client, *, trade_type, method):
+        raise RuntimeError(f"{method} sin anuncios")
+
+    with patch.object(rates_generator, "_price_for_method", side_effect=fake_price):
+        with pytest.raises(RuntimeError, match="No se pudo obtener BUY"):
+            await rates_generator._pick_price_hedged(
+                "PERU", None, fiat="PEN", trade_type="BUY", methods=["Yape", "BCP"], hedge_delay=10.0,
+            )
+
+
+@pytest.mark.asyncio
+async def test_generate_rates_incremental_refreshes_only_drifted_countries():
+    from contextlib import asynccontextmanager
+    from unittest.mock import AsyncMock, MagicMock
+
+    from src.db.repositories.rates_repo import CountryPriceRecord, RateVersion
+    from src.rates_matrix import CashDeliveryParams, compute_route_matrix
+
+    # DROPPED ya no está en COUNTRIES: no se arrastra
+    previous = [
+        CountryPriceRecord(c, c[:3], Decimal("10"), Decimal("9"), "BUY:x|SELL:x", Decimal("1"), "binance_p2p", True)
+        for c in ("CHILE", "DROPPED", "PERU", "USA")
+    ]
+    rv = RateVersion(41, "auto_9am", None, None, None, None, True)
+    codes = ["CHILE", "PERU", "USA"]
+    cash_cfg = {"zelle_usdt_cost": Decimal("1.03"), "margin_cash_zelle": Decimal("0.12"), "margin_cash_general": Decimal("0.10")}
+    old_routes = compute_route_matrix(
+        {c: Decimal("10") for c in codes},
+        {c: Decimal("9") for c in codes},
+        {(o, d): Decimal("0.1") for o in codes for d in codes if o != d},
+        cash=CashDeliveryParams.from_config(cash_cfg),
+        codes=codes,
+    )
+    fetched = {
+        "PERU": {"fiat": "PEN", "buy": Decimal("12"), "sell": Decimal("11"), "is_verified": True,
+                 "methods_used": "BUY:Yape|SELL:Yape", "amount_ref": Decimal("150")},
+    }
+    fetch_mock = AsyncMock(return_value=(fetched, [], False))
+    write_mock = AsyncMock(return_value=42)
+
+    @asynccontextmanager
+    async def fake_conn():
+        conn = MagicMock()
+
+        @asynccontextmanager
+        async def tx():
+            yield
+
+        conn.transaction = tx
+        yield conn
+
+    countries = {c: _cfg(c, c[:3]) for c in ("CHILE", "PERU", "USA")}
+    with (
+        patch.object(rates_generator, "COUNTRIES", countries),
+        patch.object(rates_generator, "get_latest_active_rate_version", AsyncMock(return_value=rv)),
+        patch.object(rates_generator, "list_country_prices_full_for_version", AsyncMock(return_value=previous)),
+        patch.object(rates_generator, "_fetch_country_prices", fetch_mock),
+        patch.object(rates_generator.dynamic_config, "commission_table", AsyncMock(return_value=_flat_commissions(countries))),
+        patch.object(rates_generator.dynamic_config, "get_cash_delivery_config", AsyncMock(return_value=cash_cfg)),
+        patch.object(rates_generator, "get_async_conn", fake_conn),
+        patch.object(rates_generator, "write_rate_version_tx", write_mock),
+        patch.object(rates_generator, "list_route_rates_all_for_version", AsyncMock(return_value=old_routes)),
+        patch.object(rates_generator, "refresh_rates_snapshot", AsyncMock()),
+        patch.object(rates_generator.dynamic_config, "get_rates_diff_epsilon", AsyncMock(return_value={"default": Decimal("0.0005")})),
+    ):
+        res = await rates_generator.generate_rates_incremental(countries=["PERU"], kind="auto_30m", reason="t")
+
+    assert list(fetch_mock.await_args.args[0]) == ["PERU"]
+    assert res.version_id == 42
+    assert res.countries_ok == ["PERU"]
+    assert all("PERU" in pair for pair in res.routes_changed)
+    assert ("PERU", "VENEZUELA_CASH") in res.routes_changed
+    assert len(res.routes_changed) == 2 * 2 + 1
+
+    kwargs = write_mock.await_args.kwargs
+    written = {p.country: p for p in kwargs["prices"]}
+    assert sorted(written) == codes
+    assert written["PERU"].buy_price == Decimal("12")
+    assert written["CHILE"].buy_price == Decimal("10")
+    # todas las rutas se escriben recalculadas (3×2 + 3 de efectivo)
+    assert len(kwargs["routes"]) == 3 * 2 + 3
+
+
+@pytest.mark.asyncio
+async def test_generate_rates_incremental_skips_version_when_nothing_material_changed():
+    from contextlib import asynccontextmanager
+    from unittest.mock import AsyncMock, MagicMock
+
+    from src.db.repositories.rates_repo import CountryPriceRecord, RateVersion
+    from src.rates_matrix import CashDeliveryParams, compute_route_matrix
+
+    previous = [
+        CountryPriceRecord(c, c[:3], Decimal("10"), Decimal("9"), "BUY:x|SELL:x", Decimal("1"), "binance_p2p", True)
+        for c in ("CHILE", "PERU", "USA")
+    ]
+    rv = RateVersion(41, "auto_30m", None, None, None, None, True)
+    # PERU se movió 0.001% (por debajo del epsilon por defecto)
+    fetched = {
+        "PERU": {"fiat": "PEN", "buy": Decimal("9.9999"), "sell": Decimal("9"), "is_verified": True,
+                 "methods_used": "BUY:Yape|SELL:Yape", "amount_ref": Decimal("150")},
+    }
+    codes = ["CHILE", "PERU", "USA"]
+    cash_cfg = {"zelle_usdt_cost": Decimal("1.03"), "margin_cash_zelle": Decimal("0.12"), "margin_cash_general": Decimal("0.10")}
+    old_routes = compute_route_matrix(
+        {c: Decimal("10") for c in codes},
+        {c: Decimal("9") for c in codes},
+        {(o, d): Decimal("0.1") for o in codes for d in codes if o != d},
+        cash=CashDeliveryParams.from_config(cash_cfg),
+        codes=codes,
+    )
+    write_mock = AsyncMock(return_value=42)
+    touch_mock = AsyncMock()
+
+    @asynccontextmanager
+    async def fake_conn():
+        conn = MagicMock()
+
+        @asynccontextmanager
+        async def tx():
+            yield
+
+        conn.transaction = tx
+        yield conn
+
+    with (
+        patch.object(rates_generator, "COUNTRIES", {c: _cfg(c, c[:3]) for c in codes}),
+        patch.object(rates_generator, "get_latest_active_rate_version", AsyncMock(return_value=rv)),
+        patch.object(rates_generator, "list_country_prices_full_for_version", AsyncMock(return_value=previous)),
+        patch.object(rates_generator, "_fetch_country_prices", AsyncMock(return_value=(fetched, [], False))),
+        patch.object(rates_generator.dynamic_config, "commission_table", AsyncMock(return_value=_flat_commissions(codes))),
+        patch.object(rates_generator.dynamic_config, "get_cash_delivery_config", AsyncMock(return_value=cash_cfg)),
+        patch.object(rates_generator.dynamic_config, "get_rates_diff_epsilon", AsyncMock(return_value={"default": Decimal("0.0005")})),
+        patch.object(rates_generator, "list_route_rates_all_for_version", AsyncMock(return_value=old_routes)),
+        patch.object(rates_generator, "get_async_conn", fake_conn),
+        patch.object(rates_generator, "write_rate_version_tx", write_mock),
+        patch.object(rates_generator, "touch_rate_version_tx", touch_mock),
+        patch.object(rates_generator, "refresh_rates_snapshot", AsyncMock()),
+    ):
+        res = await rates_generator.generate_rates_incremental(countries=["PERU"], kind="auto_30m", reason="t")
+
+    assert res.skipped_unchanged is True
+    assert res.version_id == 41
+    assert res.routes_changed == []
+    write_mock.assert_not_awaited()
+    assert touch_mock.await_args.kwargs["rate_version_id"] == 41
+
+
+@pytest.mark.asyncio
+async def test_generate_rates_incremental_applies_current_commissions_to_every_route():
+    from contextlib import asynccontextmanager
+    from unittest.mock import AsyncMock, MagicMock
+
+    from src.db.repositories.rates_repo import CountryPriceRecord, RateVersion
+    from src.rates_matrix import CashDeliveryParams, compute_route_matrix
+
+    codes = ["CHILE", "PERU", "USA"]
+    previous = [
+        CountryPriceRecord(c, c[:3], Decimal("10"), Decimal("9"), "BUY:x|SELL:x", Decimal("1"), "binance_p2p", True)
+        for c in codes
+    ]
+    rv = RateVersion(41, "auto_9am", None, None, None, None, True)
+    fetched = {  # PERU sin cambio de precio
+        "PERU": {"fiat": "PEN", "buy": Decimal("10"), "sell": Decimal("9"), "is_verified": True,
+                 "methods_used": "BUY:Yape|SELL:Yape", "amount_ref": Decimal("150")},
+    }
+    old_cash = {"zelle_usdt_cost": Decimal("1.03"), "margin_cash_zelle": Decimal("0.12"), "margin_cash_general": Decimal("0.10")}
+    old_routes = compute_route_matrix(
+        {c: Decimal("10") for c in codes},
+        {c: Decimal("9") for c in codes},
+        {(o, d): Decimal("0.1") for o in codes for d in codes if o != d},
+        cash=CashDeliveryParams.from_config(old_cash),
+        codes=codes,
+    )
+    # el admin subió la comisión por defecto y el margen de efectivo general
+    new_cash = {**old_cash, "margin_cash_general": Decimal("0.11")}
+    write_mock = AsyncMock(return_value=42)
+
+    @asynccontextmanager
+    async def fake_conn():
+        conn = MagicMock()
+
+        @asynccontextmanager
+        async def tx():
+            yield
+
+        conn.transaction = tx
+        yield conn
+
+    with (
+        patch.object(rates_generator, "COUNTRIES", {c: _cfg(c, c[:3]) for c in codes}),
+        patch.object(rates_generator, "get_latest_active_rate_version", AsyncMock(return_value=rv)),
+        patch.object(rates_generator, "list_country_prices_full_for_version", AsyncMock(return_value=previous)),
+        patch.object(rates_generator, "_fetch_country_prices", AsyncMock(return_value=(fetched, [], False))),
+        patch.object(rates_generator.dynamic_config, "commission_table", AsyncMock(return_value=_flat_commissions(codes, 0.12))),
+        patch.object(rates_generator.dynamic_config, "get_cash_delivery_config", AsyncMock(return_value=new_cash)),
+        patch.object(rates_generator.dynamic_config, "get_rates_diff_epsilon", AsyncMock(return_value={"default": Decimal("0.0005")})),
+        patch.object(rates_generator, "list_route_rates_all_for_version", AsyncMock(return_value=old_routes)),
+        patch.object(rates_generator, "get_async_conn", fake_conn),
+        patch.object(rates_generator, "write_rate_version_tx", write_mock),
+        patch.object(rates_generator, "refresh_rates_snapshot", AsyncMock()),
+    ):
+        res = await rates_generator.generate_rates_incremental(countries=["PERU"], kind="auto_30m", reason="t")
+
+    assert ("CHILE", "USA") in res.routes_changed          # par no refrescado
+    assert ("CHILE", "VENEZUELA_CASH") in res.routes_changed
+    routes = {(r.origin_country, r.dest_country): r for r in write_mock.await_args.kwargs["routes"]}
+    assert routes[("CHILE", "USA")].commission_pct == Decimal("0.12")
+    assert routes[("CHILE", "VENEZUELA_CASH")].commission_pct == Decimal("0.11")
@@ -0,0 +1,110 @@
+from decimal import Decimal
+from itertools import product
+
+from src.db.repositories.rates_repo import RouteRate
+from src.rates_matrix import CASH_DEST, CashDeliveryParams, compute_cash_route, compute_route_matrix, diff_route_matrix
+
+BUY = {"CHILE": Decimal("951.5"), "USA": Decimal("1.035"), "VENEZUELA": Decimal("36.81")}
+SELL = {"CHILE": Decimal("944.2"), "USA": Decimal("1.001"), "VENEZUELA": Decimal("36.40")}
+CASH = CashDeliveryParams(Decimal("1.03"), Decimal("0.12"), Decimal("0.10"))
+
+
+def _commissions(codes):
+    return {
+        (o, d): (Decimal("0.06") if d == "VENEZUELA" else Decimal("0.10"))
+        for o, d in product(codes, codes)
+        if o != d
+    }
+
+
+def test_matrix_matches_per_pair_loop_exactly():
+    codes = sorted(BUY)
+    comm = _commissions(codes)
+
+    routes = compute_route_matrix(BUY, SELL, comm, codes=codes)
+
+    expected = []
+    for o, d in product(codes, codes):
+        if o == d:
+            continue
+        base = SELL[d] / BUY[o]
+        expected.append((o, d, base, base * (Decimal("1.0") - comm[(o, d)])))
+
+    assert [(r.origin_country, r.dest_country, r.rate_base, r.rate_client) for r in routes] == expected
+
+
+def test_matrix_appends_cash_route_per_origin():
+    codes = sorted(BUY)
+    routes = compute_route_matrix(BUY, SELL, _commissions(codes), cash=CASH, codes=codes)
+
+    cash_routes = {r.origin_country: r for r in routes if r.dest_country == CASH_DEST}
+    assert set(cash_routes) == set(codes)
+
+    usa = cash_routes["USA"]
+    assert usa.buy_origin == Decimal("1.03")
+    assert usa.commission_pct == Decimal("0.12")
+    assert usa.rate_client == (Decimal("1") / Decimal("1.03")) * Decimal("0.88")
+
+    chile = cash_routes["CHILE"]
+    assert chile.buy_origin == BUY["CHILE"]
+    assert chile.sell_dest == Decimal("1")
+    assert chile.rate_client == (Decimal("1") / BUY["CHILE"]) * Decimal("0.90")
+
+
+def test_bad_cash_route_for_one_origin_does_not_abort_the_matrix():
+    codes = sorted(BUY)
+    broken = CashDeliveryParams(Decimal("0"), Decimal("0.12"), Decimal("0.10"))  # USA: 1/0
+
+    routes = compute_route_matrix(BUY, SELL, _commissions(codes), cash=broken, codes=codes)
+
+    assert {r.origin_country for r in routes if r.dest_country == CASH_DEST} == {"CHILE", "VENEZUELA"}
+    assert len([r for r in routes if r.dest_country != CASH_DEST]) == 6
+
+
+def test_compute_cash_route_matches_matrix_cash_route():
+    routes = compute_route_matrix(BUY, SELL, _commissions(sorted(BUY)), cash=CASH)
+    from_matrix = next(r for r in routes if r.origin_country == "VENEZUELA" and r.dest_country == CASH_DEST)
+    assert compute_cash_route("VENEZUELA", BUY["VENEZUELA"], CASH) == from_matrix
+
+
+def test_matrix_only_recomputes_routes_touching_changed_countries():
+    codes = sorted(BUY)
+    full = compute_route_matrix(BUY, SELL, _commissions(codes), cash=CASH, codes=codes)
+    partial = compute_route_matrix(BUY, SELL, _commissions(codes), cash=CASH, codes=codes, only={"CHILE"})
+
+    touching = [r for r in full if "CHILE" in (r.origin_country, r.dest_country)]
+    assert partial == touching
+
+
+def _route(o, d, rate_client, pct="0.10"):
+    return RouteRate(o, d, Decimal(pct), Decimal("1"), Decimal("1"), rate_client, rate_client)
+
+
+def test_diff_ignores_moves_below_epsilon_and_display_precision():
+    eps = {"default": Decimal("0.0005")}
+    old = [_route("CHILE", "VENEZUELA", Decimal("0.0385"))]
+    new = [_route("CHILE", "VENEZUELA", Decimal("0.03850001"))]
+    assert diff_route_matrix(new, old, epsilon=eps) == []
+
+
+def test_diff_flags_display_change_commission_change_and_missing_routes():
+    eps = {"default": Decimal("0.5")}
+    old = [
+        _route("USA", "VENEZUELA", Decimal("36.40")),
+        _route("USA", "CHILE", Decimal("900")),
+        _route("CHILE", "USA", Decimal("0.00105")),
+    ]
+    new = [
+        _route("USA", "VENEZUELA", Decimal("36.41")),           # cambia lo que ve el cliente
+        _route("USA", "CHILE", Decimal("900"), pct="0.08"),     # cambia comisión
+        _route("USA", "PERU", Decimal("3.7")),                  # ruta nueva
+    ]
+    changed = diff_route_matrix(new, old, epsilon=eps)
+    assert changed == [("USA", "VENEZUELA"), ("USA", "CHILE"), ("USA", "PERU"), ("CHILE", "USA")]
+
+
+def test_diff_uses_per_route_epsilon():
+    old = [_route("USA", "VENEZUELA", Decimal("36.4000")), _route("USA", "CHILE", Decimal("900.000"))]
+    new = [_route("USA", "VENEZUELA", Decimal("36.4010")), _route("USA", "CHILE", Decimal("900.001"))]
+    eps = {"default": Decimal("0.001"), "USA_VENEZUELA": Decimal("0.00001")}
+    assert diff_route_matrix(new, old, epsilon=eps) == [("USA", "VENEZUELA")]
@@ -0,0 +1,67 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.db.repositories import rates_repo
+
+
+def _fake_conn():
+    cur = AsyncMock()
+    cur.fetchone.return_value = (77,)
+    copy = AsyncMock()
+    copies = []
+
+    @asynccontextmanager
+    async def _copy(sql):
+        copies.append(sql)
+        yield copy
+
+    cur.copy = _copy
+
+    @asynccontextmanager
+    async def _cursor():
+        yield cur
+
+    conn = MagicMock()
+    conn.cursor = _cursor
+    return conn, cur, copy, copies
+
+
+@pytest.mark.asyncio
+async def test_write_rate_version_tx_uses_copy_and_switches_active_last():
+    conn, cur, copy, copies = _fake_conn()
+
+    prices = [
+        rates_repo.CountryPriceRecord("CHILE", "CLP", Decimal("950"), Decimal("940"), "BUY:x|SELL:y", Decimal("95000"), "binance_p2p", True),
+        rates_repo.CountryPriceRecord("PERU", "PEN", Decimal("3.8"), Decimal("3.7"), "BUY:x|SELL:y", Decimal("150"), "binance_p2p", False),
+    ]
+    routes = [
+        rates_repo.RouteRate("CHILE", "PERU", Decimal("0.1"), Decimal("950"), Decimal("3.7"), Decimal("0.0039"), Decimal("0.0035")),
+        rates_repo.RouteRate("PERU", "CHILE", Decimal("0.1"), Decimal("3.8"), Decimal("940"), Decimal("247"), Decimal("222")),
+        rates_repo.RouteRate("PERU", "VENEZUELA_CASH", Decimal("0.1"), Decimal("3.8"), Decimal("1"), Decimal("0.26"), Decimal("0.23")),
+    ]
+
+    version_id = await rates_repo.write_rate_version_tx(
+        conn,
+        kind="auto_30m",
+        reason="test",
+        effective_from=datetime.now(timezone.utc),
+        prices=prices,
+        routes=routes,
+    )
+
+    assert version_id == 77
+    assert len(copies) == 2
+    assert "p2p_country_prices" in copies[0] and "route_rates" in copies[1]
+    assert copy.write_row.await_count == len(prices) + len(routes)
+    assert all(c.args[0][0] == 77 for c in copy.write_row.await_args_list)
+
+    sqls = [c.args[0] for c in cur.execute.await_args_list]
+    assert "INSERT INTO rate_versions" in sqls[0] and "false" in sqls[0]
+    assert "UPDATE rate_versions" in sqls[-2]
+    assert "pg_notify" in sqls[-1]
+    assert cur.execute.await_args_list[-1].args[1] == (rates_repo.RATE_VERSION_CHANNEL, "77")
+    assert "INSERT INTO route_rates" not in " ".join(sqls)
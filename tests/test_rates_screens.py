@@ -0,0 +1,59 @@
+from decimal import Decimal
+from itertools import product
+from types import MappingProxyType
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.db.repositories.rates_repo import RateVersion, RouteRate
+from src.rates_snapshot import RatesSnapshot
+from src.telegram_app.ui import rates_screens
+from src.rates_matrix import format_rate_no_noise
+from src.telegram_app.ui.routes_popular import POPULAR_ROUTES, route_label
+
+CODES = ["ARGENTINA", "CHILE", "COLOMBIA", "MEXICO", "PERU", "USA", "VENEZUELA"]
+
+
+def _snapshot(version_id=1):
+    routes = {}
+    for i, (o, d) in enumerate(product(CODES, CODES)):
+        if o == d:
+            continue
+        rate = Decimal("0.0123") * (i + 1)
+        routes[(o, d)] = RouteRate(o, d, Decimal("0.1"), Decimal("1"), Decimal("1"), rate, rate)
+    rv = RateVersion(version_id, "auto_9am", None, None, None, None, True)
+    return RatesSnapshot(rv, MappingProxyType(routes), MappingProxyType({}))
+
+
+def test_screens_match_per_tap_rendering():
+    snap = _snapshot()
+    screens = rates_screens.build_rates_screens(snap)
+
+    popular = [f"{route_label(o, d)}\nTasa: {format_rate_no_noise(snap.routes[(o, d)].rate_client)}"
+               for (o, d) in POPULAR_ROUTES if (o, d) in snap.routes]
+    assert screens.popular.text == "📈 *Tasas de hoy* (Rutas populares)\n\n" + "\n\n".join(popular)
+    assert screens.popular_with_cta.text.startswith(screens.popular.text)
+
+    usa = screens.origin("USA").text
+    assert usa.startswith("🌎 *Tasas desde USA*")
+    assert usa.count("Tasa:") == len(CODES) - 1
+
+    rest = [p for p in snap.routes if p not in set(POPULAR_ROUTES)]
+    assert sum(s.text.count("Tasa:") for s in screens.pages) == len(rest)
+    assert len(screens.pages) == -(-len(rest) // rates_screens.PAGE_SIZE)
+    assert "Página 1" in screens.page(1).text
+    assert screens.page(99).text.endswith("No hay rutas.")
+
+
+@pytest.mark.asyncio
+async def test_cache_rebuilds_only_on_version_change():
+    cache = rates_screens.RatesScreenCache()
+    first, second = _snapshot(1), _snapshot(2)
+    with patch.object(rates_screens, "get_rates_snapshot", AsyncMock(side_effect=[first, first, first, second])):
+        a = await cache.get()
+        assert await cache.get() is a
+        assert await cache.get() is a
+        b = await cache.get()
+
+    assert b.version_id == 2
+    assert cache.stats() == {"version_id": 2, "hits": 2, "misses": 2, "hit_rate": 0.5}
@@ -0,0 +1,64 @@
+import asyncio
+from decimal import Decimal
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src import rates_snapshot
+from src.db.repositories.rates_repo import CountryPriceRecord, RateVersion, RouteRate
+
+
+def _rv(version_id, effective_from="t0"):
+    return RateVersion(version_id, "auto_30m", None, None, effective_from, None, True)
+
+
+def _route(o, d, rate):
+    return RouteRate(o, d, Decimal("0.1"), Decimal("1"), Decimal("1"), Decimal(rate), Decimal(rate))
+
+
+ROUTES = [_route("USA", "VENEZUELA", "36.4"), _route("USA", "CHILE", "900"), _route("CHILE", "VENEZUELA", "0.038")]
+PRICES = [CountryPriceRecord("CHILE", "CLP", Decimal("950"), Decimal("940"), "", Decimal("1"), "binance_p2p", True)]
+
+
+@pytest.mark.asyncio
+async def test_snapshot_loads_once_and_serves_reads_without_db():
+    store = rates_snapshot.RatesSnapshotStore(poll_seconds=60)
+    version_mock = AsyncMock(return_value=_rv(5))
+    routes_mock = AsyncMock(return_value=ROUTES)
+    with (
+        patch.object(rates_snapshot, "get_latest_active_rate_version", version_mock),
+        patch.object(rates_snapshot, "list_route_rates_all_for_version", routes_mock),
+        patch.object(rates_snapshot, "list_country_prices_full_for_version", AsyncMock(return_value=PRICES)),
+    ):
+        snaps = await asyncio.gather(*(store.get() for _ in range(10)))
+        snap = await store.get()
+
+    assert all(s is snap for s in snaps)
+    assert version_mock.await_count == 1
+    assert routes_mock.await_count == 1
+    assert snap.version_id == 5
+    assert snap.route("USA", "CHILE").rate_client == Decimal("900")
+    assert [r.dest_country for r in snap.routes_by_origin("USA")] == ["CHILE", "VENEZUELA"]
+    assert [r.origin_country for r in snap.routes_for([("CHILE", "VENEZUELA"), ("PERU", "USA"), ("USA", "VENEZUELA")])] == ["CHILE", "USA"]
+    assert snap.country_price("CHILE").sell_price == Decimal("940")
+
+
+@pytest.mark.asyncio
+async def test_refresh_swaps_only_when_active_version_changes():
+    store = rates_snapshot.RatesSnapshotStore(poll_seconds=60)
+    routes_mock = AsyncMock(return_value=ROUTES)
+    version_mock = AsyncMock(side_effect=[_rv(5), _rv(5, "t1"), _rv(6)])
+    with (
+        patch.object(rates_snapshot, "get_latest_active_rate_version", version_mock),
+        patch.object(rates_snapshot, "list_route_rates_all_for_version", routes_mock),
+        patch.object(rates_snapshot, "list_country_prices_full_for_version", AsyncMock(return_value=PRICES)),
+    ):
+        first = await store.refresh()
+        touched = await store.refresh()
+        switched = await store.refresh()
+
+    assert touched.routes is first.routes           # misma versión: no recarga rutas
+    assert touched.version.effective_from == "t1"
+    assert switched.version_id == 6
+    assert routes_mock.await_count == 2
+    assert store.stats()["loads"] == 2
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.db import settings_store
+
+
+def _fake_conn(rows_seq, delay=0.0):
+    """get_async_conn falso que devuelve `rows_seq` en cada SELECT (cuenta las queries)."""
+    calls = {"n": 0}
+
+    @asynccontextmanager
+    async def fake():
+        cur = MagicMock()
+
+        async def execute(sql, params=None):
+            calls["n"] += 1
+            await asyncio.sleep(delay)
+
+        cur.execute = execute
+        cur.fetchall = AsyncMock(side_effect=lambda: rows_seq[min(calls["n"], len(rows_seq)) - 1])
+
+        @asynccontextmanager
+        async def cursor():
+            yield cur
+
+        conn = MagicMock()
+        conn.cursor = cursor
+        yield conn
+
+    return fake, calls
+
+
+@pytest.mark.asyncio
+async def test_cold_start_loads_whole_table_once_for_concurrent_readers():
+    store = settings_store.SettingsStore(ttl_seconds=60)
+    rows = [[("margin_default", {"percent": 0.05}), ("commission_routes", '{"USA_VENEZUELA": 0.08}'), ("bad", "x")]]
+    fake, calls = _fake_conn(rows, delay=0.05)
+
+    with patch.object(settings_store, "get_async_conn", fake):
+        results = await asyncio.gather(
+            *(store.get(k) for k in ("margin_default", "commission_routes", "bad", "missing") * 5)
+        )
+
+    assert calls["n"] == 1
+    assert results[:4] == [{"percent": 0.05}, {"USA_VENEZUELA": 0.08}, None, None]
+    assert store.stats()["refreshes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_map_is_served_while_refreshing_in_background():
+    store = settings_store.SettingsStore(ttl_seconds=60)
+    fake, calls = _fake_conn([[("k", {"v": 1})], [("k", {"v": 2})]], delay=0.05)
+
+    with patch.object(settings_store, "get_async_conn", fake):
+        assert await store.get("k") == {"v": 1}
+        store._loaded_at = time.monotonic() - 120  # vencido
+
+        t0 = time.monotonic()
+        assert await store.get("k") == {"v": 1}     # no espera a la DB
+        assert time.monotonic() - t0 < 0.03
+        await store._inflight
+        assert await store.get("k") == {"v": 2}
+
+    assert calls["n"] == 2
+
+
+@pytest.mark.asyncio
+async def test_db_failure_keeps_last_known_map():
+    store = settings_store.SettingsStore(ttl_seconds=60)
+    fake, _ = _fake_conn([[("k", {"v": 1})]])
+
+    @asynccontextmanager
+    async def broken():
+        raise RuntimeError("db down")
+        yield
+
+    with patch.object(settings_store, "get_async_conn", fake):
+        await store.get("k")
+    with patch.object(settings_store, "get_async_conn", broken):
+        await store.refresh()
+        assert await store.get("k") == {"v": 1}
+
+    assert store.stats()["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_forced_refresh_during_inflight_load_reloads_after_it():
+    store = settings_store.SettingsStore(ttl_seconds=60)
+    # la 1ª query empezó antes del COMMIT (v=1); la NOTIFY llega mientras corre
+    fake, calls = _fake_conn([[("k", {"v": 1})], [("k", {"v": 2})]], delay=0.05)
+
+    with patch.object(settings_store, "get_async_conn", fake):
+        first = store.refresh()
+        await asyncio.sleep(0.01)
+        forced = store.refresh(force=True)
+        assert forced is first                  # mismo future: resuelve tras la 2ª carga
+        await forced
+        assert await store.get("k") == {"v": 2}
+
+        await store.refresh()                   # sin force no se repite
+    assert calls["n"] == 3
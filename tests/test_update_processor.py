@@ -0,0 +1,96 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from telegram import Update
+
+from src.telegram_app.update_processor import ChatOrderedUpdateProcessor, chat_key
+
+
+def _update(chat_id):
+    u = MagicMock(spec=Update)
+    u.effective_chat = MagicMock(id=chat_id)
+    u.effective_user = MagicMock(id=chat_id)
+    return u
+
+
+@pytest.mark.asyncio
+async def test_chats_run_in_parallel_but_each_chat_stays_ordered():
+    proc = ChatOrderedUpdateProcessor(8)
+    log = []
+
+    async def handler(chat, n, delay):
+        log.append((chat, n, "start"))
+        await asyncio.sleep(delay)
+        log.append((chat, n, "end"))
+
+    # el chat 1 tiene un handler lento (p. ej. subida de comprobante)
+    jobs = [(1, 0, 0.2), (1, 1, 0.0), (2, 0, 0.01), (3, 0, 0.01), (2, 1, 0.01)]
+    t0 = time.monotonic()
+    tasks = [asyncio.create_task(proc.process_update(_update(c), handler(c, n, d))) for c, n, d in jobs]
+    await asyncio.sleep(0.05)
+    assert proc.stats()["max_chat_backlog"] == 2
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - t0
+
+    assert elapsed < 0.3
+    # los chats 2 y 3 terminaron sin esperar al handler lento del chat 1
+    assert log.index((2, 1, "end")) < log.index((1, 0, "end"))
+    assert log.index((3, 0, "end")) < log.index((1, 0, "end"))
+    # dentro de cada chat: estricto orden de llegada, sin solaparse
+    assert log.index((1, 0, "end")) < log.index((1, 1, "start"))
+    assert log.index((2, 0, "end")) < log.index((2, 1, "start"))
+
+    stats = proc.stats()
+    assert stats["processed"] == 5 and stats["running"] == 0 and stats["waiting"] == 0
+    assert stats["chats_active"] == 0                  # no quedan locks por chat
+    assert stats["wait_max_ms"] >= 190                 # (1, 1) esperó al lento
+
+
+@pytest.mark.asyncio
+async def test_global_limit_applies_and_queued_chats_do_not_hold_slots():
+    proc = ChatOrderedUpdateProcessor(2)
+    running = peak = 0
+
+    async def handler():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    # 5 updates del mismo chat + 4 de chats distintos
+    ups = [_update(1) for _ in range(5)] + [_update(c) for c in range(10, 14)]
+    t0 = time.monotonic()
+    await asyncio.gather(*(proc.process_update(u, handler()) for u in ups))
+    assert peak == 2
+    # el chat 1 (5 x 20ms secuenciales) usa un cupo; el otro atiende a los demás
+    assert time.monotonic() - t0 < 0.16
+
+
+def test_chat_key_falls_back_to_user():
+    u = MagicMock(spec=Update)
+    u.effective_chat = None
+    u.effective_user = MagicMock(id=7)
+    assert chat_key(u) == 7
+    assert chat_key(object()) is None
+
+
+@pytest.mark.asyncio
+async def test_ordering_lives_in_do_process_update_and_ptb_semaphore_bounds_admission():
+    assert "process_update" not in ChatOrderedUpdateProcessor.__dict__   # @final en PTB
+    proc = ChatOrderedUpdateProcessor(1, max_queued=2)
+    assert proc.max_running == 1 and proc.max_concurrent_updates == 3
+    gate = asyncio.Event()
+
+    async def handler():
+        await gate.wait()
+
+    tasks = [asyncio.create_task(proc.process_update(_update(c), handler())) for c in range(5)]
+    await asyncio.sleep(0.01)
+    stats = proc.stats()
+    assert stats["running"] == 1 and stats["waiting"] == 2     # el resto espera la admisión de PTB
+    gate.set()
+    await asyncio.gather(*tasks)
+    assert proc.stats()["processed"] == 5
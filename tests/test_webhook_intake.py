@@ -0,0 +1,92 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.telegram_app.update_processor import ChatOrderedUpdateProcessor
+from src.telegram_app.webhook_intake import WebhookIntake
+
+
+def _body(update_id, chat_id=1):
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": "hola",
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "x"},
+        },
+    }).encode()
+
+
+def _app():
+    app = MagicMock()
+    app.bot = None
+    app.update_queue = asyncio.Queue()
+    app.update_processor = ChatOrderedUpdateProcessor(4)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_duplicates_are_acked_and_dropped_and_order_is_kept():
+    app = _app()
+    intake = WebhookIntake(max_pending=100, dedupe_seconds=60)
+    intake.start(app)
+    try:
+        assert intake.accept(_body(1)) == 200
+        assert intake.accept(_body(2)) == 200
+        assert intake.accept(_body(1)) == 200          # re-entrega de Telegram
+        assert intake.accept(b"{not json") == 400
+        assert intake.accept(b'{"foo": 1}') == 400
+        await asyncio.sleep(0.01)
+    finally:
+        await intake.stop()
+
+    got = [app.update_queue.get_nowait().update_id for _ in range(app.update_queue.qsize())]
+    assert got == [1, 2]
+    stats = intake.stats()
+    assert stats["accepted"] == 2 and stats["duplicates"] == 1 and stats["invalid"] == 2
+
+
+@pytest.mark.asyncio
+async def test_overload_returns_503_without_marking_update_as_seen():
+    app = _app()
+    intake = WebhookIntake(max_pending=2, dedupe_seconds=60)
+    intake._app = app                                   # sin consumidor: todo queda en cola
+    assert intake.accept(_body(1)) == 200
+    assert intake.accept(_body(2)) == 200
+    assert intake.accept(_body(3)) == 503
+    assert intake.stats()["overloaded"] == 1
+
+    intake._queue.get_nowait()                          # se liberó lugar
+    assert intake.accept(_body(3)) == 200               # la re-entrega sí se acepta
+
+
+@pytest.mark.asyncio
+async def test_receipt_to_handler_start_is_measured_through_processor():
+    app = _app()
+    intake = WebhookIntake(max_pending=100, dedupe_seconds=60)
+    intake.start(app)
+    try:
+        intake.accept(_body(7))
+        update = await asyncio.wait_for(app.update_queue.get(), 1)
+
+        async def handler():
+            return None
+
+        await asyncio.sleep(0.02)
+        await app.update_processor.process_update(update, handler())
+    finally:
+        await intake.stop()
+    assert intake.stats()["receipt_to_start_max_ms"] >= 15
+
+
+@pytest.mark.asyncio
+async def test_stop_rejects_new_updates_and_hands_queued_ones_to_ptb():
+    app = _app()
+    intake = WebhookIntake(max_pending=100, dedupe_seconds=60)
+    intake._app = app
+    intake.accept(_body(1))
+    await intake.stop()
+    assert intake.accept(_body(2)) == 503
+    assert app.update_queue.get_nowait().update_id == 1